@@ -0,0 +1,107 @@
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import secrets
+import time
+from starlette.concurrency import run_in_threadpool
+from .settings import settings
+
+logger = logging.getLogger(__name__)
+
+# scrypt cost: about 50 ms and 16 MiB per hash, so guessing passwords offline stays expensive
+SCRYPT_N = 2 ** 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SALT_SIZE = 16
+
+def b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).decode().rstrip("=")
+
+def b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def scrypt(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(password.encode(), salt=salt, n=n, r=r, p=p, maxmem=2 * 128 * n * r * p)
+
+# Stored form: scrypt$n$r$p$salt$hash
+def hash_password(password: str) -> str:
+    salt = secrets.token_bytes(SALT_SIZE)
+    digest = scrypt(password, salt, SCRYPT_N, SCRYPT_R, SCRYPT_P)
+    return f"scrypt${SCRYPT_N}${SCRYPT_R}${SCRYPT_P}${b64encode(salt)}${b64encode(digest)}"
+
+def is_hashed(stored: str) -> bool:
+    return stored.startswith("scrypt$")
+
+# Passwords stored before hashing was introduced are still plain text; they are
+# compared as they are and rehashed by the caller after a successful login
+def verify_password(password: str, stored: str) -> bool:
+    if not stored:
+        return False
+    if not is_hashed(stored):
+        return hmac.compare_digest(password.encode(), stored.encode())
+    try:
+        _, n, r, p, salt, digest = stored.split("$")
+        expected = b64decode(digest)
+        return hmac.compare_digest(scrypt(password, b64decode(salt), int(n), int(r), int(p)), expected)
+    except ValueError:
+        logger.error("Malformed password hash")
+        return False
+
+def needs_rehash(stored: str) -> bool:
+    return not is_hashed(stored) or stored.split("$")[1:4] != [str(SCRYPT_N), str(SCRYPT_R), str(SCRYPT_P)]
+
+# The hash is deliberately slow, so it runs in the thread pool and never blocks the event loop
+async def hash_password_async(password: str) -> str:
+    return await run_in_threadpool(hash_password, password)
+
+async def verify_password_async(password: str, stored: str) -> bool:
+    return await run_in_threadpool(verify_password, password, stored)
+
+# Signing key for session tokens. Without SESSION_SECRET every process makes up its own,
+# so tokens stop working on restart and are not accepted by other workers
+if settings.session_secret:
+    SECRET = settings.session_secret.encode()
+else:
+    SECRET = secrets.token_bytes(32)
+    logger.warning("SESSION_SECRET is not set, session tokens only last until the process restarts")
+
+def sign(payload: str) -> str:
+    return b64encode(hmac.new(SECRET, payload.encode(), hashlib.sha256).digest())
+
+# Signed token: base64url JSON claims and their HMAC-SHA256, joined by a dot.
+# "use" keeps session tokens and password reset tokens from standing in for each other.
+def encode_token(claims: dict, ttl: int) -> str:
+    claims = {**claims, "exp": int(time.time()) + ttl}
+    payload = b64encode(json.dumps(claims, separators=(",", ":")).encode())
+    return f"{payload}.{sign(payload)}"
+
+def issue_token(user_id: str, status: str) -> str:
+    return encode_token({"sub": user_id, "status": status, "use": "session"}, settings.session_ttl)
+
+# Claims of a valid, unexpired token issued for use, None otherwise
+def read_token(token: str, use: str = "session"):
+    payload, _, signature = token.partition(".")
+    # compare_digest only takes ASCII str, and the token comes straight from the client
+    if not hmac.compare_digest(signature.encode(), sign(payload).encode()):
+        return None
+    try:
+        claims = json.loads(b64decode(payload))
+    except ValueError:
+        return None
+    if claims.get("use") != use or claims.get("exp", 0) < time.time():
+        return None
+    return claims
+
+# Keyed digest of the stored password hash. A reset token carries the one of the password
+# it was issued for, so it stops working as soon as that password changes, by the reset or otherwise.
+def password_fingerprint(stored: str) -> str:
+    return b64encode(hmac.new(SECRET, stored.encode(), hashlib.sha256).digest()[:16])
+
+def issue_reset_token(user_id: str, status: str, stored: str) -> str:
+    claims = {"sub": user_id, "status": status, "use": "reset", "pwd": password_fingerprint(stored)}
+    return encode_token(claims, settings.reset_token_ttl)
+
+def reset_token_matches(claims: dict, stored: str) -> bool:
+    return hmac.compare_digest(claims.get("pwd", ""), password_fingerprint(stored))
@@ -0,0 +1,75 @@
+# Regression benchmark for GET /coboard/{board}/
+#
+# Seeds boards with a growing number of forums and reports how many SQL
+# statements the board listing runs and how long it takes.
+#
+# Usage: DATABASE_URL=sqlite:///bench.db python -m server.bench.board_listing
+import time
+from fastapi.testclient import TestClient
+from server.database import SessionLocal, engine
+from server import models, querystats, search
+from server.main import app
+
+FORUM_COUNTS = [10, 100, 1000]
+TOPICS_PER_FORUM = 3
+POSTS_PER_TOPIC = 5
+COMMENTS_PER_POST = 2
+USERS = 50
+
+def seed(db, board, forum_count):
+    creators = [f"b{i:07d}" for i in range(USERS)]
+    for sid in creators:
+        if not db.get(models.SEUser, sid):
+            db.add(models.SEUser(sid=sid, spw="bench", username=sid))
+    db.flush()
+
+    for f in range(forum_count):
+        forum = models.Forum(
+            forum_name=f"{board}-forum-{f}",
+            creator_id=creators[f % USERS],
+            slug=f"{board}-forum-{f}",
+            board=board,
+        )
+        db.add(forum)
+        db.flush()
+        for t in range(TOPICS_PER_FORUM):
+            topic = models.Topic(text=f"topic {t}")
+            db.add(topic)
+            db.flush()
+            db.add(models.ForumTopic(forum_id=forum.forum_id, topic_id=topic.topic_id))
+            for p in range(POSTS_PER_TOPIC):
+                post = models.Post(post_head=f"post {p}", heart=0, spost_creator=creators[(f + t + p) % USERS])
+                db.add(post)
+                db.flush()
+                db.add(models.TopicPost(topic_id=topic.topic_id, post_id=post.post_id))
+                for c in range(COMMENTS_PER_POST):
+                    comment = models.Comment(comment_text=f"comment {c}", scomment_creator=creators[(f + p + c + 1) % USERS])
+                    db.add(comment)
+                    db.flush()
+                    db.add(models.PostComment(post_id=post.post_id, comment_id=comment.comment_id))
+    db.commit()
+
+def run(client, board):
+    start = time.perf_counter()
+    response = client.get(f"/coboard/{board}/")
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    return len(response.json()["forums"]), querystats.queries_of(response), elapsed
+
+def main():
+    models.Base.metadata.create_all(bind=engine)
+    search.ensure_index(engine)
+    client = TestClient(app)
+    print(f"{'forums':>8} {'queries':>8} {'ms':>10}")
+    for forum_count in FORUM_COUNTS:
+        board = f"bench{forum_count}-{int(time.time())}"
+        db = SessionLocal()
+        try:
+            seed(db, board, forum_count)
+        finally:
+            db.close()
+        forums, queries, elapsed = run(client, board)
+        print(f"{forums:>8} {queries:>8} {elapsed * 1000:>10.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# Forum delete benchmark
+#
+# Seeds one forum with a large topic -> post -> comment tree (every tenth post
+# has a comment, every hundredth an uploaded file), times DELETE /user/{sid}/{forum_id}
+# and checks that nothing of the tree is left behind, on disk or in the tables.
+#
+# Usage: DATABASE_URL=postgresql://localhost/bench python -m server.bench.delete_forum [posts]
+import os
+import sys
+import tempfile
+import time
+from fastapi.testclient import TestClient
+from sqlalchemy import func, insert, select
+from server.database import engine
+from server import models, auth
+from server.main import app
+
+POSTS = 100_000
+POSTS_PER_TOPIC = 100
+BATCH = 5_000
+
+def seed(conn, name, posts, upload_dir):
+    conn.execute(insert(models.SEUser).values(sid=name[-10:], spw="bench", username=name))
+    forum_id = conn.execute(insert(models.Forum).values(
+        forum_name=name, creator_id=name[-10:], slug=name, board=name
+    ).returning(models.Forum.forum_id)).scalar_one()
+
+    topic_ids = conn.execute(insert(models.Topic).returning(models.Topic.topic_id), [
+        {"text": f"topic {i}"} for i in range(-(-posts // POSTS_PER_TOPIC))
+    ]).scalars().all()
+    conn.execute(insert(models.ForumTopic), [{"forum_id": forum_id, "topic_id": topic_id} for topic_id in topic_ids])
+
+    for start in range(0, posts, BATCH):
+        count = min(BATCH, posts - start)
+        post_ids = conn.execute(insert(models.Post).returning(models.Post.post_id), [
+            {"post_head": f"post {start + i}", "heart": 0, "spost_creator": name[-10:]} for i in range(count)
+        ]).scalars().all()
+        conn.execute(insert(models.TopicPost), [
+            {"topic_id": topic_ids[(start + i) // POSTS_PER_TOPIC], "post_id": post_id} for i, post_id in enumerate(post_ids)
+        ])
+        commented = post_ids[::10]
+        comment_ids = conn.execute(insert(models.Comment).returning(models.Comment.comment_id), [
+            {"comment_text": "bench comment", "comment_heart": 0, "scomment_creator": name[-10:]} for _ in commented
+        ]).scalars().all()
+        conn.execute(insert(models.PostComment), [
+            {"post_id": post_id, "comment_id": comment_id} for post_id, comment_id in zip(commented, comment_ids)
+        ])
+        files = []
+        for post_id in post_ids[::100]:
+            path = os.path.join(upload_dir, f"bench_{name}_{post_id}.txt")
+            with open(path, "wb") as f:
+                f.write(b"bench")
+            files.append({"filename": os.path.basename(path), "path": path, "extension": "txt", "post_id": post_id})
+        conn.execute(insert(models.File), files)
+    return forum_id
+
+TREE = [models.Topic, models.ForumTopic, models.Post, models.TopicPost, models.Comment, models.PostComment, models.File]
+
+def row_counts(conn):
+    return {model.__tablename__: conn.execute(select(func.count()).select_from(model)).scalar() for model in TREE}
+
+def main(posts):
+    # The uploaded files live in a scratch directory, never among the real uploads
+    with tempfile.TemporaryDirectory(prefix="bench-delete-") as upload_dir:
+        run(posts, upload_dir)
+
+def run(posts, upload_dir):
+    models.Base.metadata.create_all(bind=engine)
+    name = f"delete{int(time.time())}"
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        forum_id = seed(conn, name, posts, upload_dir)
+    print(f"seeded {posts} posts, {posts // 10} comments, {posts // 100} files in {time.perf_counter() - start:.1f} s")
+
+    with engine.connect() as conn:
+        before = row_counts(conn)
+
+    client = TestClient(app)
+    start = time.perf_counter()
+    headers = {"Authorization": f"Bearer {auth.issue_token(name[-10:], 'se')}"}
+    response = client.delete(f"/user/{name[-10:]}/{forum_id}", headers=headers)
+    elapsed = time.perf_counter() - start
+    response.raise_for_status()
+    print(f"delete forum: {elapsed * 1000:.0f} ms")
+
+    with engine.connect() as conn:
+        after = row_counts(conn)
+    print("rows deleted:", {table: before[table] - after[table] for table in before})
+    print("left on disk:", len(os.listdir(upload_dir)))
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else POSTS)
@@ -0,0 +1,129 @@
+# Index check for the hot endpoint queries
+#
+# Seeds a large dataset, runs EXPLAIN on the queries behind the board, forum,
+# user and file endpoints and exits non-zero when any of them reads a table
+# with a sequential scan instead of an index.
+# Run python -m server.migrate_indexes first on an existing database.
+#
+# Usage: DATABASE_URL=postgresql://localhost/bench python -m server.bench.explain
+import json
+import sys
+import time
+from sqlalchemy import insert, select
+from server.database import engine
+from server import models, queries
+
+BOARDS = 100
+FORUMS_PER_BOARD = 20
+TOPICS_PER_FORUM = 2
+POSTS_PER_TOPIC = 10
+TAGS_PER_BOARD = 20
+USERS = 500
+
+def seed(conn, prefix):
+    users = [f"{prefix[-4:]}{i:04d}" for i in range(USERS)]
+    conn.execute(insert(models.SEUser), [{"sid": sid, "spw": "bench", "username": sid} for sid in users])
+    conn.execute(insert(models.AnonymousUser), [{"aid": sid, "apw": "bench", "mail": "bench@example.com"} for sid in users])
+    boards = [f"{prefix}-{b}" for b in range(BOARDS)]
+    tag_ids = conn.execute(insert(models.Tag).returning(models.Tag.tag_id), [
+        {"tag_text": f"tag {t}", "board": board, "use": t} for board in boards for t in range(TAGS_PER_BOARD)
+    ]).scalars().all()
+    forum_ids = conn.execute(insert(models.Forum).returning(models.Forum.forum_id), [
+        {"forum_name": f"{board}-{f}", "slug": f"{board}-{f}", "board": board, "creator_id": users[(b * FORUMS_PER_BOARD + f) % USERS]}
+        for b, board in enumerate(boards) for f in range(FORUMS_PER_BOARD)
+    ]).scalars().all()
+    conn.execute(insert(models.ForumTag), [
+        {"forum_id": forum_id, "tag_id": tag_ids[(i // FORUMS_PER_BOARD) * TAGS_PER_BOARD + (i + k) % TAGS_PER_BOARD]}
+        for i, forum_id in enumerate(forum_ids) for k in range(3)
+    ])
+    topic_ids = conn.execute(insert(models.Topic).returning(models.Topic.topic_id), [
+        {"text": "topic"} for _ in range(len(forum_ids) * TOPICS_PER_FORUM)
+    ]).scalars().all()
+    conn.execute(insert(models.ForumTopic), [
+        {"forum_id": forum_ids[i // TOPICS_PER_FORUM], "topic_id": topic_id} for i, topic_id in enumerate(topic_ids)
+    ])
+    post_ids = conn.execute(insert(models.Post).returning(models.Post.post_id), [
+        {"post_head": "post", "heart": 0, "spost_creator": users[i % USERS]} for i in range(len(topic_ids) * POSTS_PER_TOPIC)
+    ]).scalars().all()
+    conn.execute(insert(models.TopicPost), [
+        {"topic_id": topic_ids[i // POSTS_PER_TOPIC], "post_id": post_id} for i, post_id in enumerate(post_ids)
+    ])
+    commented = post_ids[::5]
+    comment_ids = conn.execute(insert(models.Comment).returning(models.Comment.comment_id), [
+        {"comment_text": "comment", "comment_heart": 0, "acomment_creator": users[i % USERS]} for i in range(len(commented))
+    ]).scalars().all()
+    conn.execute(insert(models.PostComment), [
+        {"post_id": post_id, "comment_id": comment_id} for post_id, comment_id in zip(commented, comment_ids)
+    ])
+    conn.execute(insert(models.File), [
+        {"filename": f"{prefix}_{post_id}", "path": "", "extension": "txt", "post_id": post_id,
+         "s_owner": users[i % USERS] if i % 2 else None, "a_owner": None if i % 2 else users[i % USERS]}
+        for i, post_id in enumerate(post_ids[::20])
+    ])
+    return boards[BOARDS // 2], forum_ids[len(forum_ids) // 2], post_ids[len(post_ids) // 2], users[USERS // 2], tag_ids[:3]
+
+# The queries behind the hot endpoints, with the parameters of a mid-table row
+def hot_queries(board, forum_id, post_id, sid, tag_ids):
+    slug = f"{board}-{FORUMS_PER_BOARD // 2}"
+    return {
+        "board revisions": queries.board_revisions(board, None, 21),
+        "board page": queries.forums_with_contributors(board, None, 21),
+        "board page by tag": queries.forums_with_contributors(board, None, 21, tag_ids, "all"),
+        "board tags": queries.top_tags(board, 20),
+        "forum revision": queries.forum_revision(board, slug),
+        "forum topics": queries.load_forum_topics(board, slug),
+        "forum posts": queries.forum_posts_page(forum_id, None, 20),
+        "forum of post": queries.forum_of_post(post_id),
+        "post comments": select(models.PostComment).where(models.PostComment.post_id == post_id),
+        "post files": select(models.File).where(models.File.post_id == post_id),
+        "user forums": select(models.Forum).where(models.Forum.creator_id == sid),
+        "user files": select(models.File).where(models.File.s_owner == sid),
+        "anonymous files": select(models.File).where(models.File.a_owner == sid),
+        "user bookmarks": select(models.SBookmark).where(models.SBookmark.user_id == sid),
+    }
+
+TABLES = set(models.Base.metadata.tables)
+
+# Tables read with a full scan in a SQLite query plan
+def sqlite_scans(conn, sql):
+    scans = []
+    for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}"):
+        words = row[-1].split()
+        # "SCAN table" without "USING ... INDEX" reads every row
+        if words[0] == "SCAN" and words[1] in TABLES and "INDEX" not in words:
+            scans.append(words[1])
+    return scans
+
+# Tables read with a sequential scan in a PostgreSQL query plan
+def postgres_scans(conn, sql):
+    def walk(node):
+        if node["Node Type"] == "Seq Scan" and node["Relation Name"] in TABLES:
+            yield node["Relation Name"]
+        for child in node.get("Plans", []):
+            yield from walk(child)
+    plan = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {sql}").scalar()
+    plan = json.loads(plan) if isinstance(plan, str) else plan
+    return list(walk(plan[0]["Plan"]))
+
+def main():
+    models.Base.metadata.create_all(bind=engine)
+    prefix = f"explain{int(time.time())}"
+    with engine.begin() as conn:
+        params = seed(conn, prefix)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+
+    scans_of = postgres_scans if engine.dialect.name == "postgresql" else sqlite_scans
+    failed = 0
+    with engine.connect() as conn:
+        for name, statement in hot_queries(*params).items():
+            sql = statement.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True})
+            scans = scans_of(conn, str(sql))
+            failed += bool(scans)
+            print(f"{name:<20} {'SEQ SCAN ' + ', '.join(scans) if scans else 'ok'}")
+    if failed:
+        print(f"{failed} queries fall back to a sequential scan")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
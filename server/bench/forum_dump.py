@@ -0,0 +1,81 @@
+# Forum dump benchmark
+#
+# Seeds one forum with a large topic -> post tree, serves the app with uvicorn
+# and reads the whole forum twice: as the nested ForumResponse and as the NDJSON
+# stream (?stream=1). Reports time to first byte, total time, bytes received and
+# the peak Python memory of the process while the response is produced.
+#
+# Usage: DATABASE_URL=postgresql://localhost/bench python -m server.bench.forum_dump [posts]
+import logging
+import socket
+import sys
+import threading
+import time
+import tracemalloc
+import httpx
+import uvicorn
+from server.database import engine
+from server import models, queries
+from server.main import app
+from server.bench.serialize import seed
+
+POSTS = 50_000
+
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def fetch(url):
+    start = time.perf_counter()
+    first = None
+    size = 0
+    with httpx.stream("GET", url, timeout=None) as response:
+        response.raise_for_status()
+        for chunk in response.iter_raw():
+            if first is None:
+                first = time.perf_counter() - start
+            size += len(chunk)
+    return first, time.perf_counter() - start, size
+
+def bump(name):
+    with engine.begin() as conn:
+        conn.execute(queries.bump_revision(models.Forum.board == name))
+
+def main(posts):
+    models.Base.metadata.create_all(bind=engine)
+    name = f"dump{int(time.time())}"
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        seed(conn, name, posts)
+    print(f"seeded {posts} posts in {time.perf_counter() - start:.1f} s")
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+
+    base = f"http://127.0.0.1:{port}/coboard/{name}/{name}/"
+    print(f"{'response':<10} {'first byte ms':>14} {'total ms':>10} {'MB':>8} {'peak MB':>9}")
+    try:
+        for label, url in (("nested", base), ("stream", f"{base}?stream=1")):
+            fetch(f"{base}?stream=1")  # warm up
+            # The nested view is cached once built, so each read gets a fresh forum revision
+            bump(name)
+            first, total, size = fetch(url)
+            tracemalloc.start()
+            bump(name)
+            fetch(url)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"{label:<10} {first * 1000:>14.0f} {total * 1000:>10.0f} {size / 1e6:>8.1f} {peak / 1e6:>9.1f}")
+    finally:
+        server.should_exit = True
+        thread.join()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else POSTS)
@@ -0,0 +1,75 @@
+# Concurrency benchmark for PUT /coboard/{board}/{forum_name}/like
+#
+# Fires bursts of concurrent likes at one post and checks that the stored
+# count went up by exactly the number of requests, then reports throughput.
+# Set LIKE_BUFFER=true to measure the coalescing buffer instead.
+#
+# Usage: DATABASE_URL=sqlite:///bench.db python -m server.bench.likes
+import asyncio
+import time
+import httpx
+from server.database import SessionLocal, engine, async_engine
+from server import models, auth
+from server.main import app, like_buffer
+
+BURSTS = [100, 1000]
+CONCURRENCY = 50
+
+def seed():
+    db = SessionLocal()
+    try:
+        if not db.get(models.SEUser, "likebench"):
+            db.add(models.SEUser(sid="likebench", spw="bench", username="likebench"))
+            db.flush()
+        post = models.Post(post_head="hot post", heart=0, spost_creator="likebench")
+        db.add(post)
+        db.commit()
+        return post.post_id
+    finally:
+        db.close()
+
+def stored_likes(post_id):
+    db = SessionLocal()
+    try:
+        return db.get(models.Post, post_id).heart
+    finally:
+        db.close()
+
+async def burst(post_id, requests):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    transport = httpx.ASGITransport(app=app)
+    headers = {"Authorization": f"Bearer {auth.issue_token('likebench', 'se')}"}
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+        async def like():
+            async with semaphore:
+                response = await client.put("/coboard/bench/bench/like", json={"item_id": post_id, "item_type": "post"})
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(like() for _ in range(requests)))
+        if like_buffer:
+            await like_buffer.flush()
+        return time.perf_counter() - start
+
+# All bursts share one event loop, the async engine's pool is bound to it
+async def run_bursts():
+    mode = "buffered" if like_buffer else "atomic"
+    print(f"{'mode':>9} {'requests':>9} {'stored':>7} {'lost':>5} {'req/s':>9}")
+    for requests in BURSTS:
+        post_id = seed()
+        elapsed = await burst(post_id, requests)
+        stored = stored_likes(post_id)
+        print(f"{mode:>9} {requests:>9} {stored:>7} {requests - stored:>5} {requests / elapsed:>9.0f}")
+        if stored != requests:
+            raise SystemExit(f"lost {requests - stored} likes")
+
+    # Close pooled async connections while the loop is still running
+    if async_engine is not None:
+        await async_engine.dispose()
+
+def main():
+    models.Base.metadata.create_all(bind=engine)
+    asyncio.run(run_bursts())
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+# Load driver
+#
+# Replays a mix of the read and write endpoints with many concurrent clients,
+# using the data made by server.bench.seed, and saves a report (throughput and
+# p50/p95/p99 latency per endpoint) with server.bench.report. Without --url it
+# starts uvicorn on server.main:app itself, against DATABASE_URL.
+#
+# Usage: DATABASE_URL=postgresql://localhost/bench python -m server.bench.load
+#            [--manifest bench-data.json] [--url http://127.0.0.1:8000] [--concurrency 32]
+#            [--duration 30] [--warmup 5] [--workers 1] [--output bench-results]
+import argparse
+import asyncio
+import json
+import random
+import socket
+import subprocess
+import sys
+import time
+import httpx
+from sqlalchemy.engine import make_url
+from server import querystats
+from server.settings import settings
+from server.bench import report
+
+def board(rng, data):
+    return rng.choice(data["boards"])
+
+def forum(rng, data, with_posts=False):
+    return rng.choice(data["forums_with_posts"] if with_posts else data["forums"])
+
+def user(rng, data):
+    return rng.choice(data["students"] + data["anonymous"])
+
+# Creator columns of a post or comment written by the client's user
+def creator(me, prefix):
+    if me["status"] == "se":
+        return {f"s{prefix}_creator": me["id"], f"a{prefix}_creator": None}
+    return {f"s{prefix}_creator": None, f"a{prefix}_creator": me["id"]}
+
+# Each request builder gets the client's random generator, the manifest and the client's
+# logged in user: {"id": ..., "status": "se" or "a", "headers": {"Authorization": ...}}
+def get_board(rng, data, me):
+    return "GET", f"/coboard/{board(rng, data)['board']}/", {"params": {"limit": 20}}
+
+def get_board_by_tag(rng, data, me):
+    b = board(rng, data)
+    tags = rng.sample(b["tags"], min(len(b["tags"]), rng.randint(1, 2)))
+    return "GET", f"/coboard/{b['board']}/", {"params": [("limit", 20)] + [("tag", tag) for tag in tags]}
+
+def get_forum_page(rng, data, me):
+    f = forum(rng, data)
+    return "GET", f"/coboard/{f['board']}/{f['slug']}/", {"params": {"limit": 20}}
+
+def get_forum(rng, data, me):
+    f = forum(rng, data)
+    return "GET", f"/coboard/{f['board']}/{f['slug']}/", {}
+
+def search(rng, data, me):
+    return "GET", f"/coboard/{board(rng, data)['board']}/search", {"params": {"q": rng.choice(data["words"])}}
+
+def get_user(rng, data, me):
+    return "GET", f"/user/{user(rng, data)}", {}
+
+def get_file(rng, data, me):
+    return "GET", f"/file/{rng.choice(data['files'])}", {}
+
+def like(rng, data, me):
+    f = forum(rng, data, with_posts=True)
+    body = {"item_id": rng.choice(f["posts"]), "item_type": "post"}
+    return "PUT", f"/coboard/{f['board']}/{f['slug']}/like", {"json": body, "headers": me["headers"]}
+
+def create_post(rng, data, me):
+    f = forum(rng, data)
+    body = {"post_head": "Load test post", "post_body": "Posted by the load driver", **creator(me, "post")}
+    options = {"params": {"topic_id": rng.choice(f["topics"])}, "json": body, "headers": me["headers"]}
+    return "POST", f"/coboard/{f['board']}/{f['slug']}/post", options
+
+def comment(rng, data, me):
+    f = forum(rng, data, with_posts=True)
+    body = {"comment_text": "Load test comment", **creator(me, "comment")}
+    options = {"params": {"post_id": rng.choice(f["posts"])}, "json": body, "headers": me["headers"]}
+    return "POST", f"/coboard/{f['board']}/{f['slug']}/comment", options
+
+def login(rng, data, me):
+    return "POST", "/auth/login", {"json": {"username": user(rng, data), "password": data["password"]}}
+
+# Endpoint -> (weight, request). Reads dominate, as they do on the live boards;
+# logins are rare but each one costs a deliberately slow password hash.
+MIX = {
+    "board": (20, get_board),
+    "board by tag": (5, get_board_by_tag),
+    "forum page": (25, get_forum_page),
+    "forum": (5, get_forum),
+    "search": (8, search),
+    "user": (8, get_user),
+    "file": (4, get_file),
+    "like": (10, like),
+    "post": (5, create_post),
+    "comment": (7, comment),
+    "login": (3, login),
+}
+
+def load_manifest(path):
+    with open(path) as f:
+        data = json.load(f)
+    data["forums"] = [f for b in data["boards"] for f in b["forums"]]
+    data["forums_with_posts"] = [f for f in data["forums"] if f["posts"]]
+    return data
+
+# The mix for this data: endpoints without anything to ask for are left out
+def mix_for(data):
+    mix = dict(MIX)
+    if not data["files"]:
+        del mix["file"]
+    if not data["forums_with_posts"]:
+        for name in ("like", "comment"):
+            del mix[name]
+    return mix
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+# uvicorn in its own process, so the driver and the server do not share an interpreter
+def start_server(workers):
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "server.main:app",
+        "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning",
+    ])
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"uvicorn exited with status {process.returncode}")
+        try:
+            httpx.get(f"{url}/metrics").raise_for_status()
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.terminate()
+    sys.exit("uvicorn did not start within 60 s")
+
+# Writes need a session token, so every client logs in as one user before it starts
+async def log_in(client, rng, data):
+    user_id = user(rng, data)
+    response = await client.post("/auth/login", json={"username": user_id, "password": data["password"]})
+    response.raise_for_status()
+    session = response.json()
+    return {"id": user_id, "status": session["status"], "headers": {"Authorization": f"Bearer {session['token']}"}}
+
+async def client_loop(client, rng, data, mix, samples, measure_from, deadline):
+    names = list(mix)
+    weights = [mix[name][0] for name in names]
+    me = await log_in(client, rng, data)
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        method, path, options = mix[name][1](rng, data, me)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, **options)
+        except httpx.HTTPError as e:
+            if start >= measure_from:
+                samples[name].record_error(time.perf_counter() - start, e)
+            continue
+        latency = time.perf_counter() - start
+        if start >= measure_from:
+            try:
+                queries = querystats.queries_of(response)
+            except ValueError:
+                queries = None
+            samples[name].record(latency, response.status_code, queries)
+
+async def run(url, data, mix, concurrency, duration, warmup, seed):
+    samples = {name: report.Samples() for name in mix}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        measure_from = time.perf_counter() + warmup
+        deadline = measure_from + duration
+        await asyncio.gather(*(
+            client_loop(client, random.Random(seed + i), data, mix, samples, measure_from, deadline)
+            for i in range(concurrency)
+        ))
+        # Requests started before the deadline finish after it, so the window is measured
+        elapsed = time.perf_counter() - measure_from
+    return samples, elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an endpoint mix against CoBoard and report latencies")
+    parser.add_argument("--manifest", default="bench-data.json", help="written by server.bench.seed")
+    parser.add_argument("--url", help="server to load, by default uvicorn is started on DATABASE_URL")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers when the driver starts the server")
+    parser.add_argument("--concurrency", type=int, default=32, help="clients sending requests at the same time")
+    parser.add_argument("--duration", type=float, default=30, help="seconds measured")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds run before measuring")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench-results", help="directory for the JSON report")
+    args = parser.parse_args()
+
+    data = load_manifest(args.manifest)
+    mix = mix_for(data)
+    process = None
+    url = args.url
+    if url is None:
+        process, url = start_server(args.workers)
+    try:
+        samples, elapsed = asyncio.run(run(url, data, mix, args.concurrency, args.duration, args.warmup, args.seed))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    config = {
+        "url": args.url,
+        "workers": None if args.url else args.workers,
+        "database": None if args.url else make_url(settings.database_url).get_backend_name(),
+        "concurrency": args.concurrency,
+        "duration": args.duration,
+        "warmup": args.warmup,
+        "seed": args.seed,
+        "scale": data["scale"],
+        "mix": {name: weight for name, (weight, _) in mix.items()},
+    }
+    result = report.build(config, samples, elapsed)
+    report.print_report(result)
+    print(f"report written to {report.save(result, args.output)}")
+
+if __name__ == "__main__":
+    main()
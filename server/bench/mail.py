@@ -0,0 +1,110 @@
+# Throughput benchmark for the password recovery mail (POST /auth/recover)
+#
+# Starts a local SMTP stand-in (aiosmtpd) and sends the same number of
+# password mails two ways: the old path, one Python interpreter and SMTP
+# connection per mail, and the in-process queue behind the endpoint.
+#
+# Usage: DATABASE_URL=sqlite:///bench.db python -m server.bench.mail
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from aiosmtpd.controller import Controller
+
+MAILS = 200
+
+# The old send_mail.py, minus STARTTLS and login which the stand-in does not offer
+SUBPROCESS_SCRIPT = """
+import smtplib, sys
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+msg = MIMEMultipart()
+msg['From'] = 'bench@coboard.local'
+msg['To'] = sys.argv[3]
+msg['Subject'] = 'Your Password Recovery'
+msg.attach(MIMEText('Your current password: bench', 'plain'))
+server = smtplib.SMTP(sys.argv[1], int(sys.argv[2]))
+server.sendmail(msg['From'], msg['To'], msg.as_string())
+server.quit()
+"""
+
+class CountingHandler:
+    def __init__(self):
+        self.received = 0
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        return "250 OK"
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+PORT = free_port()
+os.environ.update(SMTP_HOST="127.0.0.1", SMTP_PORT=str(PORT), SMTP_STARTTLS="false", MAIL_SENDER="bench@coboard.local")
+
+import httpx
+from server.database import SessionLocal, engine, async_engine
+from server import models
+from server.main import app, mail_queue
+
+USER = "mailbench"
+
+def seed():
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        if not db.get(models.AnonymousUser, USER):
+            db.add(models.AnonymousUser(aid=USER, apw="bench", mail="mailbench@coboard.local"))
+            db.commit()
+    finally:
+        db.close()
+
+def subprocess_path(handler):
+    start = time.perf_counter()
+    for i in range(MAILS):
+        subprocess.run([sys.executable, "-c", SUBPROCESS_SCRIPT, "127.0.0.1", str(PORT), f"user{i}@coboard.local"], check=True)
+    elapsed = time.perf_counter() - start
+    return elapsed, elapsed / MAILS
+
+async def queue_path(handler):
+    mail_queue.start()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # One request after another like the old path, then wait for the workers to catch up
+        start = time.perf_counter()
+        for i in range(MAILS):
+            response = await client.post("/auth/recover", json={"username": USER})
+            assert response.status_code == 202, response.text
+        accepted = time.perf_counter() - start
+        await mail_queue.queue.join()
+        elapsed = time.perf_counter() - start
+    await mail_queue.stop()
+    # Close pooled async connections while the loop is still running
+    if async_engine is not None:
+        await async_engine.dispose()
+    return elapsed, accepted / MAILS
+
+def main():
+    seed()
+    handler = CountingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=PORT)
+    controller.start()
+    try:
+        print(f"{'path':<12} {'mails':>6} {'total s':>9} {'mails/s':>9} {'ms per request':>15}")
+        for name, run in [("subprocess", lambda: subprocess_path(handler)), ("queue", lambda: asyncio.run(queue_path(handler)))]:
+            before = handler.received
+            elapsed, per_request = run()
+            delivered = handler.received - before
+            print(f"{name:<12} {delivered:>6} {elapsed:>9.2f} {delivered / elapsed:>9.1f} {per_request * 1000:>15.2f}")
+            if delivered != MAILS:
+                raise SystemExit(f"{name}: {MAILS - delivered} mails were not delivered")
+    finally:
+        controller.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+# Query budgets for the read endpoints
+#
+# Seeds a small and a large board, reads every hot endpoint on both and checks
+# the number of SQL statements behind each response (from its Server-Timing
+# header) against the endpoint's budget. The count must not grow with the data,
+# so a budget that holds on the small board but not on the large one points to
+# a query per row. Exits non-zero when an endpoint goes over its budget.
+#
+# Usage: DATABASE_URL=sqlite:///bench.db python -m server.bench.query_budget
+import sys
+import time
+from fastapi.testclient import TestClient
+from server.database import SessionLocal, engine
+from server import models, querystats, search
+from server.main import app
+from server.bench.board_listing import seed
+
+FORUM_COUNTS = [5, 50]
+
+# Statements each endpoint may run on a cache miss
+BUDGETS = {
+    "board": 5,
+    "board by tag": 5,
+    "forum": 12,
+    "forum page": 12,
+    "forum stream": 9,
+    "search": 1,
+    "user": 5,
+}
+
+def endpoints(board):
+    forum = f"{board}/{board}-forum-0"
+    return {
+        "board": f"/coboard/{board}/?limit=20",
+        "board by tag": f"/coboard/{board}/?tag=1&tag=2&match=all",
+        "forum": f"/coboard/{forum}/",
+        "forum page": f"/coboard/{forum}/?limit=20",
+        "forum stream": f"/coboard/{forum}/?stream=1",
+        "search": f"/coboard/{board}/search?q=post",
+        "user": "/user/b0000000",
+    }
+
+def main():
+    models.Base.metadata.create_all(bind=engine)
+    search.ensure_index(engine)
+    client = TestClient(app)
+    counts = {}
+    for forum_count in FORUM_COUNTS:
+        board = f"budget{forum_count}-{int(time.time())}"
+        db = SessionLocal()
+        try:
+            seed(db, board, forum_count)
+        finally:
+            db.close()
+        for name, path in endpoints(board).items():
+            response = client.get(path)
+            response.raise_for_status()
+            counts.setdefault(name, []).append(querystats.queries_of(response))
+
+    failed = 0
+    print(f"{'endpoint':<15} {'budget':>7} " + " ".join(f"{f'{count} forums':>10}" for count in FORUM_COUNTS))
+    for name, budget in BUDGETS.items():
+        over = max(counts[name]) > budget
+        failed += over
+        print(f"{name:<15} {budget:>7} " + " ".join(f"{count:>10}" for count in counts[name]) + ("  OVER BUDGET" if over else ""))
+    if failed:
+        print(f"{failed} endpoints over their query budget")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+# Benchmark reports
+#
+# Summaries of a load run per endpoint (requests, errors, throughput, latency
+# percentiles, SQL statements and commits per request), saved as JSON named after the
+# commit they ran on, and a comparison of two saved runs.
+#
+# Usage: python -m server.bench.report RUN.json [NEW_RUN.json]
+import json
+import os
+import subprocess
+import sys
+import time
+
+# Nearest-rank percentile of a non-empty list
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100))]
+
+# Per endpoint samples: latencies in seconds, error count, SQL statements and commits per request
+class Samples:
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.statuses = {}
+        self.queries = []
+        self.commits = []
+
+    def record(self, latency: float, status: int, queries: int = None, commits: int = None):
+        self.latencies.append(latency)
+        self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+        if status >= 400:
+            self.errors += 1
+        if queries is not None:
+            self.queries.append(queries)
+        if commits is not None:
+            self.commits.append(commits)
+
+    def record_error(self, latency: float, error: Exception):
+        self.latencies.append(latency)
+        self.errors += 1
+        name = type(error).__name__
+        self.statuses[name] = self.statuses.get(name, 0) + 1
+
+def summarize(samples: Samples, elapsed: float) -> dict:
+    latencies = samples.latencies or [0.0]
+    return {
+        "requests": len(samples.latencies),
+        "errors": samples.errors,
+        "statuses": samples.statuses,
+        "throughput": len(samples.latencies) / elapsed,
+        "latency_ms": {
+            "mean": sum(latencies) / len(latencies) * 1000,
+            "p50": percentile(latencies, 50) * 1000,
+            "p95": percentile(latencies, 95) * 1000,
+            "p99": percentile(latencies, 99) * 1000,
+            "max": max(latencies) * 1000,
+        },
+        "queries": sum(samples.queries) / len(samples.queries) if samples.queries else None,
+        "commits": sum(samples.commits) / len(samples.commits) if samples.commits else None,
+    }
+
+# Runs in the repository, wherever the benchmark was started from
+def git(*args):
+    try:
+        return subprocess.run(
+            ["git", *args], cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def build(config: dict, samples: dict, elapsed: float) -> dict:
+    endpoints = {name: summarize(s, elapsed) for name, s in samples.items() if s.latencies}
+    total = Samples()
+    for s in samples.values():
+        total.latencies.extend(s.latencies)
+        total.errors += s.errors
+        total.queries.extend(s.queries)
+        total.commits.extend(s.commits)
+    return {
+        "commit": git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": config,
+        "elapsed": elapsed,
+        "total": summarize(total, elapsed),
+        "endpoints": endpoints,
+    }
+
+# Write the report to output_dir/<commit>-<time>.json and return the path
+def save(report: dict, output_dir: str) -> str:
+    os.makedirs(output_dir, exist_ok=True)
+    name = f"{report['commit'] or 'nocommit'}{'-dirty' if report['dirty'] else ''}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    path = os.path.join(output_dir, name)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    return path
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+def row(name, result):
+    latency = result["latency_ms"]
+    queries = "-" if result["queries"] is None else f"{result['queries']:.1f}"
+    return (f"{name:<14} {result['requests']:>8} {result['errors']:>7} {result['throughput']:>9.1f} "
+            f"{latency['p50']:>8.1f} {latency['p95']:>8.1f} {latency['p99']:>8.1f} {queries:>8}")
+
+HEADER = f"{'endpoint':<14} {'requests':>8} {'errors':>7} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}"
+
+def print_report(report: dict):
+    print(f"commit {report['commit']}{' (dirty)' if report['dirty'] else ''}, {report['time']}, {report['elapsed']:.1f} s")
+    print(HEADER)
+    for name, result in sorted(report["endpoints"].items()):
+        print(row(name, result))
+    print(row("total", report["total"]))
+
+def change(old, new):
+    return f"{(new - old) / old * 100:+.0f}%" if old else "-"
+
+# Commits per request, old -> new, when both runs counted them (reports older than the count have none)
+def commits_change(old, new):
+    if old.get("commits") is None or new.get("commits") is None:
+        return "-"
+    return f"{old['commits']:.2f} -> {new['commits']:.2f}"
+
+# Throughput, latency percentiles and commits per request of new against old, per endpoint
+def print_comparison(old: dict, new: dict):
+    print(f"{old['commit']} ({old['time']}) -> {new['commit']} ({new['time']})")
+    print(f"{'endpoint':<14} {'req/s':>14} {'p50':>14} {'p95':>14} {'p99':>14} {'commits/op':>14}")
+    names = sorted(set(old["endpoints"]) & set(new["endpoints"])) + ["total"]
+    for name in names:
+        a = old["total"] if name == "total" else old["endpoints"][name]
+        b = new["total"] if name == "total" else new["endpoints"][name]
+        cells = [f"{b['throughput']:.1f} {change(a['throughput'], b['throughput']):>5}"]
+        for p in ("p50", "p95", "p99"):
+            cells.append(f"{b['latency_ms'][p]:.1f} {change(a['latency_ms'][p], b['latency_ms'][p]):>5}")
+        cells.append(commits_change(a, b))
+        print(f"{name:<14} " + " ".join(f"{cell:>14}" for cell in cells))
+
+def main():
+    if len(sys.argv) == 2:
+        print_report(load(sys.argv[1]))
+    elif len(sys.argv) == 3:
+        print_comparison(load(sys.argv[1]), load(sys.argv[2]))
+    else:
+        print("Usage: python -m server.bench.report RUN.json [NEW_RUN.json]")
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+# Synthetic data generator for the benchmarks
+#
+# Fills the database with boards of forums, topics, posts, comments, tags,
+# bookmarks and uploaded files through server/models.py, and writes a manifest
+# of what it made for server.bench.load. Like on the live boards, most forums,
+# topics and threads are small and a few are much larger than the mean.
+# Every generated user logs in with the password "bench".
+#
+# Usage: DATABASE_URL=postgresql://localhost/bench python -m server.bench.seed
+#            [--scale small|medium|large] [--forums N ...] [--manifest bench-data.json]
+import argparse
+import hashlib
+import json
+import os
+import random
+import time
+from sqlalchemy import insert, select, update
+from server.database import engine
+from server import models, search, uploads, auth
+
+PASSWORD = "bench"
+
+# Per board: forums, tags. Means per forum: topics, per topic: posts, per post: comments.
+# Users are split between students and anonymous users, bookmarks is the mean per user
+# and files the share of posts with an upload.
+SCALES = {
+    "small": {"boards": 2, "forums": 20, "tags": 10, "topics": 3, "posts": 10, "comments": 2, "users": 50, "bookmarks": 3, "files": 0.05},
+    "medium": {"boards": 5, "forums": 100, "tags": 20, "topics": 5, "posts": 20, "comments": 3, "users": 500, "bookmarks": 5, "files": 0.05},
+    "large": {"boards": 10, "forums": 500, "tags": 40, "topics": 8, "posts": 40, "comments": 4, "users": 5000, "bookmarks": 10, "files": 0.05},
+}
+
+WORDS = (
+    "python react exam project deadline database algorithm lecture homework network "
+    "lab midterm final group report server design pattern question answer help review "
+    "slides schedule internship thesis quiz grade java golang docker linux"
+).split()
+
+# Samples kept per forum in the manifest, so it stays small at any scale
+MANIFEST_POSTS = 50
+MANIFEST_FILES = 1000
+
+def text(rng, words):
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+# Exponentially distributed count: mostly near or under the mean, with a long tail
+def skewed(rng, mean, minimum=0):
+    return max(minimum, round(rng.expovariate(1 / mean))) if mean else minimum
+
+def seed_users(conn, run, count):
+    # Hashing is deliberately slow, so every user shares one hash of the same password
+    password = auth.hash_password(PASSWORD)
+    students = [f"s{run}{i:05d}" for i in range((count + 1) // 2)]
+    anonymous = [f"a{run}{i:05d}" for i in range(count // 2)]
+    conn.execute(insert(models.SEUser), [{"sid": sid, "spw": password, "username": f"student {sid}"} for sid in students])
+    if anonymous:
+        conn.execute(insert(models.AnonymousUser), [{"aid": aid, "apw": password, "mail": f"{aid}@example.com"} for aid in anonymous])
+    return students, anonymous
+
+# A post or comment is written by a student seven times out of ten.
+# Both columns are always given, rows of one executemany need the same keys.
+def creator(rng, students, anonymous, prefix):
+    if anonymous and rng.random() < 0.3:
+        return {f"s{prefix}_creator": None, f"a{prefix}_creator": rng.choice(anonymous)}
+    return {f"s{prefix}_creator": rng.choice(students), f"a{prefix}_creator": None}
+
+def seed_board(conn, rng, board, scale, students, anonymous):
+    tag_ids = conn.execute(insert(models.Tag).returning(models.Tag.tag_id), [
+        {"tag_text": rng.choice(WORDS), "board": board, "use": 0} for _ in range(scale["tags"])
+    ]).scalars().all()
+    forum_ids = conn.execute(insert(models.Forum).returning(models.Forum.forum_id), [
+        {"forum_name": f"{board} forum {f}", "slug": f"{board}-forum-{f}", "board": board,
+         "description": text(rng, 8), "creator_id": rng.choice(students)}
+        for f in range(scale["forums"])
+    ]).scalars().all()
+
+    forum_tags = [
+        {"forum_id": forum_id, "tag_id": tag_id}
+        for forum_id in forum_ids for tag_id in rng.sample(tag_ids, min(len(tag_ids), rng.randint(0, 3)))
+    ]
+    if forum_tags:
+        conn.execute(insert(models.ForumTag), forum_tags)
+        use = {}
+        for row in forum_tags:
+            use[row["tag_id"]] = use.get(row["tag_id"], 0) + 1
+        for tag_id, count in use.items():
+            conn.execute(update(models.Tag).where(models.Tag.tag_id == tag_id).values(use=count))
+
+    forums = []
+    files = []
+    for f, forum_id in enumerate(forum_ids):
+        topic_ids = conn.execute(insert(models.Topic).returning(models.Topic.topic_id), [
+            {"text": text(rng, 4)} for _ in range(skewed(rng, scale["topics"], 1))
+        ]).scalars().all()
+        conn.execute(insert(models.ForumTopic), [{"forum_id": forum_id, "topic_id": topic_id} for topic_id in topic_ids])
+
+        post_topics = [topic_id for topic_id in topic_ids for _ in range(skewed(rng, scale["posts"]))]
+        post_ids = []
+        if post_topics:
+            post_rows = [
+                {"post_head": text(rng, 5), "post_body": text(rng, 20), "heart": skewed(rng, 3), **creator(rng, students, anonymous, "post")}
+                for _ in post_topics
+            ]
+            post_ids = conn.execute(insert(models.Post).returning(models.Post.post_id), post_rows).scalars().all()
+            conn.execute(insert(models.TopicPost), [
+                {"topic_id": topic_id, "post_id": post_id} for topic_id, post_id in zip(post_topics, post_ids)
+            ])
+
+            comment_posts = [post_id for post_id in post_ids for _ in range(skewed(rng, scale["comments"]))]
+            if comment_posts:
+                comment_ids = conn.execute(insert(models.Comment).returning(models.Comment.comment_id), [
+                    {"comment_text": text(rng, 10), "comment_heart": skewed(rng, 1), **creator(rng, students, anonymous, "comment")}
+                    for _ in comment_posts
+                ]).scalars().all()
+                conn.execute(insert(models.PostComment), [
+                    {"post_id": post_id, "comment_id": comment_id} for post_id, comment_id in zip(comment_posts, comment_ids)
+                ])
+
+            for post_id, row in zip(post_ids, post_rows):
+                if rng.random() < scale["files"]:
+                    files.append(upload(rng, post_id, row))
+
+        forums.append({
+            "board": board,
+            "slug": f"{board}-forum-{f}",
+            "topics": topic_ids,
+            "posts": rng.sample(post_ids, min(len(post_ids), MANIFEST_POSTS)),
+        })
+
+    file_ids = conn.execute(insert(models.File).returning(models.File.file_id), files).scalars().all() if files else []
+    return {"board": board, "tags": tag_ids, "forums": forums}, file_ids
+
+# A small text file on disk for a post, owned by the post's creator like a real upload
+def upload(rng, post_id, post):
+    content = text(rng, 200).encode()
+    filename = f"bench_{post_id}_{rng.getrandbits(32):08x}.txt"
+    path = os.path.join(uploads.UPLOAD_DIR, filename)
+    with open(path, "wb") as f:
+        f.write(content)
+    return {
+        "filename": filename, "path": path, "extension": "txt", "post_id": post_id,
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "s_owner": post.get("spost_creator"), "a_owner": post.get("apost_creator"),
+    }
+
+def seed_bookmarks(conn, rng, forum_ids, students, anonymous, mean):
+    for model, users in ((models.SBookmark, students), (models.ABookmark, anonymous)):
+        rows = [
+            {"forum_id": forum_id, "user_id": user_id}
+            for user_id in users for forum_id in rng.sample(forum_ids, min(len(forum_ids), skewed(rng, mean)))
+        ]
+        if rows:
+            conn.execute(insert(model), rows)
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed the database with synthetic CoBoard data")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    for name, value in SCALES["small"].items():
+        parser.add_argument(f"--{name}", type=type(value), help=f"override the scale's {name}")
+    parser.add_argument("--seed", type=int, default=0, help="random seed, the same seed makes the same data")
+    parser.add_argument("--manifest", default="bench-data.json", help="where to write what was generated")
+    args = parser.parse_args()
+
+    scale = {name: value if getattr(args, name) is None else getattr(args, name) for name, value in SCALES[args.scale].items()}
+    rng = random.Random(args.seed)
+    # Ids are capped at 10 characters, so the run id keeps only the last four digits of the clock
+    run = f"{int(time.time()) % 10000:04d}"
+
+    models.Base.metadata.create_all(bind=engine)
+    search.ensure_index(engine)
+    os.makedirs(uploads.UPLOAD_DIR, exist_ok=True)
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        students, anonymous = seed_users(conn, run, scale["users"])
+    boards = []
+    file_ids = []
+    for b in range(scale["boards"]):
+        # One transaction per board keeps each one short on large scales
+        with engine.begin() as conn:
+            board, files = seed_board(conn, rng, f"bench{run}-{b}", scale, students, anonymous)
+        boards.append(board)
+        file_ids.extend(files)
+        print(f"seeded board {board['board']}: {len(board['forums'])} forums")
+    with engine.begin() as conn:
+        forum_ids = conn.execute(select(models.Forum.forum_id).where(
+            models.Forum.board.in_([board["board"] for board in boards])
+        )).scalars().all()
+        seed_bookmarks(conn, rng, forum_ids, students, anonymous, scale["bookmarks"])
+    print(f"seeded {scale} in {time.perf_counter() - start:.1f} s")
+
+    manifest = {
+        "scale": scale,
+        "seed": args.seed,
+        "password": PASSWORD,
+        "words": WORDS,
+        "students": students,
+        "anonymous": anonymous,
+        "boards": boards,
+        "files": rng.sample(file_ids, min(len(file_ids), MANIFEST_FILES)),
+    }
+    with open(args.manifest, "w") as f:
+        json.dump(manifest, f)
+    print(f"manifest written to {args.manifest}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+# Serialization benchmark for the forum view
+#
+# Loads a forum with 10k posts (a comment and a file on every tenth post) once,
+# then times turning the loaded ORM tree into the JSON body three ways:
+#
+#   dicts           copy every __dict__, validate ForumResponse(**dicts), dump to JSON
+#   response_model  the same model handed to FastAPI, which validates it again
+#                   against response_model and encodes the result with json.dumps
+#   attributes      validate each part from the ORM objects (from_attributes),
+#                   assemble without revalidation, dump in pydantic-core (current)
+#
+# Usage: DATABASE_URL=sqlite:///bench.db python -m server.bench.serialize [posts]
+import asyncio
+import sys
+import time
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from sqlalchemy import insert
+from server.database import SessionLocal, engine
+from server import models, queries, schemas
+from server.main import forum_response, serialize
+
+POSTS = 10_000
+POSTS_PER_TOPIC = 100
+ROUNDS = 5
+
+def seed(conn, name, posts):
+    conn.execute(insert(models.SEUser).values(sid=name[-10:], spw="bench", username=name))
+    forum_id = conn.execute(insert(models.Forum).values(
+        forum_name=name, creator_id=name[-10:], slug=name, board=name
+    ).returning(models.Forum.forum_id)).scalar_one()
+    topic_ids = conn.execute(insert(models.Topic).returning(models.Topic.topic_id), [
+        {"text": f"topic {i}"} for i in range(-(-posts // POSTS_PER_TOPIC))
+    ]).scalars().all()
+    conn.execute(insert(models.ForumTopic), [{"forum_id": forum_id, "topic_id": topic_id} for topic_id in topic_ids])
+    post_ids = conn.execute(insert(models.Post).returning(models.Post.post_id), [
+        {"post_head": f"post {i}", "post_body": "bench post body " * 4, "heart": i % 7, "spost_creator": name[-10:]}
+        for i in range(posts)
+    ]).scalars().all()
+    conn.execute(insert(models.TopicPost), [
+        {"topic_id": topic_ids[i // POSTS_PER_TOPIC], "post_id": post_id} for i, post_id in enumerate(post_ids)
+    ])
+    commented = post_ids[::10]
+    comment_ids = conn.execute(insert(models.Comment).returning(models.Comment.comment_id), [
+        {"comment_text": "bench comment", "comment_heart": 0, "scomment_creator": name[-10:]} for _ in commented
+    ]).scalars().all()
+    conn.execute(insert(models.PostComment), [
+        {"post_id": post_id, "comment_id": comment_id} for post_id, comment_id in zip(commented, comment_ids)
+    ])
+    conn.execute(insert(models.File), [
+        {"filename": f"{name}_{post_id}.txt", "path": f"uploads/{name}_{post_id}.txt", "extension": "txt",
+         "s_owner": name[-10:], "post_id": post_id}
+        for post_id in commented
+    ])
+
+# The forum view as it was built before, from copied __dict__s
+def dict_response(db_forum, user):
+    response_data = db_forum.__dict__.copy()
+    response_data['icon'] = db_forum.icon_hash
+    response_data['creator'] = user.username
+    topic_data = []
+    for topic in db_forum.topics:
+        topic_dict = topic.__dict__.copy()
+        post_data = []
+        for post in topic.posts:
+            post_dict = post.__dict__.copy()
+            post_dict['pic'] = post.pic_hash
+            post_dict['comments'] = [comment.__dict__.copy() for comment in post.comments]
+            post_dict['files'] = [file.__dict__.copy() for file in post.files]
+            post_data.append(post_dict)
+        topic_dict['posts'] = post_data
+        topic_data.append(topic_dict)
+    response_data.update(topics=topic_data, tags=[], btags=[], sbookmarks=[], abookmarks=[], access=[])
+    return schemas.ForumResponse(**response_data)
+
+def run(name, build, posts):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        body = build()
+        best = min(best, time.perf_counter() - start)
+    print(f"{name:<15} {best * 1000:>8.1f} {posts / best:>12.0f} {len(body) / best / 1e6:>8.1f}")
+
+def main(posts):
+    models.Base.metadata.create_all(bind=engine)
+    name = f"serial{int(time.time())}"
+    with engine.begin() as conn:
+        seed(conn, name, posts)
+
+    db = SessionLocal()
+    try:
+        db_forum = db.scalar(queries.load_forum_tree(name, name))
+        user = db.get(models.SEUser, name[-10:])
+        field = create_model_field("Response", schemas.ForumResponse)
+        loop = asyncio.new_event_loop()
+
+        def via_response_model():
+            model = dict_response(db_forum, user)
+            content = loop.run_until_complete(serialize_response(field=field, response_content=model))
+            return JSONResponse(content).body
+
+        print(f"{'pipeline':<15} {'ms':>8} {'posts/s':>12} {'MB/s':>8}")
+        run("dicts", lambda: dict_response(db_forum, user).model_dump_json().encode(), posts)
+        run("response_model", via_response_model, posts)
+        run("attributes", lambda: serialize(forum_response(db_forum, user, [], [], [], [], [])), posts)
+        loop.close()
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else POSTS)
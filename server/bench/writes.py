@@ -0,0 +1,110 @@
+# Write-latency benchmark for the create endpoints
+#
+# Sends a run of requests to each write endpoint and reports how many
+# transactions were committed per request (one fsync each on a durable
+# database) together with the p50 and p99 latency. The run is saved with
+# server.bench.report, so runs from before and after a change to the write
+# path can be compared side by side:
+#
+#     python -m server.bench.report bench-results/OLD.json bench-results/NEW.json
+#
+# Usage: DATABASE_URL=postgresql://localhost/bench python -m server.bench.writes [--output bench-results]
+import argparse
+import time
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from server.database import SessionLocal, engine, async_engine
+from server import models, auth, querystats
+from server.bench import report
+from server.main import app
+from server.settings import settings
+
+REQUESTS = 200
+
+def seed(db, board):
+    users = [f"w{i:04d}{int(time.time()) % 100000:05d}" for i in range(REQUESTS)]
+    for sid in users:
+        db.add(models.SEUser(sid=sid, spw="bench", username=sid))
+    db.flush()
+    forum = models.Forum(forum_name=board, creator_id=users[0], slug=board, board=board)
+    topic = models.Topic(text="bench topic")
+    post = models.Post(post_head="bench post", heart=0, spost_creator=users[0])
+    tag = models.Tag(tag_text=f"{board}-tag", board=board)
+    db.add_all([forum, topic, post, tag])
+    db.flush()
+    db.add(models.ForumTopic(forum_id=forum.forum_id, topic_id=topic.topic_id))
+    db.add(models.TopicPost(topic_id=topic.topic_id, post_id=post.post_id))
+    db.commit()
+    return users, topic.topic_id, post.post_id, tag.tag_id
+
+def run(client, name, request):
+    commits = []
+    def count(conn):
+        commits.append(conn)
+
+    # Handlers run on the async engine when it is enabled
+    target = async_engine.sync_engine if async_engine is not None else engine
+    samples = report.Samples()
+    event.listen(target, "commit", count)
+    try:
+        for i in range(REQUESTS):
+            before = len(commits)
+            start = time.perf_counter()
+            response = request(i)
+            latency = time.perf_counter() - start
+            response.raise_for_status()
+            samples.record(latency, response.status_code, querystats.queries_of(response), len(commits) - before)
+    finally:
+        event.remove(target, "commit", count)
+    print(f"{name:<10} {len(commits) / REQUESTS:>10.2f} {report.percentile(samples.latencies, 50) * 1000:>8.2f} "
+          f"{report.percentile(samples.latencies, 99) * 1000:>8.2f}")
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the write endpoints and count their commits")
+    parser.add_argument("--output", default="bench-results", help="directory for the JSON report")
+    args = parser.parse_args()
+
+    models.Base.metadata.create_all(bind=engine)
+    client = TestClient(app)
+    board = f"writes{int(time.time())}"
+    db = SessionLocal()
+    try:
+        users, topic_id, post_id, tag_id = seed(db, board)
+    finally:
+        db.close()
+    # Every write is done as the forum's creator
+    client.headers["Authorization"] = f"Bearer {auth.issue_token(users[0], 'se')}"
+
+    base = f"/coboard/{board}/{board}"
+    print(f"{'endpoint':<10} {'commits/op':>10} {'p50 ms':>8} {'p99 ms':>8}")
+    samples = {}
+    start = time.perf_counter()
+    samples["forum"] = run(client, "forum", lambda i: client.post(f"/coboard/{board}/", json={
+        "forum_name": f"{board}-{i}", "creator_id": users[0], "slug": f"{board}-{i}", "board": board,
+        "tags": [{"tag_id": tag_id, "tag_text": f"{board}-tag", "board": board}],
+    }))
+    samples["topic"] = run(client, "topic", lambda i: client.post(f"{base}/topic", json={"text": f"topic {i}"}))
+    samples["post"] = run(client, "post", lambda i: client.post(f"{base}/post", params={"topic_id": topic_id}, json={
+        "post_head": f"post {i}", "spost_creator": users[0], "apost_creator": None,
+    }))
+    samples["comment"] = run(client, "comment", lambda i: client.post(f"{base}/comment", params={"post_id": post_id}, json={
+        "comment_text": f"comment {i}", "scomment_creator": users[0], "acomment_creator": None,
+    }))
+    samples["access"] = run(client, "access", lambda i: client.post(f"{base}/setting", params={"user_id": users[i]}))
+    elapsed = time.perf_counter() - start
+
+    config = {
+        "bench": "writes",
+        "database": make_url(settings.database_url).get_backend_name(),
+        "requests": REQUESTS,
+    }
+    result = report.build(config, samples, elapsed)
+    # The endpoints run one after another, so each one's throughput is over its own time
+    for name, result_of in result["endpoints"].items():
+        result_of["throughput"] = result_of["requests"] / sum(samples[name].latencies)
+    print(f"report written to {report.save(result, args.output)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+import hashlib
+import os
+import re
+import tempfile
+from server.settings import settings
+
+# Content-addressed store for images (forum icons, post pictures, avatars).
+# A blob is saved once under the sha256 of its bytes, so its key never changes
+# and it can be cached forever by browsers.
+BLOB_DIR = settings.blob_dir
+os.makedirs(BLOB_DIR, exist_ok=True)
+
+HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Leading bytes of the image formats the front end uploads, as (offset, bytes) pairs that must all match.
+# SVG is not served as an image: it can carry script, so it goes out as a plain download.
+SIGNATURES = [
+    ([(0, b"\x89PNG\r\n\x1a\n")], "image/png"),
+    ([(0, b"\xff\xd8\xff")], "image/jpeg"),
+    ([(0, b"GIF87a")], "image/gif"),
+    ([(0, b"GIF89a")], "image/gif"),
+    # RIFF alone also starts WAV and AVI files
+    ([(0, b"RIFF"), (8, b"WEBP")], "image/webp"),
+]
+
+def is_hash(value) -> bool:
+    return isinstance(value, str) and bool(HASH_PATTERN.match(value))
+
+def blob_path(blob_hash: str) -> str:
+    # Fan out by the first two characters to keep directories small
+    return os.path.join(BLOB_DIR, blob_hash[:2], blob_hash)
+
+def exists(blob_hash) -> bool:
+    return is_hash(blob_hash) and os.path.exists(blob_path(blob_hash))
+
+def put(data: bytes) -> str:
+    blob_hash = hashlib.sha256(data).hexdigest()
+    path = blob_path(blob_hash)
+    if os.path.exists(path):
+        return blob_hash
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temp file in the same directory and rename, so readers never see a partial blob
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            buffer.write(data)
+        os.replace(temp_path, path)
+    except Exception:
+        os.unlink(temp_path)
+        raise
+    return blob_hash
+
+def media_type(blob_hash: str) -> str:
+    with open(blob_path(blob_hash), "rb") as f:
+        head = f.read(16)
+    for signature, mime_type in SIGNATURES:
+        if all(head[offset:offset + len(data)] == data for offset, data in signature):
+            return mime_type
+    return "application/octet-stream"
@@ -0,0 +1,183 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Scopes a cached view depends on, bumped by the routes that change them
+def board_scope(board: str) -> str:
+    return f"board:{board}"
+
+def forum_scope(board: str, slug: str) -> str:
+    return f"forum:{board}:{slug}"
+
+def tags_scope(board: str) -> str:
+    return f"tags:{board}"
+
+USERS_SCOPE = "users"
+
+class MemoryBackend:
+    """Least recently used entries in this process, each kept for at most ttl seconds.
+
+    With several worker processes every one has its own copy, so another
+    worker's write is only seen once the entry expires.
+
+    Scope generations are bounded too: the least recently bumped scopes past
+    max_scopes are dropped. Generations come from one counter, and a scope
+    without a generation of its own reads the highest one dropped so far, so
+    no scope ever goes back to a generation that cached entries still carry.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, max_scopes: int = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.max_scopes = max_scopes or max_entries
+        self.scope_generations = OrderedDict()
+        self.clock = 0  # Last generation handed out
+        self.floor = 0  # Highest generation dropped
+
+    async def get(self, key: str):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes):
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def generations(self, scopes):
+        return [self.scope_generations.get(scope, self.floor) for scope in scopes]
+
+    async def bump(self, scopes):
+        self.increment(scopes)
+
+    def increment(self, scopes):
+        for scope in scopes:
+            self.clock += 1
+            self.scope_generations[scope] = self.clock
+            self.scope_generations.move_to_end(scope)
+        while len(self.scope_generations) > self.max_scopes:
+            _, generation = self.scope_generations.popitem(last=False)
+            self.floor = max(self.floor, generation)
+
+class RedisBackend:
+    """Entries in a Redis-compatible server shared by every worker, expired by the server after ttl seconds."""
+
+    def __init__(self, url: str, ttl: float, prefix: str = "coboard:cache:"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+    async def get(self, key: str):
+        return await self.redis.get(self.prefix + key)
+
+    async def set(self, key: str, value: bytes):
+        await self.redis.set(self.prefix + key, value, ex=self.ttl)
+
+    async def generations(self, scopes):
+        values = await self.redis.mget([f"{self.prefix}gen:{scope}" for scope in scopes])
+        return [int(value or 0) for value in values]
+
+    async def bump(self, scopes):
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for scope in scopes:
+                pipe.incr(f"{self.prefix}gen:{scope}")
+            await pipe.execute()
+
+class NullBackend:
+    async def get(self, key: str):
+        return None
+
+    async def set(self, key: str, value: bytes):
+        pass
+
+    async def generations(self, scopes):
+        return [0 for _ in scopes]
+
+    async def bump(self, scopes):
+        pass
+
+class ResponseCache:
+    """Serialized read models keyed on their parameters and the generation of every scope they depend on.
+
+    Invalidating a scope bumps its generation instead of deleting entries, so
+    a response built from data read before a write is stored under the old
+    generation and never served after it.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        # Awaited with the scopes of every invalidation, to pass them on to other workers
+        self.broadcast = None
+
+    # Whether each process holds its own entries, so invalidations have to reach the other workers
+    @property
+    def local(self) -> bool:
+        return isinstance(self.backend, MemoryBackend)
+
+    async def key(self, name: str, scopes, *params) -> str:
+        try:
+            generations = await self.backend.generations(scopes)
+        except Exception as e:
+            logger.error(f"Error while reading the response cache: {str(e)}")
+            return None
+        return json.dumps([name, *params, *generations])
+
+    async def get(self, key: str):
+        if key is None:
+            return None
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            logger.error(f"Error while reading the response cache: {str(e)}")
+            value = None
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes):
+        if key is None:
+            return
+        try:
+            await self.backend.set(key, value)
+        except Exception as e:
+            logger.error(f"Error while writing the response cache: {str(e)}")
+
+    async def invalidate(self, *scopes):
+        try:
+            await self.backend.bump(scopes)
+        except Exception as e:
+            logger.error(f"Error while invalidating the response cache: {str(e)}")
+        if self.local and self.broadcast:
+            await self.broadcast(scopes)
+
+    # Invalidation received from another worker
+    def invalidate_local(self, scopes):
+        if self.local:
+            self.backend.increment(scopes)
+
+def create_cache(backend: str, max_entries: int, ttl: float, redis_url: str) -> ResponseCache:
+    if backend == "none":
+        return ResponseCache(NullBackend())
+    if backend == "redis":
+        try:
+            return ResponseCache(RedisBackend(redis_url, ttl))
+        except ImportError as e:
+            logger.warning(f"Redis client unavailable ({e}), caching responses in memory")
+    return ResponseCache(MemoryBackend(max_entries, ttl))
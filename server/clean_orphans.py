@@ -0,0 +1,70 @@
+# Deletes topics, posts, comments and files left behind by forums deleted before deletes
+# cascaded, then removes upload files no File row points to.
+#
+# Usage: python -m server.clean_orphans
+import os
+from collections import Counter
+from sqlalchemy import delete, select
+from server.database import engine
+from server import models, queries, uploads
+
+# Rows still reachable from an existing forum
+LIVE_TOPICS = select(models.ForumTopic.topic_id).join(models.Forum, models.Forum.forum_id == models.ForumTopic.forum_id)
+LIVE_POSTS = select(models.TopicPost.post_id).where(models.TopicPost.topic_id.in_(LIVE_TOPICS))
+LIVE_COMMENTS = select(models.PostComment.comment_id).where(models.PostComment.post_id.in_(LIVE_POSTS))
+
+def orphan_ids(conn):
+    topic_ids = conn.execute(select(models.Topic.topic_id).where(models.Topic.topic_id.not_in(LIVE_TOPICS))).scalars().all()
+    post_ids = conn.execute(select(models.Post.post_id).where(models.Post.post_id.not_in(LIVE_POSTS))).scalars().all()
+    comment_ids = conn.execute(select(models.Comment.comment_id).where(models.Comment.comment_id.not_in(LIVE_COMMENTS))).scalars().all()
+    return topic_ids, post_ids, comment_ids
+
+# Link rows go before the rows they point at, as in queries.delete_forum_tree,
+# so the foreign keys hold with or without ON DELETE CASCADE
+def orphan_deletes(topic_ids, post_ids, comment_ids):
+    return [
+        *queries.delete_by_ids(models.PostComment, models.PostComment.comment_id, comment_ids),
+        *queries.delete_by_ids(models.PostComment, models.PostComment.post_id, post_ids),
+        *queries.delete_by_ids(models.Comment, models.Comment.comment_id, comment_ids),
+        *queries.delete_by_ids(models.TopicPost, models.TopicPost.post_id, post_ids),
+        *queries.delete_by_ids(models.TopicPost, models.TopicPost.topic_id, topic_ids),
+        *queries.delete_by_ids(models.Post, models.Post.post_id, post_ids),
+        delete(models.ForumTopic).where(models.ForumTopic.forum_id.not_in(select(models.Forum.forum_id))),
+        *queries.delete_by_ids(models.ForumTopic, models.ForumTopic.topic_id, topic_ids),
+        *queries.delete_by_ids(models.Topic, models.Topic.topic_id, topic_ids),
+    ]
+
+def main():
+    with engine.begin() as conn:
+        topic_ids, post_ids, comment_ids = orphan_ids(conn)
+        # Files point at posts, so they go first
+        files = []
+        for i in range(0, len(post_ids), queries.DELETE_CHUNK):
+            files += conn.execute(
+                delete(models.File)
+                .where(models.File.post_id.in_(post_ids[i:i + queries.DELETE_CHUNK]))
+                .returning(models.File.path)
+            ).scalars().all()
+        files += conn.execute(
+            delete(models.File)
+            .where(models.File.post_id.is_not(None), models.File.post_id.not_in(select(models.Post.post_id)))
+            .returning(models.File.path)
+        ).scalars().all()
+        print(f"file: deleted {len(files)} orphaned rows")
+        deleted = Counter()
+        for statement in orphan_deletes(topic_ids, post_ids, comment_ids):
+            deleted[statement.table.name] += conn.execute(statement).rowcount
+        for table, count in deleted.items():
+            print(f"{table}: deleted {count} orphaned rows")
+        referenced = {os.path.realpath(path) for path in conn.execute(select(models.File.path)).scalars() if path}
+
+    removed = 0
+    for entry in os.scandir(uploads.UPLOAD_DIR):
+        # Temp files belong to uploads in progress
+        if entry.is_file() and not entry.name.startswith(".upload-") and os.path.realpath(entry.path) not in referenced:
+            uploads.discard(entry.path)
+            removed += 1
+    print(f"{uploads.UPLOAD_DIR}: removed {removed} unreferenced files")
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,168 @@
+from contextlib import asynccontextmanager
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
 from server.settings import settings
+from server.metrics import InstrumentedQueuePool, InstrumentedAsyncQueuePool
+from server import querystats
+import logging
+
+logger = logging.getLogger(__name__)
 
 DATABASE_URL = settings.database_url
 
 if not DATABASE_URL:
     raise ValueError("DATABASE_URL environment variable is not set")
 
-# Create the SQLAlchemy engine
-engine = create_engine(DATABASE_URL)
+# Pool options from the settings, left out for in-memory SQLite which cannot pool
+def pool_options(url, poolclass):
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+    }
+
+# Async drivers for the databases we run on
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str):
+    url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(url.get_backend_name())
+    return url.set(drivername=drivername) if drivername else None
+
+# Create the async engine when enabled and the async driver is installed,
+# otherwise handlers fall back to the sync (psycopg2) engine in a thread pool
+async_engine = None
+AsyncSessionLocal = None
+
+if settings.async_db:
+    url = async_database_url(DATABASE_URL)
+    try:
+        if url is None:
+            raise ImportError(f"no async driver for {make_url(DATABASE_URL).get_backend_name()}")
+        async_engine = create_async_engine(url, **pool_options(url, InstrumentedAsyncQueuePool))
+        querystats.instrument(async_engine.sync_engine)
+        AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    except ImportError as e:
+        logger.warning(f"Async database driver unavailable ({e}), using the sync engine in a thread pool")
+
+# Create the SQLAlchemy engine. Next to the async engine it only serves startup, scripts
+# and metrics, so it keeps a single idle connection instead of a full pool.
+sync_pool_options = pool_options(DATABASE_URL, InstrumentedQueuePool)
+if async_engine is not None and sync_pool_options:
+    sync_pool_options["pool_size"] = 1
+engine = create_engine(DATABASE_URL, **sync_pool_options)
+querystats.instrument(engine)
 
 # Create a session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Define the base class for models
 Base = declarative_base()
+
+# Sessions for the thread pool fallback keep loaded values after commit,
+# like the async sessions, so handlers never hit the database from the event loop
+ThreadedSessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+class ThreadedResult:
+    """Awaitable wrapper around a streamed sync Result, fetching each partition in the thread pool."""
+
+    def __init__(self, result):
+        self.result = result
+
+    async def partitions(self, size=None):
+        partitions = self.result.partitions(size)
+        while True:
+            rows = await run_in_threadpool(next, partitions, None)
+            if rows is None:
+                return
+            yield rows
+
+class ThreadedSession:
+    """Awaitable wrapper around a sync Session with the AsyncSession methods the handlers use.
+
+    Each blocking call runs in the thread pool, so a slow query never stalls the event loop.
+    """
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, params=None):
+        return await run_in_threadpool(self.sync_session.execute, statement, params)
+
+    async def scalar(self, statement, params=None):
+        return await run_in_threadpool(self.sync_session.scalar, statement, params)
+
+    async def scalars(self, statement, params=None):
+        return await run_in_threadpool(self.sync_session.scalars, statement, params)
+
+    # Statements with the yield_per option read from a server-side cursor, one partition at a time
+    async def stream(self, statement, params=None):
+        return ThreadedResult(await run_in_threadpool(self.sync_session.execute, statement, params))
+
+    async def get(self, entity, ident):
+        return await run_in_threadpool(self.sync_session.get, entity, ident)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def refresh(self, instance):
+        await run_in_threadpool(self.sync_session.refresh, instance)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(fn, self.sync_session, *args, **kwargs)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+# Pools reported at /metrics
+def engine_pools():
+    pools = {"sync": engine.pool}
+    if async_engine is not None:
+        pools["async"] = async_engine.pool
+    return pools
+
+# Session for work outside a request (background tasks, scripts)
+@asynccontextmanager
+async def session_scope():
+    if AsyncSessionLocal is not None:
+        async with AsyncSessionLocal() as db:
+            yield db
+    else:
+        db = ThreadedSession(ThreadedSessionLocal())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+# Dependency that yields an AsyncSession, or a ThreadedSession when async is off
+async def get_db():
+    async with session_scope() as db:
+        yield db
@@ -0,0 +1,227 @@
+import os
+import secrets
+from email.utils import formatdate, parsedate_to_datetime
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+
+# Most ranges a client may ask for in one request before we just send the whole file
+MAX_RANGES = 16
+
+# MIME type by file extension
+MIME_TYPES = {
+    # Documents
+    'pdf': 'application/pdf',
+    'doc': 'application/msword',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'ppt': 'application/vnd.ms-powerpoint',
+    'pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
+    'xls': 'application/vnd.ms-excel',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+
+    # Media
+    'mp4': 'video/mp4',
+    'mp3': 'audio/mpeg',
+    'wav': 'audio/wav',
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'gif': 'image/gif',
+
+    # Code
+    'py': 'text/x-python',
+    'txt': 'text/plain',
+    'c': 'text/x-c',
+    'cpp': 'text/x-c++src',
+    'h': 'text/x-c',
+    'js': 'text/javascript',
+    'java': 'text/x-java-source',
+    'html': 'text/html',
+    'jsx': 'text/jsx',
+    'css': 'text/css',
+    'rs': 'text/rust',
+    'go': 'text/x-go',
+    'rb': 'text/x-ruby',
+    'php': 'text/x-php',
+    'sql': 'text/x-sql',
+    'xml': 'text/xml',
+    'json': 'application/json',
+    'yaml': 'text/yaml',
+    'md': 'text/markdown',
+
+    # Archives
+    'zip': 'application/zip',
+    'rar': 'application/x-rar-compressed',
+    'tar': 'application/x-tar',
+    '7z': 'application/x-7z-compressed'
+}
+
+# Headers for user uploaded content served from the API origin: browsers must not guess
+# another type than the one we send, and anything they do render gets no script and no origin
+SANDBOX_HEADERS = {
+    "X-Content-Type-Options": "nosniff",
+    "Content-Security-Policy": "default-src 'none'; sandbox",
+}
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+# Parse a Range header into inclusive (start, end) byte ranges.
+# Returns None when the header should be ignored and the whole file sent,
+# raises RangeNotSatisfiable when no range overlaps the file.
+def parse_range(header: str, size: int):
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes":
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, dash, last = part.partition("-")
+        if not dash:
+            return None
+        try:
+            if first == "":
+                # Suffix range: the last N bytes
+                length = int(last)
+                if length == 0:
+                    continue
+                ranges.append((max(size - length, 0), size - 1))
+            else:
+                start = int(first)
+                end = int(last) if last else None
+                if end is not None and end < start:
+                    return None
+                if start < size:
+                    ranges.append((start, size - 1 if end is None else min(end, size - 1)))
+        except ValueError:
+            return None
+
+    if len(ranges) > MAX_RANGES:
+        return None
+    if not ranges:
+        raise RangeNotSatisfiable()
+    return ranges
+
+def strip_weak(tag: str) -> str:
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+# Whether an If-None-Match header value matches the ETag (weak comparison)
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    return strip_weak(etag) in [strip_weak(tag) for tag in if_none_match.split(",")]
+
+# Whether an If-Range header value matches the ETag. Ranges need the strong comparison:
+# bytes of a weakly matching version may differ, so a weak tag on either side never matches.
+def if_range_matches(if_range: str, etag: str) -> bool:
+    if_range = if_range.strip()
+    return not etag.startswith("W/") and not if_range.startswith("W/") and if_range == etag
+
+# Conditional GET: If-None-Match wins, If-Modified-Since is only looked at without it
+def not_modified(headers, etag: str, mtime: float = None) -> bool:
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and mtime is not None:
+        try:
+            return int(mtime) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+async def read_range(path: str, start: int, end: int):
+    f = await run_in_threadpool(open, path, "rb")
+    try:
+        await run_in_threadpool(f.seek, start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await run_in_threadpool(f.read, min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await run_in_threadpool(f.close)
+
+async def read_multipart(path, ranges, size, content_type, boundary):
+    for start, end in ranges:
+        yield multipart_header(boundary, content_type, start, end, size)
+        async for chunk in read_range(path, start, end):
+            yield chunk
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+def multipart_header(boundary, content_type, start, end, size) -> bytes:
+    return (
+        f"\r\n--{boundary}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+    ).encode()
+
+# Serve a file on disk with ETag/Last-Modified validators, 304s and byte ranges
+def file_response(request, path: str, content_type: str, etag: str, headers: dict) -> Response:
+    stat = os.stat(path)
+    size = stat.st_size
+    headers = {
+        **headers,
+        **SANDBOX_HEADERS,
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+    }
+
+    if not_modified(request.headers, etag, stat.st_mtime):
+        return Response(status_code=304, headers=headers)
+
+    range_header = request.headers.get("range")
+    # If-Range: only honour the range when the client still has this exact version
+    if_range = request.headers.get("if-range")
+    if range_header and if_range is not None and not if_range_matches(if_range, etag):
+        range_header = None
+
+    ranges = None
+    if range_header:
+        try:
+            ranges = parse_range(range_header, size)
+        except RangeNotSatisfiable:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    if not ranges:
+        return StreamingResponse(
+            read_range(path, 0, size - 1),
+            headers={**headers, "Content-Type": content_type, "Content-Length": str(size)},
+        )
+
+    if len(ranges) == 1:
+        start, end = ranges[0]
+        return StreamingResponse(
+            read_range(path, start, end),
+            status_code=206,
+            headers={
+                **headers,
+                "Content-Type": content_type,
+                "Content-Range": f"bytes {start}-{end}/{size}",
+                "Content-Length": str(end - start + 1),
+            },
+        )
+
+    boundary = secrets.token_hex(16)
+    length = sum(
+        len(multipart_header(boundary, content_type, start, end, size)) + end - start + 1
+        for start, end in ranges
+    ) + len(f"\r\n--{boundary}--\r\n")
+    return StreamingResponse(
+        read_multipart(path, ranges, size, content_type, boundary),
+        status_code=206,
+        headers={
+            **headers,
+            "Content-Type": f"multipart/byteranges; boundary={boundary}",
+            "Content-Length": str(length),
+        },
+    )
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import logging
+import uuid
+from contextlib import asynccontextmanager
+from sqlalchemy.engine import make_url
+
+logger = logging.getLogger(__name__)
+
+# Sent instead of the events a subscriber was too slow to take, the client reloads the forum
+RESYNC = json.dumps({"type": "resync"})
+
+# Cache invalidations from other workers
+CACHE_CHANNEL = "cache"
+
+# Tells this process's messages apart from the other workers' on a shared broker
+WORKER_ID = uuid.uuid4().hex
+
+def forum_channel(board: str, slug: str) -> str:
+    return f"forum:{board}:{slug}"
+
+# Keeps a broker's listening connection up, reconnecting with backoff when it drops
+async def reconnecting(name: str, listen):
+    delay = 1
+    while True:
+        try:
+            await listen()
+            delay = 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"{name} event broker connection lost ({e}), reconnecting in {delay}s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30)
+
+class LocalBroker:
+    """Hands published events straight back to the hub, for a single worker process."""
+
+    def __init__(self):
+        self.deliver = None
+
+    async def start(self, deliver):
+        self.deliver = deliver
+
+    async def publish(self, channel: str, message: str):
+        if self.deliver:
+            self.deliver(channel, message)
+
+    async def stop(self):
+        pass
+
+class PostgresBroker:
+    """LISTEN/NOTIFY on the application database, one listening connection per worker.
+
+    Every channel shares one NOTIFY channel with the hub channel in the payload.
+    Postgres caps payloads at 8000 bytes, so a bigger event is sent as a resync.
+    """
+
+    NOTIFY_CHANNEL = "coboard_events"
+    MAX_PAYLOAD = 7999
+
+    def __init__(self, database_url: str):
+        import asyncpg
+
+        self.asyncpg = asyncpg
+        self.dsn = make_url(database_url).set(drivername="postgresql").render_as_string(hide_password=False)
+        self.connection = None
+        self.lock = asyncio.Lock()
+        self.task = None
+
+    async def start(self, deliver):
+        self.deliver = deliver
+        self.task = asyncio.create_task(reconnecting("Postgres", self.listen))
+
+    async def listen(self):
+        connection = await self.asyncpg.connect(self.dsn)
+        closed = asyncio.Event()
+        connection.add_termination_listener(lambda _: closed.set())
+        try:
+            await connection.add_listener(self.NOTIFY_CHANNEL, self.notified)
+            self.connection = connection
+            await closed.wait()
+        finally:
+            self.connection = None
+            if not connection.is_closed():
+                await connection.close()
+        raise ConnectionError("listening connection closed")
+
+    def notified(self, connection, pid, channel, payload):
+        envelope = json.loads(payload)
+        self.deliver(envelope["channel"], envelope["message"])
+
+    async def publish(self, channel: str, message: str):
+        if self.connection is None:
+            raise ConnectionError("not connected to Postgres")
+        payload = json.dumps({"channel": channel, "message": message})
+        if len(payload.encode()) > self.MAX_PAYLOAD:
+            payload = json.dumps({"channel": channel, "message": RESYNC})
+        async with self.lock:
+            await self.connection.execute("SELECT pg_notify($1, $2)", self.NOTIFY_CHANNEL, payload)
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+
+class RedisBroker:
+    """Redis pub/sub on one channel, with the hub channel in the payload."""
+
+    def __init__(self, url: str, channel: str = "coboard:events"):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.channel = channel
+        self.task = None
+
+    async def start(self, deliver):
+        self.deliver = deliver
+        self.task = asyncio.create_task(reconnecting("Redis", self.listen))
+
+    async def listen(self):
+        async with self.redis.pubsub() as pubsub:
+            await pubsub.subscribe(self.channel)
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    envelope = json.loads(message["data"])
+                    self.deliver(envelope["channel"], envelope["message"])
+
+    async def publish(self, channel: str, message: str):
+        await self.redis.publish(self.channel, json.dumps({"channel": channel, "message": message}))
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
+        await self.redis.aclose()
+
+def create_broker(kind: str, database_url: str, redis_url: str):
+    try:
+        if kind == "postgres":
+            if make_url(database_url).get_backend_name() != "postgresql":
+                raise ValueError("DATABASE_URL is not a PostgreSQL database")
+            return PostgresBroker(database_url)
+        if kind == "redis":
+            return RedisBroker(redis_url)
+    except (ImportError, ValueError) as e:
+        logger.warning(f"{kind} event broker unavailable ({e}), events stay in this process")
+    return LocalBroker()
+
+class EventHub:
+    """Fans events out to the clients subscribed to a channel in this process.
+
+    Events go out through the broker and come back in through deliver, so a
+    broker shared between workers lets every worker's clients see every write.
+    """
+
+    def __init__(self, broker, queue_size: int = 100):
+        self.broker = broker
+        self.queue_size = queue_size
+        self.subscribers = {}
+        self.listeners = {}
+
+    # Call fn(message) for every message on the channel, for in-process consumers like the cache
+    def listen(self, channel: str, fn):
+        self.listeners.setdefault(channel, []).append(fn)
+
+    async def start(self):
+        await self.broker.start(self.deliver)
+
+    async def stop(self):
+        await self.broker.stop()
+
+    # Publishing never fails the write that triggered it
+    async def publish(self, channel: str, event: dict):
+        try:
+            await self.broker.publish(channel, json.dumps(event))
+        except Exception as e:
+            logger.error(f"Error while publishing to {channel}: {str(e)}")
+
+    def deliver(self, channel: str, message: str):
+        for fn in self.listeners.get(channel, ()):
+            try:
+                fn(message)
+            except Exception as e:
+                logger.error(f"Error while handling a message on {channel}: {str(e)}")
+        for queue in self.subscribers.get(channel, ()):
+            if queue.full():
+                # Drop the backlog rather than let one slow client hold memory
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+            else:
+                queue.put_nowait(message)
+
+    @asynccontextmanager
+    async def subscribe(self, channel: str):
+        queue = asyncio.Queue(self.queue_size)
+        self.subscribers.setdefault(channel, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            subscribers = self.subscribers.get(channel)
+            subscribers.discard(queue)
+            if not subscribers:
+                del self.subscribers[channel]
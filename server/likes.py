@@ -0,0 +1,100 @@
+import asyncio
+import logging
+from sqlalchemy import update, func
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Like counter column of each likeable item type
+LIKE_COLUMNS = {
+    "post": (models.Post, models.Post.post_id, models.Post.heart),
+    "comment": (models.Comment, models.Comment.comment_id, models.Comment.comment_heart),
+}
+
+# Add to an item's like count in a single UPDATE ... RETURNING.
+# Returns the new count, or None when the item does not exist.
+async def add_likes(db, item_type: str, item_id: int, amount: int = 1):
+    model, key, counter = LIKE_COLUMNS[item_type]
+    statement = (
+        update(model)
+        .where(key == item_id)
+        .values({counter: func.coalesce(counter, 0) + amount})
+        .returning(counter)
+        .execution_options(synchronize_session=False)
+    )
+    return (await db.execute(statement)).scalar_one_or_none()
+
+class LikeBuffer:
+    """Coalesces likes in memory and writes them periodically, one UPDATE per item.
+
+    Under a burst of likes on a hot post this turns many row updates into a
+    few, at the cost of counts in the database lagging by up to one interval.
+    """
+
+    def __init__(self, session_factory, interval: float, on_flush=None):
+        self.session_factory = session_factory
+        self.interval = interval
+        self.on_flush = on_flush  # Awaited with the scopes of each written batch
+        self.pending = {}
+        self.scopes = set()
+        self.task = None
+        self.stopping = None
+
+    def add(self, item_type: str, item_id: int, scope=None) -> int:
+        key = (item_type, item_id)
+        self.pending[key] = self.pending.get(key, 0) + 1
+        if scope is not None:
+            self.scopes.add(scope)
+        return self.pending[key]
+
+    def pending_for(self, item_type: str, item_id: int) -> int:
+        return self.pending.get((item_type, item_id), 0)
+
+    async def flush(self):
+        if not self.pending:
+            return
+        # Swap the batch out first so likes arriving during the write go to the next one
+        batch, self.pending = self.pending, {}
+        scopes, self.scopes = self.scopes, set()
+        async with self.session_factory() as db:
+            try:
+                for (item_type, item_id), amount in batch.items():
+                    await add_likes(db, item_type, item_id, amount)
+                await db.commit()
+            except Exception as e:
+                await db.rollback()
+                # Put the batch back so the increments are retried on the next flush
+                self.requeue(batch, scopes)
+                logger.error(f"Error while flushing likes: {str(e)}")
+                return
+            except BaseException:
+                # Cancelled mid-write, keep the batch for whoever flushes next
+                self.requeue(batch, scopes)
+                raise
+        if self.on_flush:
+            await self.on_flush(scopes)
+
+    def requeue(self, batch, scopes):
+        for key, amount in batch.items():
+            self.pending[key] = self.pending.get(key, 0) + amount
+        self.scopes |= scopes
+
+    async def run(self):
+        while not self.stopping.is_set():
+            try:
+                await asyncio.wait_for(self.stopping.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            await self.flush()
+
+    def start(self):
+        self.stopping = asyncio.Event()
+        self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        # Let the loop finish the write in progress rather than cancelling it
+        if self.task:
+            self.stopping.set()
+            await self.task
+            self.task = None
+        await self.flush()
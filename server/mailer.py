@@ -0,0 +1,137 @@
+import asyncio
+import logging
+import smtplib
+from email.mime.text import MIMEText
+from email.mime.multipart import MIMEMultipart
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    pass
+
+def build_message(sender_email, receiver_email, subject, message):
+    msg = MIMEMultipart()
+    msg['From'] = sender_email
+    msg['To'] = receiver_email
+    msg['Subject'] = subject
+    msg.attach(MIMEText(message, 'plain'))
+    return msg
+
+# 5xx replies and refused recipients will fail the same way again
+def is_permanent(error):
+    if isinstance(error, (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPAuthenticationError)):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+class SMTPConnection:
+    """One SMTP session kept open between messages and reopened when the server drops it.
+
+    The calls block, so the queue runs them in the thread pool.
+    """
+
+    def __init__(self, host, port, username=None, password=None, starttls=True, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.timeout = timeout
+        self.smtp = None
+
+    def connect(self):
+        self.smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.starttls:
+            self.smtp.starttls()
+        if self.username and self.password:
+            self.smtp.login(self.username, self.password)
+
+    def send(self, msg):
+        if self.smtp is None:
+            self.connect()
+        try:
+            self.smtp.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            # The server closed an idle connection, open a new one and try once more
+            self.close()
+            self.connect()
+            self.smtp.send_message(msg)
+
+    def close(self):
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            self.smtp.close()
+        self.smtp = None
+
+class MailQueue:
+    """In-process mail queue drained by a pool of workers, each with its own SMTP connection.
+
+    Failed sends are retried with exponential backoff; connections idle for
+    idle_timeout seconds are closed and reopened on the next message.
+    """
+
+    def __init__(self, connection_factory, workers=2, max_retries=3, retry_backoff=1.0, max_size=1000, idle_timeout=60.0):
+        self.connection_factory = connection_factory
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_timeout = idle_timeout
+        self.queue = asyncio.Queue(maxsize=max_size)
+        self.tasks = []
+        self.sent = 0
+        self.failed = 0
+
+    def enqueue(self, msg):
+        try:
+            self.queue.put_nowait(msg)
+        except asyncio.QueueFull:
+            raise QueueFull("Mail queue is full")
+
+    async def deliver(self, connection, msg):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await run_in_threadpool(connection.send, msg)
+                self.sent += 1
+                return
+            except (smtplib.SMTPException, OSError) as e:
+                await run_in_threadpool(connection.close)
+                if is_permanent(e) or attempt == self.max_retries:
+                    self.failed += 1
+                    logger.error(f"Failed to send mail to {msg['To']}: {e}")
+                    return
+                delay = self.retry_backoff * 2 ** attempt
+                logger.warning(f"Sending mail to {msg['To']} failed ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+    async def worker(self):
+        connection = self.connection_factory()
+        try:
+            while True:
+                try:
+                    msg = await asyncio.wait_for(self.queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    await run_in_threadpool(connection.close)
+                    continue
+                try:
+                    await self.deliver(connection, msg)
+                finally:
+                    self.queue.task_done()
+        finally:
+            await run_in_threadpool(connection.close)
+
+    def start(self):
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+    # Give queued mail up to timeout seconds to go out, then stop the workers
+    async def stop(self, timeout=10.0):
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropping {self.queue.qsize()} unsent mails on shutdown")
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
@@ -1,23 +1,28 @@
-from fastapi import FastAPI, Depends, HTTPException, Body, Form, UploadFile, File
-from fastapi.responses import FileResponse
+from fastapi import FastAPI, Depends, HTTPException, Body, Form, UploadFile, File, Query, BackgroundTasks, Header
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, PlainTextResponse, JSONResponse, StreamingResponse, ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy import desc
-from typing import Union
-from .database import SessionLocal, engine
-from . import models, schemas
+from sqlalchemy import select, delete
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import List, Union, Optional
+from .database import engine, engine_pools, get_db, session_scope
+from .settings import settings
+from . import models, schemas, queries, blobs, metrics, likes, uploads, downloads, mailer, cache, events, search, auth, querystats
+import asyncio
+import json
 import logging
 import base64
-import shutil
 import os
 from datetime import date
 import urllib.parse
-import subprocess
+import hashlib
 
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI()
+# Responses left to FastAPI (plain dicts and ORM objects) are encoded with orjson
+app = FastAPI(default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -25,73 +30,231 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Disposition"]
+    expose_headers=["Content-Disposition", "Content-Range", "ETag", "Server-Timing"]
 )
 
 models.Base.metadata.create_all(bind=engine)
 
 logger = logging.getLogger(__name__)
 
-UPLOAD_DIR = "uploads/"
+UPLOAD_DIR = uploads.UPLOAD_DIR
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
 TARGET_URL = "https://www.se.kmitl.ac.th/"
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+event_hub = events.EventHub(
+    events.create_broker(settings.event_broker, settings.database_url, settings.redis_url),
+    settings.event_queue_size,
+)
+
+response_cache = cache.create_cache(settings.cache_backend, settings.cache_max_entries, settings.cache_ttl, settings.redis_url)
+
+# Cache entries are per process unless they live in Redis, so invalidations go to every worker
+async def broadcast_invalidation(scopes):
+    await event_hub.publish(events.CACHE_CHANNEL, {"origin": events.WORKER_ID, "scopes": list(scopes)})
+
+def invalidation_received(message: str):
+    invalidation = json.loads(message)
+    if invalidation["origin"] != events.WORKER_ID:
+        response_cache.invalidate_local(invalidation["scopes"])
+
+response_cache.broadcast = broadcast_invalidation
+event_hub.listen(events.CACHE_CHANNEL, invalidation_received)
+
+# Buffered likes reach the database on the next flush, bump the revisions of the
+# forums they are in and drop their cached views then
+async def likes_flushed(forums):
+    async with session_scope() as db:
+        await db.execute(queries.bump_revision(models.Forum.forum_id.in_([forum_id for forum_id, _, _ in forums])))
+        await db.commit()
+    await response_cache.invalidate(*[cache.forum_scope(board, slug) for _, board, slug in forums])
+
+like_buffer = likes.LikeBuffer(session_scope, settings.like_flush_interval, likes_flushed) if settings.like_buffer else None
+
+def smtp_connection():
+    return mailer.SMTPConnection(
+        settings.smtp_host,
+        settings.smtp_port,
+        settings.smtp_username,
+        settings.smtp_password,
+        settings.smtp_starttls,
+    )
 
-# Route to get all forums from a specific board
+mail_queue = mailer.MailQueue(
+    smtp_connection,
+    workers=settings.mail_workers,
+    max_retries=settings.mail_max_retries,
+    retry_backoff=settings.mail_retry_backoff,
+    max_size=settings.mail_queue_size,
+)
+
+# Cap the raw request body of uploads, whether or not it announces its length
+app.add_middleware(uploads.UploadSizeLimit, paths=["/file"], max_size=settings.max_upload_size + uploads.FORM_OVERHEAD)
+
+# Report the SQL statements behind each response in a Server-Timing header (count, total and slowest).
+# Statements a streamed body runs after the headers are sent are not included.
+@app.middleware("http")
+async def track_queries(request: Request, call_next):
+    with querystats.track() as stats:
+        response = await call_next(request)
+    response.headers["Server-Timing"] = stats.server_timing()
+    if stats.count:
+        logger.debug(f"{request.method} {request.url.path}: {stats.count} queries in {stats.total * 1000:.1f} ms, "
+                     f"slowest {stats.slowest * 1000:.1f} ms: {stats.slowest_statement}")
+    return response
+
+@app.on_event("startup")
+async def start_background_tasks():
+    if like_buffer:
+        like_buffer.start()
+    mail_queue.start()
+    await event_hub.start()
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    if like_buffer:
+        await like_buffer.stop()
+    await mail_queue.stop()
+    await event_hub.stop()
+
+# Helper to save an uploaded image (base64) in the blob store and return its hash
+def store_image(value: str) -> str:
+    # Clients send back the hash they were given when the image is unchanged
+    if blobs.exists(value):
+        return value
+    try:
+        data = base64.b64decode(value)
+    except base64.binascii.Error:
+        raise HTTPException(status_code=400, detail="Invalid base64 for icon")
+    if len(data) > 1048576:  # Limit to 1 MB
+        raise HTTPException(status_code=400, detail="Icon file too large")
+    return blobs.put(data)
+
+# Dependency for routes that write: the claims of the session token from /auth/login,
+# sent as "Authorization: Bearer <token>"
+def current_user(authorization: Optional[str] = Header(None)) -> dict:
+    scheme, _, token = (authorization or "").partition(" ")
+    claims = auth.read_token(token) if scheme.lower() == "bearer" else None
+    if claims is None:
+        raise HTTPException(status_code=401, detail="Not logged in", headers={"WWW-Authenticate": "Bearer"})
+    return claims
+
+# Helper to let a write through only when it is done as one of the given users
+def require_user(claims: dict, *user_ids):
+    if claims["sub"] not in user_ids:
+        raise HTTPException(status_code=403, detail="Not allowed for this user")
+
+# Helper to read a pagination cursor from the query string
+def parse_cursor(cursor: Optional[str]):
+    if cursor is None:
+        return None
+    try:
+        return queries.decode_cursor(cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+# Drop the cached board listing and forum view after a write to the forum
+async def invalidate_forum(board: str, slug: str, tags: bool = False):
+    scopes = [cache.board_scope(board), cache.forum_scope(board, slug)]
+    if tags:
+        scopes.append(cache.tags_scope(board))
+    await response_cache.invalidate(*scopes)
+
+# Weak ETag over the (forum_id, revision) pairs behind a view
+def revision_etag(revisions) -> str:
+    digest = hashlib.blake2b(digest_size=8)
+    for forum_id, revision in revisions:
+        digest.update(f"{forum_id}:{revision};".encode())
+    return f'W/"{digest.hexdigest()}"'
+
+def not_modified_response(etag: str):
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+# Validated models go straight to JSON bytes in pydantic-core, without a dict round trip
+def serialize(model) -> bytes:
+    return model.__pydantic_serializer__.to_json(model)
+
+# Returning a Response skips FastAPI validating the model a second time against response_model
+def model_response(model):
+    return Response(content=serialize(model), media_type="application/json")
+
+def json_response(body: bytes, etag: str = None):
+    # no-cache: browsers may keep the response but must revalidate it with the ETag
+    headers = {"ETag": etag, "Cache-Control": "no-cache"} if etag else None
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# Route to get all forums from a specific board, or one page of them when limit is given.
+# With tag, only forums carrying any (match=any) or all (match=all) of the tags are listed.
 @app.get("/coboard/{board}/", response_model=schemas.BoardResponse)
-async def get_forums(board: str, db: Session = Depends(get_db)):
+async def get_forums(
+    request: Request,
+    board: str,
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = None,
+    tag: Optional[List[int]] = Query(None),
+    match: str = Query("any", pattern="^(any|all)$"),
+    tag_limit: Optional[int] = Query(None, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    before_id = parse_cursor(cursor)
+    tag_ids = sorted(set(tag)) if tag else None
+
+    # The forums on the page with their revisions, and the board's top tags with their use,
+    # are enough to tell whether the client's copy is current
+    revisions = (await db.execute(queries.board_revisions(
+        board, before_id, limit + 1 if limit else None, tag_ids, match
+    ))).all()
+    tags = (await db.scalars(queries.top_tags(board, tag_limit))).all()
+    etag = revision_etag([*revisions, *((f"tag{t.tag_id}", t.use) for t in tags)])
+    if downloads.not_modified(request.headers, etag):
+        return not_modified_response(etag)
+
+    # Keyed on the ETag too, so a body is never served with the validator of another revision
+    cache_key = await response_cache.key(
+        "board", [cache.board_scope(board)], board, limit, before_id, tag_ids, match, tag_limit, etag
+    )
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached, etag)
     try:
-        forums = db.query(models.Forum).filter(models.Forum.board == board).order_by(desc(models.Forum.forum_id)).all()
-        
-        forum_data = []
-        for forum in forums:
-            # Prepare the forum data dictionary
-            forum_dict = forum.__dict__.copy()
-            forum_dict['icon'] = base64.b64encode(forum.icon).decode('utf-8') if forum.icon else None
-
-            # Calculate total contributors
-            topics = db.query(models.Topic).join(models.ForumTopic).filter(
-                models.ForumTopic.forum_id == forum.forum_id
-            ).all()
-            contributors_set = set()
-
-            for topic in topics:
-                posts = db.query(models.Post).join(models.TopicPost).filter(
-                    models.TopicPost.topic_id == topic.topic_id
-                ).all()
-                for post in posts:
-                    contributors_set.add(post.spost_creator or post.apost_creator)
-                    comments = db.query(models.Comment).join(models.PostComment).filter(
-                        models.PostComment.post_id == post.post_id
-                    ).all()
-                    for comment in comments:
-                        contributors_set.add(comment.scomment_creator or comment.acomment_creator)
-
-            contributors_set.discard(forum.creator_id)
-            forum_dict['total_contributors'] = len(contributors_set)  # Add total contributors count
-            
-            forum_data.append(schemas.ForumWithContributors(**forum_dict))  # Use the new schema
-
-        # Fetch tags, forumtag, and access data as usual
-        tags = db.query(models.Tag).filter(models.Tag.board == board).order_by(desc(models.Tag.use)).all()
-        tag_data = [schemas.Tag(**tag.__dict__) for tag in tags]
+        # Forums and their contributor counts come back from a single aggregate query.
+        # One extra row is read to know whether there is a next page.
+        rows = (await db.execute(queries.forums_with_contributors(
+            board, before_id, limit + 1 if limit else None, tag_ids, match
+        ))).all()
+
+        next_cursor = None
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = queries.encode_cursor(rows[-1][0].forum_id)
+
+        forums = [forum for forum, _ in rows]
+
+        # Validated straight from the ORM objects, and assembled without revalidation
+        forum_data = [
+            schemas.ForumWithContributors.model_construct(
+                **dict(schemas.Forum.model_validate(forum)), total_contributors=total_contributors
+            )
+            for forum, total_contributors in rows
+        ]
 
         forum_ids = [forum.forum_id for forum in forums]
-        forumtag = db.query(models.ForumTag).filter(models.ForumTag.forum_id.in_(forum_ids)).all()
-        forumtag_data = [schemas.ForumTag(**ft.__dict__) for ft in forumtag]
+        forumtag = (await db.scalars(select(models.ForumTag).where(models.ForumTag.forum_id.in_(forum_ids)))).all()
+        forumtag_data = [schemas.ForumTag.model_validate(ft) for ft in forumtag]
 
-        access = db.query(models.Access).filter(models.Access.forum_id.in_(forum_ids)).all()
-        access_data = [schemas.Access(**a.__dict__) for a in access]
+        # Only the top tags of the board and the tags of the forums on this page are sent
+        missing = {ft.tag_id for ft in forumtag} - {tag.tag_id for tag in tags}
+        if missing:
+            tags = [*tags, *(await db.scalars(select(models.Tag).where(models.Tag.tag_id.in_(sorted(missing))))).all()]
+        tag_data = [schemas.Tag.model_validate(tag) for tag in tags]
+
+        access = (await db.scalars(select(models.Access).where(models.Access.forum_id.in_(forum_ids)))).all()
+        access_data = [schemas.Access.model_validate(a) for a in access]
 
         # Return data with forums using ForumWithContributors schema
-        return schemas.BoardResponse(forums=forum_data, tags=tag_data, forumtag=forumtag_data, access=access_data)
+        body = serialize(schemas.BoardResponse.model_construct(forums=forum_data, tags=tag_data, forumtag=forumtag_data, access=access_data, next_cursor=next_cursor))
+        await response_cache.set(cache_key, body)
+        return json_response(body, etag)
 
     except SQLAlchemyError as e:
         logger.error(f"Database error while fetching forums: {str(e)}")
@@ -100,25 +263,49 @@ async def get_forums(board: str, db: Session = Depends(get_db)):
         logger.error(f"Unexpected error while fetching forums: {str(e)}")
         raise HTTPException(status_code=500, detail="An unexpected error occurred")
 
+# Route to search the forums, posts and comments of a board, best match first
+@app.get("/coboard/{board}/search", response_model=schemas.SearchResponse)
+async def search_board(
+    board: str,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    # Results are ranked, so the cursor holds the offset of the next page
+    offset = parse_cursor(cursor) or 0
+    if offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not q.split():
+        return model_response(schemas.SearchResponse(results=[]))
+    try:
+        rows = (await db.execute(search.search_statement(engine.dialect.name, board, q, offset, limit + 1))).all()
+    except SQLAlchemyError as e:
+        await db.rollback()
+        # The index is built by a migration, not at startup
+        if not await db.run_sync(lambda session: search.index_ready(session.connection())):
+            raise HTTPException(status_code=503, detail="Search index missing, run python -m server.migrate_search")
+        logger.error(f"Database error while searching: {str(e)}")
+        raise HTTPException(status_code=500, detail="Database error occurred")
+
+    next_cursor = queries.encode_cursor(offset + limit) if len(rows) > limit else None
+    results = [schemas.SearchResult(**row._mapping) for row in rows[:limit]]
+    return model_response(schemas.SearchResponse(results=results, next_cursor=next_cursor))
+
 # Route to post new forum in specific board
 @app.post("/coboard/{board}/", response_model=schemas.Forum)
 async def create_forum(
     board: str,
     forum: schemas.ForumCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    claims: dict = Depends(current_user),
 ):
+    require_user(claims, forum.creator_id)
     try:
         if board != forum.board:
             raise HTTPException(status_code=400, detail="Board in URL doesn't match board in forum data")
         
-        icon_data = None
-        if forum.icon:
-            try:
-                icon_data = base64.b64decode(forum.icon)
-                if len(icon_data) > 1048576:
-                    raise HTTPException(status_code=400, detail="Icon file too large")
-            except base64.binascii.Error:
-                raise HTTPException(status_code=400, detail="Invalid base64 for icon")
+        icon_hash = store_image(forum.icon) if forum.icon else None
         
         # Create the new forum instance
         new_forum = models.Forum(
@@ -131,31 +318,37 @@ async def create_forum(
             sort_by=forum.sort_by,
             slug=forum.slug,
             board=forum.board,
-            icon=icon_data
+            icon_hash=icon_hash
         )
         
-        # Add the forum to the session and commit to get the forum_id
+        # Add the forum to the session and flush to get the forum_id
         db.add(new_forum)
-        db.commit()  # This will generate the forum_id
-        db.refresh(new_forum)  # Refresh to get the updated object
+        await db.flush()  # This will generate the forum_id
         
-        # Handle tags if provided
+        # Handle tags if provided, looked up in one query
         if hasattr(forum, 'tags') and forum.tags is not None:
+            tag_ids = [tag.tag_id for tag in forum.tags]
+            existing_tags = set((await db.scalars(select(models.Tag.tag_id).where(models.Tag.tag_id.in_(tag_ids)))).all())
             for tag in forum.tags:
-                tag_exists = db.query(models.Tag).filter(models.Tag.tag_id == tag.tag_id).first()
-                if tag_exists:
+                if tag.tag_id in existing_tags:
                     new_forum_tag = models.ForumTag(
                         forum_id=new_forum.forum_id,
                         tag_id=tag.tag_id
                     )
                     db.add(new_forum_tag)
-                    tag_exists.use += 1
                 else:
-                    db.rollback()
+                    await db.rollback()
                     raise HTTPException(status_code=400, detail=f"Tag with ID {tag.tag_id} does not exist")
+            if existing_tags:
+                await db.execute(queries.shift_tag_use(added=existing_tags))
         
-        # Commit the tags
-        db.commit()
+        # Tag use counts show in every forum of the board
+        if forum.tags:
+            await db.execute(queries.bump_revision(models.Forum.board == new_forum.board))
+
+        # Commit the forum and its tags together
+        await db.commit()
+        await invalidate_forum(new_forum.board, new_forum.slug, tags=bool(forum.tags))
         
         # Prepare response data
         response_data = {
@@ -169,15 +362,13 @@ async def create_forum(
             "sort_by": new_forum.sort_by,
             "slug": new_forum.slug,
             "board": new_forum.board,
+            "icon": new_forum.icon_hash,
         }
         
-        if new_forum.icon:
-            response_data['icon'] = base64.b64encode(new_forum.icon).decode('utf-8')
-        
-        return schemas.Forum(**response_data)
+        return model_response(schemas.Forum(**response_data))
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         error_msg = f"Database error while creating forum: {str(e)}"
         raise HTTPException(status_code=500, detail=error_msg)
     except HTTPException as he:
@@ -187,117 +378,190 @@ async def create_forum(
         error_msg = f"Unexpected error while creating forum: {str(e)}"
         raise HTTPException(status_code=500, detail=error_msg)
 
-# Route to get all topics and forum detail from a specific forum
+# Route to get all topics and forum detail from a specific forum,
+# or one page of its posts when limit is given, or the whole forum as NDJSON with stream=1
 @app.get("/coboard/{board}/{forum_name}/", response_model=schemas.ForumResponse)
 async def get_topics(
+    request: Request,
     board: str,
     forum_name: str,
-    db: Session = Depends(get_db)
+    limit: Optional[int] = Query(None, ge=1, le=100),
+    cursor: Optional[str] = None,
+    stream: bool = False,
+    db: AsyncSession = Depends(get_db)
 ):
+    after_id = parse_cursor(cursor)
+
+    # Answer a matching If-None-Match from the forum's revision alone, without loading the tree
+    etag = None
+    revision = (await db.execute(queries.forum_revision(board, forum_name))).first()
+    if revision:
+        etag = revision_etag([revision])
+        if downloads.not_modified(request.headers, etag):
+            return not_modified_response(etag)
+
+    if stream:
+        return await forum_dump(db, board, forum_name, etag)
+
+    scopes = [cache.forum_scope(board, forum_name), cache.tags_scope(board), cache.USERS_SCOPE]
+    cache_key = await response_cache.key("forum", scopes, board, forum_name, limit, after_id, etag)
+    cached = await response_cache.get(cache_key)
+    if cached is not None:
+        return json_response(cached, etag)
     try:
-        db_forum = db.query(models.Forum).filter(
-            models.Forum.board == board,
-            models.Forum.slug == forum_name
-        ).first()
-        
-        if not db_forum:
-            raise HTTPException(status_code=404, detail="Forum not found")
-        
-        response_data = db_forum.__dict__.copy()
-        if db_forum.icon:
-            response_data['icon'] = base64.b64encode(db_forum.icon).decode('utf-8')
+        next_cursor = None
+        if limit:
+            # Load the topics, then one page of posts across them ordered by post_id
+            db_forum = await db.scalar(queries.load_forum_topics(board, forum_name))
+            if not db_forum:
+                raise HTTPException(status_code=404, detail="Forum not found")
+
+            rows = (await db.execute(queries.forum_posts_page(db_forum.forum_id, after_id, limit + 1))).all()
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = queries.encode_cursor(rows[-1][0].post_id)
+
+            posts_by_topic = {topic.topic_id: [] for topic in db_forum.topics}
+            for post, topic_id in rows:
+                posts_by_topic[topic_id].append(post)
+            # Topics carry only this page of posts, so they serialize like fully loaded ones
+            for topic in db_forum.topics:
+                set_committed_value(topic, "posts", posts_by_topic[topic.topic_id])
+        else:
+            # Load the forum with its topics, posts, comments and files in batched queries
+            db_forum = await db.scalar(queries.load_forum_tree(board, forum_name))
+            if not db_forum:
+                raise HTTPException(status_code=404, detail="Forum not found")
+
+        response = forum_response(db_forum, *await forum_details(db, board, db_forum), next_cursor)
+        body = serialize(response)
+        await response_cache.set(cache_key, body)
+        return json_response(body, etag)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        user = db.query(models.SEUser).filter(models.SEUser.sid == db_forum.creator_id).first()
+# Creator, tags, board tags, bookmarks and access list shown alongside a forum
+async def forum_details(db: AsyncSession, board: str, db_forum):
+    user = await db.scalar(select(models.SEUser).where(models.SEUser.sid == db_forum.creator_id))
 
-        if user.username :
-            response_data['creator'] = user.username
+    # Fetch associated tags
+    tags = (await db.scalars(select(models.Tag).join(models.ForumTag).where(
+        models.ForumTag.forum_id == db_forum.forum_id
+    ))).all()
 
-        # Fetch associated tags
-        tags = db.query(models.Tag).join(models.ForumTag).filter(
-            models.ForumTag.forum_id == db_forum.forum_id
-        ).all()
-        tag_data = [tag.__dict__.copy() for tag in tags]
+    board_tag = (await db.scalars(queries.top_tags(board))).all()
 
-        board_tag = db.query(models.Tag).filter(models.Tag.board == board).order_by(desc(models.Tag.use)).all()
-        board_tag_data = [bt.__dict__.copy() for bt in board_tag]
+    sbookmark = (await db.scalars(select(models.SBookmark).where(models.SBookmark.forum_id == db_forum.forum_id))).all()
 
-        sbookmark = db.query(models.SBookmark).filter(models.SBookmark.forum_id == db_forum.forum_id).all()
-        sbookmark_data = [sbm.__dict__.copy() for sbm in sbookmark]
+    abookmark = (await db.scalars(select(models.ABookmark).where(models.ABookmark.forum_id == db_forum.forum_id))).all()
 
-        abookmark = db.query(models.ABookmark).filter(models.ABookmark.forum_id == db_forum.forum_id).all()
-        abookmark_data = [abm.__dict__.copy() for abm in abookmark]
+    access = (await db.scalars(select(models.Access).where(models.Access.forum_id == db_forum.forum_id))).all()
 
-        access = db.query(models.Access).filter(models.Access.forum_id == db_forum.forum_id).all()
-        access_data = [schemas.Access(**a.__dict__) for a in access]
-        
-        # Fetch topics associated with the forum
-        topics = db.query(models.Topic).join(models.ForumTopic).filter(
-            models.ForumTopic.forum_id == db_forum.forum_id
-        ).all()
-        
-        topic_data = []
-        for topic in topics:
-            topic_dict = topic.__dict__.copy()
-            
-            # Fetch posts for each topic
-            posts = db.query(models.Post).join(models.TopicPost).filter(
-                models.TopicPost.topic_id == topic.topic_id
-            ).all()
-            
-            post_data = []
-            for post in posts:
-                post_dict = post.__dict__.copy()
-                post_dict['pic'] = base64.b64encode(post.pic).decode('utf-8') if post.pic else None
-                
-                # Fetch comments for each post
-                comments = db.query(models.Comment).join(models.PostComment).filter(
-                    models.PostComment.post_id == post.post_id
-                ).all()
-                post_dict['comments'] = [comment.__dict__.copy() for comment in comments]
-                
-                # Fetch files for each post
-                files = db.query(models.File).filter(models.File.post_id == post.post_id).all()               
-                post_dict['files'] = [file.__dict__.copy() for file in files]
-
-                post_data.append(post_dict)
-            
-            topic_dict['posts'] = post_data
-            topic_data.append(topic_dict)
+    return user, tags, board_tag, sbookmark, abookmark, access
 
-        response_data['btags'] = board_tag_data
-        response_data['tags'] = tag_data
-        response_data['topics'] = topic_data
-        response_data['sbookmarks'] = sbookmark_data
-        response_data['abookmarks'] = abookmark_data
-        response_data['access'] = access_data
-        return schemas.ForumResponse(**response_data)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+# One NDJSON line, {"<kind>": <model>}
+def ndjson_line(kind: str, model, exclude=None) -> bytes:
+    return b'{"%s":%s}\n' % (kind.encode(), model.__pydantic_serializer__.to_json(model, exclude=exclude))
+
+# The whole forum as NDJSON: a "forum" line with the forum details, then every topic as a
+# "topic" line followed by a "post" line (with its comments and files) per post.
+# Posts are read from a server-side cursor and sent a batch at a time, so memory stays flat
+# however large the forum is and the first line goes out before any post is read.
+async def forum_dump(db: AsyncSession, board: str, forum_name: str, etag: str):
+    db_forum = await db.scalar(queries.load_forum_topics(board, forum_name))
+    if not db_forum:
+        raise HTTPException(status_code=404, detail="Forum not found")
+    topics = sorted(db_forum.topics, key=lambda topic: topic.topic_id)
+    # Posts follow their topic line instead of being nested in it
+    for topic in topics:
+        set_committed_value(topic, "posts", [])
+    header = ndjson_line("forum", forum_response(db_forum, *await forum_details(db, board, db_forum)), {"topics", "next_cursor"})
+    statement = queries.forum_posts_by_topic(db_forum.forum_id, settings.stream_batch_size)
+
+    async def lines():
+        yield header
+        sent = 0
+        # The request's session is closed once the handler returns, so the cursor gets its own
+        async with session_scope() as session:
+            try:
+                result = await session.stream(statement)
+                async for rows in result.partitions():
+                    chunk = []
+                    for post, topic_id in rows:
+                        while sent < len(topics) and topics[sent].topic_id <= topic_id:
+                            chunk.append(ndjson_line("topic", schemas.Topic.model_validate(topics[sent]), {"posts"}))
+                            sent += 1
+                        chunk.append(ndjson_line("post", schemas.Post.model_validate(post)))
+                    yield b"".join(chunk)
+            except Exception as e:
+                # The status line is already sent, so the client only sees the stream cut short
+                logger.error(f"Forum dump of {board}/{forum_name} failed: {e}")
+                raise
+        yield b"".join(ndjson_line("topic", schemas.Topic.model_validate(topic), {"posts"}) for topic in topics[sent:])
+
+    headers = {"ETag": etag, "Cache-Control": "no-cache"} if etag else None
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+
+# ForumResponse for a forum whose topics, posts, comments and files are loaded.
+# Every part is validated once, straight from the ORM objects, and assembled without revalidation.
+def forum_response(db_forum, user, tags, board_tags, sbookmarks, abookmarks, access, next_cursor=None):
+    return schemas.ForumResponse.model_construct(
+        **dict(schemas.Forum.model_validate(db_forum)),
+        creator=user.username if user and user.username else "admin",
+        topics=[schemas.Topic.model_validate(topic) for topic in db_forum.topics],
+        tags=[schemas.Tag.model_validate(tag) for tag in tags],
+        btags=[schemas.Tag.model_validate(tag) for tag in board_tags],
+        sbookmarks=[schemas.SBookmark.model_validate(bookmark) for bookmark in sbookmarks],
+        abookmarks=[schemas.ABookmark.model_validate(bookmark) for bookmark in abookmarks],
+        access=[schemas.Access.model_validate(a) for a in access],
+        next_cursor=next_cursor,
+    )
+
+# Route to stream a forum's new topics, posts, comments and likes as Server-Sent Events,
+# so clients apply small deltas instead of reloading the whole forum
+@app.get("/coboard/{board}/{forum_name}/events")
+async def forum_events(board: str, forum_name: str):
+    async def stream():
+        async with event_hub.subscribe(events.forum_channel(board, forum_name)) as queue:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), settings.event_heartbeat)
+                except asyncio.TimeoutError:
+                    # Comment line that keeps proxies from closing an idle stream
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"data: {message}\n\n"
+
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
 
 # Route to post new topic
-@app.post("/coboard/{board}/{forum_name}/topic", response_model=schemas.Topic)
-async def create_topic(board: str, forum_name: str, topic_data: schemas.TopicCreate, db: Session = Depends(get_db)):
-    forum = db.query(models.Forum).filter(
+@app.post("/coboard/{board}/{forum_name}/topic", response_model=schemas.Topic, dependencies=[Depends(current_user)])
+async def create_topic(board: str, forum_name: str, topic_data: schemas.TopicCreate, db: AsyncSession = Depends(get_db)):
+    forum = await db.scalar(select(models.Forum).where(
         models.Forum.board == board,
         models.Forum.slug == forum_name
-    ).first()
+    ))
 
     if not forum:
         raise HTTPException(status_code=404, detail="Forum not found")
 
     new_topic = models.Topic(text=topic_data.text, publish=topic_data.publish, expired=topic_data.expired)
     db.add(new_topic)
-    db.commit()
-    db.refresh(new_topic)
+    await db.flush()
 
     forum_topic = models.ForumTopic(forum_id=forum.forum_id, topic_id=new_topic.topic_id)
     db.add(forum_topic)
-    db.commit()
 
     forum.last_updated = date.today()
-    db.commit()
+    await db.execute(queries.bump_revision(models.Forum.forum_id == forum.forum_id))
+    await db.commit()
+    await invalidate_forum(board, forum_name)
 
-    return new_topic
+    topic = schemas.Topic(**new_topic.__dict__)
+    await event_hub.publish(events.forum_channel(board, forum_name), {"type": "topic", "topic": topic.model_dump(mode="json")})
+    return model_response(topic)
 
 # Route to update forum
 @app.put("/coboard/{board}/{forum_name}/setting", response_model=schemas.ForumResponse)
@@ -305,91 +569,99 @@ async def update_forum(
     board: str,
     forum_name: str,
     forum: schemas.ForumCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
+    claims: dict = Depends(current_user),
 ):
     try:
         # Fetch the existing forum from the database
-        db_forum = db.query(models.Forum).filter(
+        db_forum = await db.scalar(select(models.Forum).where(
             models.Forum.board == board,
             models.Forum.slug == forum_name
-        ).first()
+        ))
         
         if not db_forum:
             raise HTTPException(status_code=404, detail="Forum not found")
+        require_user(claims, db_forum.creator_id)
 
         # Update forum attributes, including the icon
         for key, value in forum.dict(exclude_unset=True).items():
-            if key == 'icon' and value:
-                try:
-                    # Decode the Base64 icon and validate its size
-                    decoded_icon = base64.b64decode(value)
-                    if len(decoded_icon) > 1048576:  # Limit to 1 MB
-                        raise HTTPException(status_code=400, detail="Icon file too large")
-                    db_forum.icon = decoded_icon
-                except base64.binascii.Error:
-                    raise HTTPException(status_code=400, detail="Invalid base64 for icon")
+            if key == 'icon':
+                if value:
+                    db_forum.icon_hash = store_image(value)
             elif key != 'tags':  # Skip 'tags' as they will be handled separately
                 setattr(db_forum, key, value)
 
-        # Handle tags update
+        # Handle tags update: the given tags replace the forum's current ones
+        tags_changed = False
         if hasattr(forum, 'tags') and forum.tags is not None:
-            # Remove all existing tags
-            existing_tags = db.query(models.ForumTag).filter(models.ForumTag.forum_id == db_forum.forum_id).all()
-            existing_tag_ids = {tag.tag_id for tag in existing_tags}
+            existing_tag_ids = set((await db.scalars(select(models.ForumTag.tag_id).where(models.ForumTag.forum_id == db_forum.forum_id))).all())
+            wanted_tag_ids = {tag.tag_id for tag in forum.tags}
+            added = set((await db.scalars(select(models.Tag.tag_id).where(models.Tag.tag_id.in_(wanted_tag_ids - existing_tag_ids)))).all())
+            removed = existing_tag_ids - wanted_tag_ids
 
             # Add new tags
-            for tag in forum.tags:
-                if tag.tag_id not in existing_tag_ids:
-                    new_forum_tag = models.ForumTag(
-                        forum_id=db_forum.forum_id,
-                        tag_id=tag.tag_id
-                    )
-                    db.add(new_forum_tag)
+            for tag_id in added:
+                db.add(models.ForumTag(forum_id=db_forum.forum_id, tag_id=tag_id))
+
+            # Remove dropped tags
+            if removed:
+                await db.execute(delete(models.ForumTag).where(
+                    models.ForumTag.forum_id == db_forum.forum_id,
+                    models.ForumTag.tag_id.in_(sorted(removed))
+                ))
 
-                    # Increment use count for the new tag
-                    tagupdate = db.query(models.Tag).filter(models.Tag.tag_id == tag.tag_id).first()
-                    if tagupdate:
-                        tagupdate.use += 1
+            # Move the use counts of both in one statement
+            if added or removed:
+                await db.execute(queries.shift_tag_use(added=added, removed=removed))
+                tags_changed = True
 
         db_forum.last_updated = date.today()
+        # Changed tags change the use counts shown in every forum of the board
+        if tags_changed:
+            await db.execute(queries.bump_revision(models.Forum.board.in_({board, db_forum.board})))
+        else:
+            await db.execute(queries.bump_revision(models.Forum.forum_id == db_forum.forum_id))
 
         # Commit the changes to the database
-        db.commit()
-        db.refresh(db_forum)
+        await db.commit()
+        await db.refresh(db_forum)
+
+        await invalidate_forum(board, forum_name, tags=tags_changed)
+        if (db_forum.board, db_forum.slug) != (board, forum_name):
+            await invalidate_forum(db_forum.board, db_forum.slug, tags=tags_changed)
 
         # Prepare response data
         response_data = db_forum.__dict__.copy()
-        if db_forum.icon:
-            response_data['icon'] = base64.b64encode(db_forum.icon).decode('utf-8')
+        response_data['icon'] = db_forum.icon_hash
 
-        user = db.query(models.SEUser).filter(models.SEUser.sid == db_forum.creator_id).first()
+        user = await db.scalar(select(models.SEUser).where(models.SEUser.sid == db_forum.creator_id))
 
         if user.username :
             response_data['creator'] = user.username
 
         # Fetch updated tags
-        tags = db.query(models.Tag).join(models.ForumTag).filter(
+        tags = (await db.scalars(select(models.Tag).join(models.ForumTag).where(
             models.ForumTag.forum_id == db_forum.forum_id
-        ).all()
+        ))).all()
         tag_data = [tag.__dict__.copy() for tag in tags]
 
         # Fetch board tags
-        board_tags = db.query(models.Tag).filter(models.Tag.board == board).order_by(desc(models.Tag.use)).all()
+        board_tags = (await db.scalars(queries.top_tags(board))).all()
         board_tag_data = [bt.__dict__.copy() for bt in board_tags]
 
         # Fetch topics
-        topics = db.query(models.Topic).join(models.ForumTopic).filter(
+        topics = (await db.scalars(select(models.Topic).join(models.ForumTopic, models.ForumTopic.topic_id == models.Topic.topic_id).where(
             models.ForumTopic.forum_id == db_forum.forum_id
-        ).all()
+        ))).all()
         topic_data = [topic.__dict__.copy() for topic in topics]
 
-        sbookmark = db.query(models.SBookmark).filter(models.SBookmark.forum_id == db_forum.forum_id).all()
+        sbookmark = (await db.scalars(select(models.SBookmark).where(models.SBookmark.forum_id == db_forum.forum_id))).all()
         sbookmark_data = [sbm.__dict__.copy() for sbm in sbookmark]
 
-        abookmark = db.query(models.ABookmark).filter(models.ABookmark.forum_id == db_forum.forum_id).all()
+        abookmark = (await db.scalars(select(models.ABookmark).where(models.ABookmark.forum_id == db_forum.forum_id))).all()
         abookmark_data = [abm.__dict__.copy() for abm in abookmark]
 
-        access = db.query(models.Access).filter(models.Access.forum_id == db_forum.forum_id).all()
+        access = (await db.scalars(select(models.Access).where(models.Access.forum_id == db_forum.forum_id))).all()
         access_data = [schemas.Access(**a.__dict__) for a in access]
 
         response_data['tags'] = tag_data
@@ -398,10 +670,12 @@ async def update_forum(
         response_data['sbookmarks'] = sbookmark_data
         response_data['abookmarks'] = abookmark_data
         response_data['access'] = access_data
-        return schemas.ForumResponse(**response_data)
+        return model_response(schemas.ForumResponse(**response_data))
 
+    except HTTPException:
+        raise
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         error_msg = f"Database error while updating forum: {str(e)}"
         raise HTTPException(status_code=500, detail=error_msg)
     except Exception as e:
@@ -415,33 +689,29 @@ async def create_post(
     forum_name: str,
     post_data: schemas.PostCreate,
     topic_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    claims: dict = Depends(current_user),
 ):
+    require_user(claims, post_data.spost_creator, post_data.apost_creator)
     # First, find the forum
-    forum = db.query(models.Forum).filter(
+    forum = await db.scalar(select(models.Forum).where(
         models.Forum.board == board,
         models.Forum.slug == forum_name
-    ).first()
+    ))
     
     if not forum:
         raise HTTPException(status_code=404, detail="Forum not found")
 
-    # Then, find the topic
-    topic = db.query(models.Topic).filter(
+    # Then, find the topic, which has to be one of this forum's
+    topic = await db.scalar(select(models.Topic).join(models.ForumTopic, models.ForumTopic.topic_id == models.Topic.topic_id).where(
         models.Topic.topic_id == topic_id,
-    ).first()
+        models.ForumTopic.forum_id == forum.forum_id,
+    ))
 
     if not topic:
         raise HTTPException(status_code=404, detail="Topic not found")
     
-    pic_data = None
-    if post_data.pic:
-        try:
-            pic_data = base64.b64decode(post_data.pic)
-            if len(pic_data) > 1048576:
-                raise HTTPException(status_code=400, detail="Icon file too large")
-        except base64.binascii.Error:
-            raise HTTPException(status_code=400, detail="Invalid base64 for icon")
+    pic_hash = store_image(post_data.pic) if post_data.pic else None
 
     # Create new post
     new_post = models.Post(
@@ -450,19 +720,19 @@ async def create_post(
         heart=post_data.heart,
         spost_creator=post_data.spost_creator,
         apost_creator=post_data.apost_creator,
-        pic=pic_data
+        pic_hash=pic_hash
     )
     db.add(new_post)
-    db.commit()
-    db.refresh(new_post)
+    await db.flush()
 
     # Create relationship between topic and post
     topic_post = models.TopicPost(topic_id=topic.topic_id, post_id=new_post.post_id)
     db.add(topic_post)
-    db.commit()
 
     forum.last_updated = date.today()
-    db.commit()
+    await db.execute(queries.bump_revision(models.Forum.forum_id == forum.forum_id))
+    await db.commit()
+    await invalidate_forum(board, forum_name)
 
     response_data = {
             "post_id": new_post.post_id,
@@ -471,46 +741,66 @@ async def create_post(
             "heart": new_post.heart,
             "spost_creator": new_post.spost_creator,
             "apost_creator": new_post.apost_creator,
+            "pic": new_post.pic_hash,
         }
 
-    if new_post.pic:
-        response_data['pic'] = base64.b64encode(new_post.pic).decode('utf-8')
-
-    return schemas.Post(**response_data)
+    post = schemas.Post(**response_data)
+    await event_hub.publish(events.forum_channel(board, forum_name), {"type": "post", "topic_id": topic.topic_id, "post": post.model_dump(mode="json")})
+    return model_response(post)
 
 # Route to update like
-@app.put("/coboard/{board}/{forum_name}/like", response_model=schemas.LikeResponse)
+@app.put("/coboard/{board}/{forum_name}/like", response_model=schemas.LikeResponse, dependencies=[Depends(current_user)])
 async def update_like(
     board: str,
     forum_name: str,
     like_data: schemas.LikeUpdate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
+    if like_data.item_type not in likes.LIKE_COLUMNS:
+        raise HTTPException(status_code=400, detail="Invalid item type")
+    not_found = "Post not found" if like_data.item_type == "post" else "Comment not found"
+    forum_of = queries.forum_of_post if like_data.item_type == "post" else queries.forum_of_comment
+
     try:
-        if like_data.item_type == "post":
-            item = db.query(models.Post).filter(models.Post.post_id == like_data.item_id).first()
-            if not item:
-                raise HTTPException(status_code=404, detail="Post not found")
-            item.heart += 1
-        elif like_data.item_type == "comment":
-            item = db.query(models.Comment).filter(models.Comment.comment_id == like_data.item_id).first()
-            if not item:
-                raise HTTPException(status_code=404, detail="Comment not found")
-            item.comment_heart += 1
+        # The like changes the forum the item is in, whichever forum the URL names
+        forum = (await db.execute(forum_of(like_data.item_id))).first()
+        if like_buffer:
+            # Count the like in memory, the buffer writes it with the next flush
+            _, key, counter = likes.LIKE_COLUMNS[like_data.item_type]
+            row = (await db.execute(select(key, counter).where(key == like_data.item_id))).first()
+            if not row:
+                raise HTTPException(status_code=404, detail=not_found)
+            like_buffer.add(like_data.item_type, like_data.item_id, tuple(forum) if forum else None)
+            count = (row[1] or 0) + like_buffer.pending_for(like_data.item_type, like_data.item_id)
         else:
-            raise HTTPException(status_code=400, detail="Invalid item type")
-
-        db.commit()
-        db.refresh(item)
-
-        return schemas.LikeResponse(
-            item_id=item.post_id if like_data.item_type == "post" else item.comment_id,
+            # Atomic increment in the database, no read-modify-write
+            count = await likes.add_likes(db, like_data.item_type, like_data.item_id)
+            if count is None:
+                raise HTTPException(status_code=404, detail=not_found)
+            if forum:
+                await db.execute(queries.bump_revision(models.Forum.forum_id == forum.forum_id))
+            await db.commit()
+            if forum:
+                await response_cache.invalidate(cache.forum_scope(forum.board, forum.slug))
+
+        if forum:
+            await event_hub.publish(events.forum_channel(forum.board, forum.slug), {
+                "type": "like",
+                "item_type": like_data.item_type,
+                "item_id": like_data.item_id,
+                "likes": count,
+            })
+
+        return model_response(schemas.LikeResponse(
+            item_id=like_data.item_id,
             item_type=like_data.item_type,
-            likes=item.heart if like_data.item_type == "post" else item.comment_heart
-        )
+            likes=count
+        ))
 
+    except HTTPException:
+        raise
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error while updating like: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error occurred")
     except Exception as e:
@@ -524,232 +814,295 @@ async def add_comment(
     forum_name: str,
     comment_data: schemas.CommentCreate,
     post_id: int,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    claims: dict = Depends(current_user),
 ):
+    require_user(claims, comment_data.scomment_creator, comment_data.acomment_creator)
     try:
-        post = db.query(models.Post).filter(models.Post.post_id == post_id).first()
+        post = await db.scalar(select(models.Post).where(models.Post.post_id == post_id))
         if not post:
             raise HTTPException(status_code=404, detail="Post not found")
 
         new_comment = models.Comment(comment_text=comment_data.comment_text, scomment_creator=comment_data.scomment_creator, acomment_creator=comment_data.acomment_creator )
         db.add(new_comment)
-        db.commit()
-        db.refresh(new_comment)
+        await db.flush()
 
         post_comment = models.PostComment(post_id=post.post_id, comment_id=new_comment.comment_id)
         db.add(post_comment)
-        db.commit()
-
-        return new_comment
+        # The comment belongs to the post's forum, not necessarily the one in the URL
+        forum = (await db.execute(queries.forum_of_post(post.post_id))).first()
+        if forum:
+            await db.execute(queries.bump_revision(models.Forum.forum_id == forum.forum_id))
+        await db.commit()
+
+        comment = schemas.Comment.model_validate(new_comment)
+        if forum:
+            await invalidate_forum(forum.board, forum.slug)
+            await event_hub.publish(events.forum_channel(forum.board, forum.slug), {"type": "comment", "post_id": post.post_id, "comment": comment.model_dump(mode="json")})
+        return model_response(comment)
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error while adding comment: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error occurred")
     except Exception as e:
         logger.error(f"Unexpected error while adding comment: {str(e)}")
         raise HTTPException(status_code=500, detail="An unexpected error occurred")
     
-# Route to get all users
-@app.get("/", response_model=schemas.UserResponse)
-async def get_user(db: Session = Depends(get_db)):
+# Route to log in with a student id or an anonymous user name.
+# Each user table is probed by primary key; the password hash is checked in the thread pool.
+@app.post("/auth/login", response_model=schemas.LoginResponse)
+async def login(credentials: schemas.LoginRequest, db: AsyncSession = Depends(get_db)):
     try:
-        # Fetch SE users
-        se_users = db.query(models.SEUser).all()
-        se_data = []
-        for user in se_users:
-            user_dict = user.__dict__.copy()
-            if user.sprofile:
-                user_dict['sprofile'] = base64.b64encode(user.sprofile).decode('utf-8')
-            else:
-                user_dict['sprofile'] = None
-            se_data.append(schemas.SEUser(**user_dict))
-
-        # Fetch anonymous users
-        anonymous_users = db.query(models.AnonymousUser).all()
-        anonymous_data = []
-        for user in anonymous_users:
-            user_dict = user.__dict__.copy()
-            if user.aprofile:
-                user_dict['aprofile'] = base64.b64encode(user.aprofile).decode('utf-8')
-            else:
-                user_dict['aprofile'] = None
-            anonymous_data.append(schemas.AnonymousUser(**user_dict))
-        
-        # Return the data wrapped in the response schema
-        return schemas.UserResponse(se=se_data, anonymous=anonymous_data)
+        se_user = await db.scalar(select(models.SEUser).where(models.SEUser.sid == credentials.username))
+        if se_user and await auth.verify_password_async(credentials.password, se_user.spw):
+            user, status, password_column = se_user, "se", "spw"
+        else:
+            a_user = await db.scalar(select(models.AnonymousUser).where(models.AnonymousUser.aid == credentials.username))
+            if not a_user or not await auth.verify_password_async(credentials.password, a_user.apw):
+                raise HTTPException(status_code=401, detail="Invalid username or password")
+            user, status, password_column = a_user, "a", "apw"
+
+        # Plain text passwords from before hashing are replaced on their first login
+        if auth.needs_rehash(getattr(user, password_column)):
+            setattr(user, password_column, await auth.hash_password_async(credentials.password))
+            await db.commit()
+
+        if status == "se":
+            user_data = schemas.SEUser(**{**user.__dict__, "sprofile": user.sprofile_hash})
+        else:
+            user_data = schemas.AnonymousUser(**{**user.__dict__, "aprofile": user.aprofile_hash})
+        return model_response(schemas.LoginResponse(token=auth.issue_token(credentials.username, status), status=status, user=user_data))
 
     except SQLAlchemyError as e:
-        logger.error(f"Database error while fetching users: {str(e)}")
+        await db.rollback()
+        logger.error(f"Database error while logging in: {str(e)}")
         raise HTTPException(status_code=500, detail="Database error occurred")
-    except Exception as e:
-        logger.error(f"Unexpected error while fetching users: {str(e)}")
-        raise HTTPException(status_code=500, detail="An unexpected error occurred")
-    
+
+# Route to check whether a user name is taken, for signup and password recovery
+@app.get("/user/exists", response_model=schemas.UserExists)
+async def user_exists(username: str = Query(..., min_length=1), db: AsyncSession = Depends(get_db)):
+    if await db.scalar(select(models.SEUser.sid).where(models.SEUser.sid == username)):
+        return model_response(schemas.UserExists(exists=True, status="se"))
+    if await db.scalar(select(models.AnonymousUser.aid).where(models.AnonymousUser.aid == username)):
+        return model_response(schemas.UserExists(exists=True, status="a"))
+    return model_response(schemas.UserExists(exists=False))
+
+# Route to start a password reset: a single use link, valid for settings.reset_token_ttl,
+# is mailed to the address linked to the user. The password itself is left alone.
+@app.post("/auth/recover", status_code=202)
+async def recover_password(request: schemas.RecoverRequest, db: AsyncSession = Depends(get_db)):
+    se_user = await db.scalar(select(models.SEUser).where(models.SEUser.sid == request.username))
+    a_user = None if se_user else await db.scalar(select(models.AnonymousUser).where(models.AnonymousUser.aid == request.username))
+    if not se_user and not a_user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    if se_user:
+        token = auth.issue_reset_token(se_user.sid, "se", se_user.spw)
+        receiver_email = f"{se_user.sid}@kmitl.ac.th"
+    else:
+        token = auth.issue_reset_token(a_user.aid, "a", a_user.apw)
+        receiver_email = a_user.mail
+    link = f"{settings.frontend_url}/reset_password?{urllib.parse.urlencode({'token': token})}"
+    message = f"Open this link to choose a new password:\n{link}\nIt expires in {settings.reset_token_ttl // 60} minutes and works once."
+    try:
+        mail_queue.enqueue(mailer.build_message(settings.mail_sender, receiver_email, "Your Password Recovery", message))
+    except mailer.QueueFull:
+        raise HTTPException(status_code=503, detail="Mail queue is full, try again later")
+    return {"message": "A password reset link has been sent"}
+
+# Route to finish a password reset with the token from the mailed link.
+# The token names the password it was issued for, so setting a new one spends it.
+@app.post("/auth/reset")
+async def reset_password(request: schemas.ResetRequest, db: AsyncSession = Depends(get_db)):
+    claims = auth.read_token(request.token, use="reset")
+    if claims is None:
+        raise HTTPException(status_code=400, detail="Invalid or expired reset link")
+    if claims["status"] == "se":
+        user, password_column = await db.get(models.SEUser, claims["sub"]), "spw"
+    else:
+        user, password_column = await db.get(models.AnonymousUser, claims["sub"]), "apw"
+    if user is None or not auth.reset_token_matches(claims, getattr(user, password_column)):
+        raise HTTPException(status_code=400, detail="Invalid or expired reset link")
+
+    setattr(user, password_column, await auth.hash_password_async(request.password))
+    await db.commit()
+    return {"message": "Password changed"}
+
+
 # Route to add Bookmark
 @app.post("/coboard/{board}/{forum_name}", response_model=Union[schemas.SBookmark, schemas.ABookmark])
 async def create_bookmark(
     board: str, 
     forum_name: str, 
     bookmark: schemas.BookmarkCreate=Body(...),
-    db: Session = Depends(get_db)):
+    db: AsyncSession = Depends(get_db),
+    claims: dict = Depends(current_user)):
+    require_user(claims, bookmark.user_id)
     try:
         user_id = bookmark.user_id
         status = bookmark.status
-        forum = db.query(models.Forum).filter(models.Forum.slug == forum_name).first()
+        forum = await db.scalar(select(models.Forum).where(models.Forum.slug == forum_name))
         if not forum:
             raise HTTPException(status_code=404, detail="Forum not found")
         
         if status == "se":
-            user = db.query(models.SEUser).filter(models.SEUser.sid == user_id).first()
+            user = await db.scalar(select(models.SEUser).where(models.SEUser.sid == user_id))
             if not user:
                 raise HTTPException(status_code=404, detail="User not found")
             new_bookmark = models.SBookmark(forum_id=forum.forum_id, user_id=user.sid)
             db.add(new_bookmark)
-            db.commit()
-            db.refresh(new_bookmark)
+            await db.execute(queries.bump_revision(models.Forum.forum_id == forum.forum_id))
+            await db.commit()
+            await response_cache.invalidate(cache.forum_scope(forum.board, forum.slug))
 
             return new_bookmark
         else:
-            user = db.query(models.AnonymousUser).filter(models.AnonymousUser.aid == user_id).first()
+            user = await db.scalar(select(models.AnonymousUser).where(models.AnonymousUser.aid == user_id))
             if not user:
                 raise HTTPException(status_code=404, detail="User not found")
             
             new_bookmark = models.ABookmark(forum_id=forum.forum_id, user_id=user.aid)
             db.add(new_bookmark)
-            db.commit()
-            db.refresh(new_bookmark)
+            await db.execute(queries.bump_revision(models.Forum.forum_id == forum.forum_id))
+            await db.commit()
+            await response_cache.invalidate(cache.forum_scope(forum.board, forum.slug))
 
             return new_bookmark
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error occurred")
     except Exception as e:
         raise HTTPException(status_code=500, detail="An unexpected error occurred")
     
 # Route to delete Bookmark
 @app.delete("/coboard/{board}/{forum_name}")
-async def delete_bookmark(board: str, forum_name: str, status: str, user_id: str, db: Session = Depends(get_db)):
+async def delete_bookmark(
+    board: str,
+    forum_name: str,
+    status: str,
+    user_id: str,
+    db: AsyncSession = Depends(get_db),
+    claims: dict = Depends(current_user),
+):
+    require_user(claims, user_id)
     # Select the correct bookmark table based on status
     BookmarkModel = models.SBookmark if status == "se" else models.ABookmark
-    forum = db.query(models.Forum).filter(models.Forum.slug == forum_name).first()
+    forum = await db.scalar(select(models.Forum).where(models.Forum.slug == forum_name))
     if not forum:
         raise HTTPException(status_code=404, detail="Forum not found")
     
-    bookmark = db.query(BookmarkModel).filter_by(forum_id=forum.forum_id, user_id=user_id).first()
+    bookmark = await db.scalar(select(BookmarkModel).filter_by(forum_id=forum.forum_id, user_id=user_id))
     
     if not bookmark:
         raise HTTPException(status_code=404, detail="Bookmark not found")
 
     # Delete the bookmark
-    db.delete(bookmark)
-    db.commit()
+    await db.delete(bookmark)
+    await db.execute(queries.bump_revision(models.Forum.forum_id == forum.forum_id))
+    await db.commit()
+    await response_cache.invalidate(cache.forum_scope(forum.board, forum.slug))
 
     return {"message": "Bookmark deleted successfully"}
 
 # Route to get user info
 @app.get("/user/{id}", response_model=Union[schemas.SEUserResponse, schemas.AnonymousUserResponse])
-async def get_user(id: str, db: Session = Depends(get_db)):
+async def get_user(id: str, db: AsyncSession = Depends(get_db)):
     try:
-        se_user = db.query(models.SEUser).filter(
+        se_user = await db.scalar(select(models.SEUser).where(
             models.SEUser.sid == id
-        ).first()
+        ))
 
-        a_user = db.query(models.AnonymousUser).filter(
+        a_user = await db.scalar(select(models.AnonymousUser).where(
             models.AnonymousUser.aid == id
-        ).first()
+        ))
         
         if not se_user and not a_user:
             raise HTTPException(status_code=404, detail="User not found")
         
         if se_user: 
             response_data = se_user.__dict__.copy()
-            if se_user.sprofile:
-                response_data['sprofile'] = base64.b64encode(se_user.sprofile).decode('utf-8')
+            response_data['sprofile'] = se_user.sprofile_hash
 
-            # Fetch bookmarked forums and encode any binary icons
-            bookmarked = (
-                db.query(models.Forum)
+            # Fetch bookmarked forums
+            bookmarked = (await db.scalars(
+                select(models.Forum)
                 .join(models.SBookmark, models.Forum.forum_id == models.SBookmark.forum_id)
-                .filter(models.SBookmark.user_id == se_user.sid)
-                .all()
-            )
+                .where(models.SBookmark.user_id == se_user.sid)
+            )).all()
 
-            # Convert icons to Base64 if present
             bookmarked_data = [
                 {
                     **bm.__dict__,
-                    "icon": base64.b64encode(bm.icon).decode('utf-8') if bm.icon else None
+                    "icon": bm.icon_hash
                 }
                 for bm in bookmarked
             ]
 
             # Fetch created forums
-            created = db.query(models.Forum).filter(models.Forum.creator_id == se_user.sid).all()
+            created = (await db.scalars(select(models.Forum).where(models.Forum.creator_id == se_user.sid))).all()
             created_data = [
                 {
                     **c.__dict__,
-                    "icon": base64.b64encode(c.icon).decode('utf-8') if c.icon else None
+                    "icon": c.icon_hash
                 }
                 for c in created
             ]
 
             # Fetch files
-            files = db.query(models.File).filter(models.File.s_owner == se_user.sid).all()
+            files = (await db.scalars(select(models.File).where(models.File.s_owner == se_user.sid))).all()
             files_data = [f.__dict__.copy() for f in files]
 
             # Add all data to response
             response_data['bookmarked'] = bookmarked_data
             response_data['created'] = created_data
             response_data['files'] = files_data
-            return schemas.SEUserResponse(**response_data)
+            return model_response(schemas.SEUserResponse(**response_data))
         
         else :
             response_data = a_user.__dict__.copy()
-            if a_user.aprofile:
-                response_data['aprofile'] = base64.b64encode(a_user.sprofile).decode('utf-8')
+            response_data['aprofile'] = a_user.aprofile_hash
 
-            # Fetch bookmarked forums and encode any binary icons
-            bookmarked = (
-                db.query(models.Forum)
+            # Fetch bookmarked forums
+            bookmarked = (await db.scalars(
+                select(models.Forum)
                 .join(models.ABookmark, models.Forum.forum_id == models.ABookmark.forum_id)
-                .filter(models.ABookmark.user_id == a_user.aid)
-                .all()
-            )
+                .where(models.ABookmark.user_id == a_user.aid)
+            )).all()
 
-            # Convert icons to Base64 if present
             bookmarked_data = [
                 {
                     **bm.__dict__,
-                    "icon": base64.b64encode(bm.icon).decode('utf-8') if bm.icon else None
+                    "icon": bm.icon_hash
                 }
                 for bm in bookmarked
             ]
 
             # Fetch files
-            files = db.query(models.File).filter(models.File.a_owner == a_user.aid).all()
+            files = (await db.scalars(select(models.File).where(models.File.a_owner == a_user.aid))).all()
             files_data = [f.__dict__.copy() for f in files]
 
             # Add all data to response
             response_data['bookmarked'] = bookmarked_data
             response_data['files'] = files_data
-            return schemas.AnonymousUserResponse(**response_data)
+            return model_response(schemas.AnonymousUserResponse(**response_data))
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 # Route to update user info
 @app.put("/user/{id}", response_model=Union[schemas.SEUser, schemas.AnonymousUser])
-async def update_user(id: str, new: schemas.UserUpdate, db: Session = Depends(get_db)):
+async def update_user(id: str, new: schemas.UserUpdate, db: AsyncSession = Depends(get_db), claims: dict = Depends(current_user)):
+    require_user(claims, id)
     try:
         # Fetch the existing forum from the database
-        se_user = db.query(models.SEUser).filter(
+        se_user = await db.scalar(select(models.SEUser).where(
             models.SEUser.sid == id
-        ).first()
+        ))
 
-        a_user = db.query(models.AnonymousUser).filter(
+        a_user = await db.scalar(select(models.AnonymousUser).where(
             models.AnonymousUser.aid == id
-        ).first()
+        ))
         
         if not se_user and not a_user:
             raise HTTPException(status_code=404, detail="User not found")
@@ -757,58 +1110,46 @@ async def update_user(id: str, new: schemas.UserUpdate, db: Session = Depends(ge
         if se_user:
             for key, value in new.dict(exclude_unset=True).items():
                 if key == 'profileImage' and value:
-                    try:
-                        # Decode the Base64 icon and validate its size
-                        decoded_profile = base64.b64decode(value)
-                        if len(decoded_profile) > 1048576:  # Limit to 1 MB
-                            raise HTTPException(status_code=400, detail="Icon file too large")
-                        se_user.sprofile = decoded_profile
-                    except base64.binascii.Error:
-                        raise HTTPException(status_code=400, detail="Invalid base64 for icon")
+                    se_user.sprofile_hash = store_image(value)
                 if key == 'username' and value:
                     se_user.username = value
                 if key == 'password' and value:
-                    se_user.spw = value
+                    se_user.spw = await auth.hash_password_async(value)
 
-            db.commit()
-            db.refresh(se_user)
+            await db.execute(queries.bump_revision(models.Forum.creator_id == se_user.sid))
+            await db.commit()
+            await db.refresh(se_user)
+            # Forum views show creator names and pictures
+            await response_cache.invalidate(cache.USERS_SCOPE)
 
             # Prepare response data
             response_data = se_user.__dict__.copy()
-            if se_user.sprofile:
-                response_data['sprofile'] = base64.b64encode(se_user.sprofile).decode('utf-8')
+            response_data['sprofile'] = se_user.sprofile_hash
 
-            return schemas.SEUser(**response_data)
+            return model_response(schemas.SEUser(**response_data))
         
         else :
             for key, value in new.dict(exclude_unset=True).items():
-                print(f"Updating {key} with value: {value}")
                 if key == 'profileImage' and value:
-                    try:
-                        # Decode the Base64 icon and validate its size
-                        decoded_profile = base64.b64decode(value)
-                        if len(decoded_profile) > 1048576:  # Limit to 1 MB
-                            raise HTTPException(status_code=400, detail="Icon file too large")
-                        a_user.aprofile = decoded_profile
-                    except base64.binascii.Error:
-                        raise HTTPException(status_code=400, detail="Invalid base64 for icon")
+                    a_user.aprofile_hash = store_image(value)
                 if key == 'username' and value:
                     a_user.aid = value
                 if key == 'password' and value:
-                    a_user.apw = value
+                    a_user.apw = await auth.hash_password_async(value)
 
-            db.commit()
-            db.refresh(a_user)
+            await db.commit()
+            await db.refresh(a_user)
+            # Forum views show creator names and pictures
+            await response_cache.invalidate(cache.USERS_SCOPE)
 
             # Prepare response data
             response_data = a_user.__dict__.copy()
-            if a_user.aprofile:
-                response_data['aprofile'] = base64.b64encode(a_user.aprofile).decode('utf-8')
+            response_data['aprofile'] = a_user.aprofile_hash
 
-            return schemas.SEUser(**response_data)
+            return model_response(schemas.AnonymousUser(**response_data))
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         error_msg = f"Database error while updating forum: {str(e)}"
         raise HTTPException(status_code=500, detail=error_msg)
     except Exception as e:
@@ -817,24 +1158,25 @@ async def update_user(id: str, new: schemas.UserUpdate, db: Session = Depends(ge
 
 # Route to delete access    
 @app.delete("/coboard/{board}/{forum_name}/setting")
-async def delete_access(board: str, forum_name: str, db: Session = Depends(get_db)):
-    forum = db.query(models.Forum).filter(models.Forum.slug == forum_name).first()
+async def delete_access(board: str, forum_name: str, db: AsyncSession = Depends(get_db), claims: dict = Depends(current_user)):
+    forum = await db.scalar(select(models.Forum).where(models.Forum.slug == forum_name))
     if not forum:
         raise HTTPException(status_code=404, detail="Forum not found")
+    require_user(claims, forum.creator_id)
     
     # Get all access records related to the forum
-    access = db.query(models.Access).filter_by(forum_id=forum.forum_id).all()   
+    access = (await db.scalars(select(models.Access).filter_by(forum_id=forum.forum_id))).all()   
     if not access:
         return {"message": "No access records found for this forum"}
     
     # Delete each access record
     for access_record in access:
-        db.delete(access_record)
-    
-    db.commit()
+        await db.delete(access_record)
 
     forum.last_updated = date.today()
-    db.commit()
+    await db.execute(queries.bump_revision(models.Forum.forum_id == forum.forum_id))
+    await db.commit()
+    await invalidate_forum(forum.board, forum.slug)
 
     return {"message": "Access deleted successfully"}
 
@@ -844,25 +1186,29 @@ async def create_access(
     board: str, 
     forum_name: str, 
     user_id: str,
-    db: Session = Depends(get_db)):
+    db: AsyncSession = Depends(get_db),
+    claims: dict = Depends(current_user)):
     try:
-        forum = db.query(models.Forum).filter(models.Forum.slug == forum_name).first()
+        forum = await db.scalar(select(models.Forum).where(models.Forum.slug == forum_name))
         if not forum:
             raise HTTPException(status_code=404, detail="Forum not found")
-        user = db.query(models.SEUser).filter(models.SEUser.sid == user_id).first()
+        require_user(claims, forum.creator_id)
+        user = await db.scalar(select(models.SEUser).where(models.SEUser.sid == user_id))
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
         new_access = models.Access(forum_id=forum.forum_id, user_id=user.sid)
         db.add(new_access)
-        db.commit()
-        db.refresh(new_access)
 
         forum.last_updated = date.today()
-        db.commit()
+        await db.execute(queries.bump_revision(models.Forum.forum_id == forum.forum_id))
+        await db.commit()
+        await invalidate_forum(forum.board, forum.slug)
 
         return new_access
+    except HTTPException:
+        raise
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error occurred")
     except Exception as e:
         raise HTTPException(status_code=500, detail="An unexpected error occurred")
@@ -872,11 +1218,14 @@ async def create_access(
 async def delete_forum(
     sid: str,
     forum_id: int,
-    db: Session = Depends(get_db)
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    claims: dict = Depends(current_user),
 ):
+    require_user(claims, sid)
     try:
         # Find the forum in the database and ensure the user is the creator
-        forum = db.query(models.Forum).filter(models.Forum.forum_id == forum_id).first()
+        forum = await db.scalar(select(models.Forum).where(models.Forum.forum_id == forum_id))
 
         if not forum:
             raise HTTPException(status_code=404, detail="Forum not found")
@@ -886,20 +1235,36 @@ async def delete_forum(
             raise HTTPException(status_code=403, detail="You do not have permission to delete this forum")
 
         # Delete related dependencies: tags, topics, bookmarks, etc.
-        db.query(models.ForumTag).filter(models.ForumTag.forum_id == forum_id).delete()
-        db.query(models.ForumTopic).filter(models.ForumTopic.forum_id == forum_id).delete()
-        db.query(models.SBookmark).filter(models.SBookmark.forum_id == forum_id).delete()
-        db.query(models.ABookmark).filter(models.ABookmark.forum_id == forum_id).delete()
-        db.query(models.Access).filter(models.Access.forum_id == forum_id).delete()
+        removed_tags = (await db.scalars(
+            delete(models.ForumTag).where(models.ForumTag.forum_id == forum_id).returning(models.ForumTag.tag_id)
+        )).all()
+        if removed_tags:
+            await db.execute(queries.shift_tag_use(removed=removed_tags))
+            # Tag use counts show in every forum of the board
+            await db.execute(queries.bump_revision(models.Forum.board == forum.board, models.Forum.forum_id != forum_id))
+        # Delete the forum's files, then its comments, posts and topics by the ids collected first
+        paths = (await db.scalars(queries.delete_forum_files(forum_id))).all()
+        topic_ids, post_ids, comment_ids = [(await db.scalars(ids)).all() for ids in queries.forum_tree(forum_id)]
+        for statement in queries.delete_forum_tree(forum_id, topic_ids, post_ids, comment_ids):
+            await db.execute(statement)
+        await db.execute(delete(models.SBookmark).where(models.SBookmark.forum_id == forum_id))
+        await db.execute(delete(models.ABookmark).where(models.ABookmark.forum_id == forum_id))
+        await db.execute(delete(models.Access).where(models.Access.forum_id == forum_id))
 
         # Delete the forum itself
-        db.delete(forum)
-        db.commit()
+        await db.execute(delete(models.Forum).where(models.Forum.forum_id == forum_id))
+        await db.commit()
+        await invalidate_forum(forum.board, forum.slug, tags=True)
+
+        # Uploaded files are removed from disk after the response is sent
+        background_tasks.add_task(uploads.discard_all, paths)
 
         return {"detail": "Forum deleted successfully"}
 
+    except HTTPException:
+        raise
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         error_msg = f"Database error while deleting forum: {str(e)}"
         raise HTTPException(status_code=500, detail=error_msg)
     except Exception as e:
@@ -908,23 +1273,25 @@ async def delete_forum(
 
 # Route to create new anonymous user
 @app.post("/signup", response_model=schemas.AnonymousUser)
-async def create_anonymousUser(user: schemas.AnonymousUserCreate, db: Session = Depends(get_db)):
+async def create_anonymousUser(user: schemas.AnonymousUserCreate, db: AsyncSession = Depends(get_db)):
     try:     
         new_user = models.AnonymousUser(
             aid=user.aid,
-            apw=user.apw,
+            apw=await auth.hash_password_async(user.apw),
             mail=user.mail
         )
         
         # Add the forum to the session and commit to get the forum_id
         db.add(new_user)
-        db.commit()  # This will generate the forum_id
-        db.refresh(new_user)  # Refresh to get the updated object
+        await db.commit()  # This will generate the forum_id
+        await db.refresh(new_user)  # Refresh to get the updated object
         
-        return new_user
+        response_data = new_user.__dict__.copy()
+        response_data['aprofile'] = new_user.aprofile_hash
+        return model_response(schemas.AnonymousUser(**response_data))
     
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         error_msg = f"Database error while creating user: {str(e)}"
         raise HTTPException(status_code=500, detail=error_msg)
     except HTTPException as he:
@@ -938,53 +1305,73 @@ async def create_anonymousUser(user: schemas.AnonymousUserCreate, db: Session =
 @app.post("/file")
 async def upload_file(
     file: UploadFile = File(...),
-    s_owner: str = Form(...),
-    a_owner: str = Form(...),
-    post_id: str = Form(...),
-    db: Session = Depends(get_db)
+    s_owner: Optional[str] = Form(None),
+    a_owner: Optional[str] = Form(None),
+    post_id: int = Form(...),
+    db: AsyncSession = Depends(get_db),
+    claims: dict = Depends(current_user),
 ):
-    # Extract the file extension
-    extension = os.path.splitext(file.filename)[1][1:]
-
-    # Temporarily save the file with a basic name
-    temp_location = os.path.join(UPLOAD_DIR, file.filename)
-    with open(temp_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # Create a new File record in the database
-    new_file = models.File(
-        filename=file.filename,
-        path="",  # Temporary path, will update after renaming
-        extension=extension,
-        s_owner=s_owner if s_owner != 'null' else None,
-        a_owner=a_owner if a_owner != 'null' else None,
-        post_id=post_id
-    )
-    db.add(new_file)
-    db.commit()
-    db.refresh(new_file)
+    # A file belongs to either a student or an anonymous user, the other field is left out
+    if (s_owner is None) == (a_owner is None):
+        raise HTTPException(status_code=400, detail="Exactly one of s_owner and a_owner is required")
+    require_user(claims, s_owner or a_owner)
+    # Drop any directory part the client sent with the name
+    filename = os.path.basename(file.filename)
+    extension = os.path.splitext(filename)[1][1:]
+
+    # Stream the upload into a unique temp file, hashing it and enforcing the size limit
+    try:
+        temp_location, sha256, size = await uploads.save_upload(file, UPLOAD_DIR, settings.max_upload_size)
+    except uploads.UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File too large")
+
+    final_location = None
+    try:
+        # Create the File record and flush to get its file_id, then commit once at the end
+        new_file = models.File(
+            filename=filename,
+            path="",  # Set once the file is moved into place
+            extension=extension,
+            s_owner=s_owner,
+            a_owner=a_owner,
+            post_id=post_id,
+            sha256=sha256
+        )
+        db.add(new_file)
+        await db.flush()
 
-    owner = s_owner if s_owner is not None else a_owner
+        owner = s_owner or a_owner
 
-    # Generate a unique filename: {file_id}_{owner}_{original_filename}
-    unique_filename = f"{new_file.file_id}_{owner}_{file.filename}"
-    final_location = os.path.join(UPLOAD_DIR, unique_filename)
-    
-    # Rename the temporary file to the final location
-    os.rename(temp_location, final_location)
+        # Generate a unique filename: {file_id}_{owner}_{original_filename}
+        unique_filename = f"{new_file.file_id}_{owner}_{filename}"
+        final_location = os.path.join(UPLOAD_DIR, unique_filename)
 
-    # Update the file path in the database
-    new_file.path = final_location
-    db.commit()
-    db.refresh(new_file)
+        # Atomic move into place, the temp file is in the same directory
+        os.replace(temp_location, final_location)
+
+        new_file.path = final_location
+
+        # The file shows up under its post in the forum view
+        forum = (await db.execute(queries.forum_of_post(post_id))).first()
+        if forum:
+            await db.execute(queries.bump_revision(models.Forum.forum_id == forum.forum_id))
+        await db.commit()
+    except Exception as e:
+        await db.rollback()
+        uploads.discard(final_location or temp_location)
+        logger.error(f"Error while saving upload: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to save file")
+
+    if forum:
+        await invalidate_forum(forum.board, forum.slug)
 
     return {"filename": unique_filename, "file_path": new_file.path}
 
-# Route to download file
+# Route to download file, with conditional GET and byte ranges for resumable downloads
 @app.get("/file/{file_id}")
-async def get_file(file_id: int, db: Session = Depends(get_db)):
+async def get_file(file_id: int, request: Request, db: AsyncSession = Depends(get_db)):
     # Retrieve file record
-    file_record = db.query(models.File).filter(models.File.file_id == file_id).first()
+    file_record = await db.scalar(select(models.File).where(models.File.file_id == file_id))
     if not file_record:
         raise HTTPException(status_code=404, detail="File not found")
     
@@ -996,96 +1383,52 @@ async def get_file(file_id: int, db: Session = Depends(get_db)):
     original_filename = file_record.filename
     encoded_filename = urllib.parse.quote(original_filename)
     
-    # Get MIME type based on extension
-    mime_types = {
-        # Documents
-        'pdf': 'application/pdf',
-        'doc': 'application/msword',
-        'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-        'ppt': 'application/vnd.ms-powerpoint',
-        'pptx': 'application/vnd.openxmlformats-officedocument.presentationml.presentation',
-        'xls': 'application/vnd.ms-excel',
-        'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-        
-        # Media
-        'mp4': 'video/mp4',
-        'mp3': 'audio/mpeg',
-        'wav': 'audio/wav',
-        'jpg': 'image/jpeg',
-        'jpeg': 'image/jpeg',
-        'png': 'image/png',
-        'gif': 'image/gif',
-        
-        # Code
-        'py': 'text/x-python',
-        'txt': 'text/plain',
-        'c': 'text/x-c',
-        'cpp': 'text/x-c++src',
-        'h': 'text/x-c',
-        'js': 'text/javascript',
-        'java': 'text/x-java-source',
-        'html': 'text/html',
-        'jsx': 'text/jsx',
-        'css': 'text/css',
-        'rs': 'text/rust',
-        'go': 'text/x-go',
-        'rb': 'text/x-ruby',
-        'php': 'text/x-php',
-        'sql': 'text/x-sql',
-        'xml': 'text/xml',
-        'json': 'application/json',
-        'yaml': 'text/yaml',
-        'md': 'text/markdown',
-        
-        # Archives
-        'zip': 'application/zip',
-        'rar': 'application/x-rar-compressed',
-        'tar': 'application/x-tar',
-        '7z': 'application/x-7z-compressed'
-    }
-    
     # Get MIME type based on file extension
-    mime_type = mime_types.get(file_record.extension.lower(), 'application/octet-stream')
+    mime_type = downloads.MIME_TYPES.get(file_record.extension.lower(), 'application/octet-stream')
     
+    # The stored content hash is a strong validator, older rows fall back to size and mtime
+    if file_record.sha256:
+        etag = f'"{file_record.sha256}"'
+    else:
+        stat = os.stat(file_record.path)
+        etag = f'W/"{stat.st_size:x}-{int(stat.st_mtime):x}"'
+
     headers = {
-        "Access-Control-Expose-Headers": "Content-Disposition",
-        "Content-Type": f"{mime_type}; charset=utf-8",
+        "Access-Control-Expose-Headers": "Content-Disposition, Content-Range, ETag",
         # Use RFC 5987 encoding for the filename
         "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
     }
     
+    return downloads.file_response(request, file_record.path, f"{mime_type}; charset=utf-8", etag, headers)
+
+# Route to get an image from the blob store by its content hash
+@app.get("/blob/{blob_hash}")
+async def get_blob(blob_hash: str, request: Request):
+    if not blobs.exists(blob_hash):
+        raise HTTPException(status_code=404, detail="Blob not found")
+
+    # The hash is the content, so the ETag is strong and the response never goes stale
+    etag = f'"{blob_hash}"'
+    headers = {
+        **downloads.SANDBOX_HEADERS,
+        "ETag": etag,
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+
+    if downloads.not_modified(request.headers, etag):
+        return Response(status_code=304, headers=headers)
+
+    media_type = blobs.media_type(blob_hash)
+    # Only recognised images are shown inline, anything else is downloaded
+    if media_type == "application/octet-stream":
+        headers["Content-Disposition"] = f'attachment; filename="{blob_hash}"'
     return FileResponse(
-        path=file_record.path,
-        filename=original_filename,
-        media_type=mime_type,
+        path=blobs.blob_path(blob_hash),
+        media_type=media_type,
         headers=headers
     )
 
-# Helper function to run the Python script
-def run_python_script(sender_email, sender_password, receiver_email, subject, message):
-    try:
-        # Define the command to run the Python script
-        sender_email = "kiddoquest.se@gmail.com"
-        sender_password = sender_password
-        receiver_email = receiver_email
-        subject = "Your Password Recovery"
-        message = message
-
-        command = f'python3 server/send_mail.py "{sender_email}" "{sender_password}" "{receiver_email}" "{subject}" "{message}"'
-        result = subprocess.run(command, shell=True)
-
-    except subprocess.CalledProcessError as e:
-        raise HTTPException(status_code=500, detail="Failed to execute Python script: " + str(e))
-
-# API endpoint to send email
-@app.post("/sendmail")
-async def send_email(request: schemas.EmailRequest):
-    sender_email = "kiddoquest.se@gmail.com"
-    sender_password = "hrln ddln idjy hryv"  # Use a secure way to store credentials
-    subject = "Your Password Recovery"
-    message = f"Your current password: {request.pw}"
-
-    # Call the Python script to send the email
-    run_python_script(sender_email, sender_password, request.receiver_email, subject, message)
-
-    return {"message": "Email sent successfully!"}
\ No newline at end of file
+# Route to expose connection pool telemetry in the Prometheus text format
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    return metrics.render_pool_metrics(engine_pools())
@@ -0,0 +1,74 @@
+import threading
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+
+# Counters for one connection pool, updated on every checkout
+class PoolStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.checkout_wait_total = 0.0
+        self.checkout_wait_max = 0.0
+        self.timeouts = 0
+        self.overflow_connections = 0
+
+    def record_checkout(self, wait: float, overflowed: bool):
+        with self.lock:
+            self.checkouts += 1
+            self.checkout_wait_total += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+            if overflowed:
+                self.overflow_connections += 1
+
+    def record_timeout(self, wait: float):
+        with self.lock:
+            self.timeouts += 1
+            self.checkout_wait_total += wait
+            self.checkout_wait_max = max(self.checkout_wait_max, wait)
+
+# Times how long each checkout waits for a connection and notes when it had to open an overflow one
+class InstrumentedPoolMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+
+    def _do_get(self):
+        overflow_before = self.overflow()
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            self.stats.record_timeout(time.perf_counter() - start)
+            raise
+        overflowed = self.overflow() > max(overflow_before, 0)
+        self.stats.record_checkout(time.perf_counter() - start, overflowed)
+        return connection
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+class InstrumentedAsyncQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+# Pool gauges and counters in the Prometheus text format, one label per engine
+def render_pool_metrics(pools: dict) -> str:
+    lines = []
+    metrics = [
+        ("coboard_db_pool_size", "gauge", "Configured number of pooled connections", lambda pool: pool.size()),
+        ("coboard_db_pool_checked_out", "gauge", "Connections currently in use", lambda pool: pool.checkedout()),
+        ("coboard_db_pool_overflow", "gauge", "Connections open beyond the pool size", lambda pool: max(pool.overflow(), 0)),
+        ("coboard_db_pool_checkouts_total", "counter", "Connections handed out", lambda pool: pool.stats.checkouts),
+        ("coboard_db_pool_checkout_wait_seconds_total", "counter", "Time spent waiting for a connection", lambda pool: pool.stats.checkout_wait_total),
+        ("coboard_db_pool_checkout_wait_seconds_max", "gauge", "Longest wait for a connection", lambda pool: pool.stats.checkout_wait_max),
+        ("coboard_db_pool_timeouts_total", "counter", "Checkouts that gave up after the pool timeout", lambda pool: pool.stats.timeouts),
+        ("coboard_db_pool_overflow_connections_total", "counter", "Checkouts that opened an overflow connection", lambda pool: pool.stats.overflow_connections),
+    ]
+
+    instrumented = {name: pool for name, pool in pools.items() if isinstance(pool, InstrumentedPoolMixin)}
+    for metric, kind, description, value in metrics:
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, pool in instrumented.items():
+            lines.append(f'{metric}{{engine="{name}"}} {value(pool)}')
+    return "\n".join(lines) + "\n"
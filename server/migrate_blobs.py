@@ -0,0 +1,56 @@
+# One-off migration of the inline LargeBinary images into the blob store.
+#
+# Adds the *_hash columns to an existing database, writes every stored image
+# to the blob store and clears the old binary column once its hash is saved.
+#
+# Usage: python -m server.migrate_blobs
+from sqlalchemy import inspect, text
+from server.database import engine
+from server import blobs
+
+# (table, primary key, legacy binary column, hash column)
+IMAGE_COLUMNS = [
+    ("forum", "forum_id", "icon", "icon_hash"),
+    ("post", "post_id", "pic", "pic_hash"),
+    ("se_user", "sid", "sprofile", "sprofile_hash"),
+    ("anonymous_user", "aid", "aprofile", "aprofile_hash"),
+]
+
+BATCH_SIZE = 100
+
+def add_hash_columns():
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table, _, _, hash_column in IMAGE_COLUMNS:
+            columns = {column["name"] for column in inspector.get_columns(table)}
+            if hash_column not in columns:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {hash_column} VARCHAR(64)"))
+
+def migrate_column(table, key, binary_column, hash_column):
+    moved = 0
+    while True:
+        # Each batch clears the rows it moved, so the next SELECT picks up where it stopped
+        with engine.begin() as conn:
+            rows = conn.execute(
+                text(f"SELECT {key}, {binary_column} FROM {table} WHERE {binary_column} IS NOT NULL LIMIT :limit"),
+                {"limit": BATCH_SIZE}
+            ).all()
+            if not rows:
+                return moved
+
+            for row_key, data in rows:
+                blob_hash = blobs.put(bytes(data))
+                conn.execute(
+                    text(f"UPDATE {table} SET {hash_column} = :hash, {binary_column} = NULL WHERE {key} = :key"),
+                    {"hash": blob_hash, "key": row_key}
+                )
+            moved += len(rows)
+
+def main():
+    add_hash_columns()
+    for table, key, binary_column, hash_column in IMAGE_COLUMNS:
+        moved = migrate_column(table, key, binary_column, hash_column)
+        print(f"{table}.{binary_column}: moved {moved} images to the blob store")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# Recreates the foreign keys declared with ON DELETE CASCADE in models.py on an existing
+# PostgreSQL database, so deleting a forum, topic, post or comment also removes its link rows.
+# SQLite cannot alter constraints; there forum deletes remove the link rows explicitly.
+#
+# Usage: python -m server.migrate_cascades
+from sqlalchemy import inspect, text
+from server.database import Base, engine
+from server import models  # noqa: F401  (registers the tables on Base.metadata)
+
+def main():
+    if engine.dialect.name != "postgresql":
+        print(f"{engine.dialect.name}: foreign keys cannot be altered, nothing to do")
+        return
+    inspector = inspect(engine)
+    preparer = engine.dialect.identifier_preparer
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = inspector.get_foreign_keys(table.name)
+            for fk in table.foreign_keys:
+                if fk.ondelete != "CASCADE":
+                    continue
+                column = fk.parent.name
+                referred = fk.column.table.name
+                current = next((c for c in existing if c["constrained_columns"] == [column] and c["referred_table"] == referred), None)
+                if current and (current.get("options") or {}).get("ondelete", "").upper() == "CASCADE":
+                    continue
+                if current and current["name"]:
+                    conn.execute(text(f"ALTER TABLE {preparer.quote(table.name)} DROP CONSTRAINT {preparer.quote(current['name'])}"))
+                conn.execute(text(
+                    f"ALTER TABLE {preparer.quote(table.name)} ADD FOREIGN KEY ({preparer.quote(column)}) "
+                    f"REFERENCES {preparer.quote(referred)} ({preparer.quote(fk.column.name)}) ON DELETE CASCADE"
+                ))
+                print(f"{table.name}.{column}: ON DELETE CASCADE")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+# Adds file.sha256 to an existing database and fills it in for files already on disk.
+#
+# Usage: python -m server.migrate_files
+import hashlib
+import os
+from sqlalchemy import inspect, text
+from server.database import engine
+
+CHUNK_SIZE = 1024 * 1024
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def main():
+    columns = {column["name"] for column in inspect(engine).get_columns("file")}
+    with engine.begin() as conn:
+        if "sha256" not in columns:
+            conn.execute(text("ALTER TABLE file ADD COLUMN sha256 VARCHAR(64)"))
+
+        rows = conn.execute(text("SELECT file_id, path FROM file WHERE sha256 IS NULL")).all()
+        hashed = 0
+        for file_id, path in rows:
+            if path and os.path.exists(path):
+                conn.execute(
+                    text("UPDATE file SET sha256 = :sha256 WHERE file_id = :file_id"),
+                    {"sha256": file_sha256(path), "file_id": file_id}
+                )
+                hashed += 1
+    print(f"file.sha256: hashed {hashed} of {len(rows)} files")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+# Creates the indexes declared on the models that an existing database is missing.
+# create_all only creates indexes together with new tables, so indexes added later need this.
+#
+# Usage: python -m server.migrate_indexes
+from sqlalchemy import inspect
+from server.database import Base, engine
+from server import models  # noqa: F401  (registers the tables on Base.metadata)
+
+def main():
+    inspector = inspect(engine)
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in existing:
+                    continue
+                index.create(conn)
+                print(f"{table.name}: created {index.name}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+# Replaces the plain text passwords of an existing database with scrypt hashes.
+# Logins upgrade them one by one as well; this covers users who never log in again.
+#
+# Usage: python -m server.migrate_passwords
+from sqlalchemy import text
+from server.database import engine
+from server.auth import hash_password, is_hashed
+
+TABLES = [("se_user", "sid", "spw"), ("anonymous_user", "aid", "apw")]
+
+def main():
+    with engine.begin() as conn:
+        for table, key, column in TABLES:
+            rows = conn.execute(text(f"SELECT {key}, {column} FROM {table}")).all()
+            plain = [(user_id, password) for user_id, password in rows if password and not is_hashed(password)]
+            for user_id, password in plain:
+                conn.execute(
+                    text(f"UPDATE {table} SET {column} = :hashed WHERE {key} = :user_id"),
+                    {"hashed": hash_password(password), "user_id": user_id}
+                )
+            print(f"{table}.{column}: hashed {len(plain)} of {len(rows)} passwords")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+# Adds forum.revision, the counter behind the forum and board ETags, to an existing database.
+#
+# Usage: python -m server.migrate_revisions
+from sqlalchemy import inspect, text
+from server.database import engine
+
+def main():
+    columns = {column["name"] for column in inspect(engine).get_columns("forum")}
+    if "revision" in columns:
+        print("forum.revision: already present")
+        return
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE forum ADD COLUMN revision INTEGER NOT NULL DEFAULT 0"))
+    print("forum.revision: added")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,17 @@
+# Creates the full-text search index behind /coboard/{board}/search: a generated tsvector
+# column with a GIN index per table on PostgreSQL, FTS5 tables and triggers on SQLite.
+# Existing rows are indexed as part of it, so run it once before starting the new version.
+#
+# Usage: python -m server.migrate_search
+from server.database import engine
+from server import search
+
+def main():
+    indexed = search.ensure_index(engine)
+    for name in indexed:
+        print(f"{name}: search index created")
+    if not indexed:
+        print("search index: already present")
+
+if __name__ == "__main__":
+    main()
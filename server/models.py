@@ -1,19 +1,19 @@
-from sqlalchemy import Column, Integer, String, LargeBinary, Date, ForeignKey, CheckConstraint, func
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, LargeBinary, Date, ForeignKey, CheckConstraint, Index, func
+from sqlalchemy.orm import relationship, deferred
 from .database import Base
 
 # ABookmark model
 class ABookmark(Base):
     __tablename__ = 'abookmark'
     
-    forum_id = Column(Integer, ForeignKey('forum.forum_id'), primary_key=True, index=True)
+    forum_id = Column(Integer, ForeignKey('forum.forum_id', ondelete='CASCADE'), primary_key=True, index=True)
     user_id = Column(String(255), ForeignKey('anonymous_user.aid'), primary_key=True, index=True)
 
 # Access model
 class Access(Base):
     __tablename__ = 'access'
     
-    forum_id = Column(Integer, ForeignKey('forum.forum_id'), primary_key=True, index=True)
+    forum_id = Column(Integer, ForeignKey('forum.forum_id', ondelete='CASCADE'), primary_key=True, index=True)
     user_id = Column(String(10), ForeignKey('se_user.sid'), primary_key=True, index=True)
 
 # AnonymousUser model
@@ -22,7 +22,8 @@ class AnonymousUser(Base):
     
     aid = Column(String(10), primary_key=True, index=True)
     apw = Column(String(255), nullable=False)
-    aprofile = Column(LargeBinary)
+    aprofile = deferred(Column(LargeBinary))  # Legacy inline image, moved to the blob store
+    aprofile_hash = Column(String(64))
     mail = Column(String(255), nullable=False)
 
 # Comment model
@@ -51,15 +52,23 @@ class Forum(Base):
     forum_id = Column(Integer, primary_key=True, index=True)
     forum_name = Column(String(255), nullable=False, unique=True, index=True)
     description = Column(String(255))
-    creator_id = Column(String(10), ForeignKey('se_user.sid'), nullable=False)
+    creator_id = Column(String(10), ForeignKey('se_user.sid'), nullable=False, index=True)
     created_time = Column(Date, nullable=False, default=func.current_date())
-    icon = Column(LargeBinary)
+    icon = deferred(Column(LargeBinary))  # Legacy inline image, moved to the blob store
+    icon_hash = Column(String(64))
     wallpaper = Column(String(7), default="#006b62")
     font = Column(Integer, default=0)
     sort_by = Column(Integer, default=0)
     slug = Column(String(255), nullable=False, unique=True)
     board = Column(String(255), nullable=False)
     last_updated = Column(Date, nullable=False, default=func.current_date())
+    revision = Column(Integer, nullable=False, default=0, server_default="0")  # Bumped by every change to the forum view
+
+    __table_args__ = (
+        # Board pages, newest forum first, and forum lookups by board and slug
+        Index('ix_forum_board_forum_id', 'board', 'forum_id'),
+        Index('ix_forum_board_slug', 'board', 'slug'),
+    )
 
     # Updated topics relationship
     topics = relationship("Topic", secondary="forum_topic", back_populates="forums")
@@ -69,8 +78,13 @@ class Forum(Base):
 class ForumTag(Base):
     __tablename__ = 'forum_tag'
     
-    forum_id = Column(Integer, ForeignKey('forum.forum_id'), primary_key=True, index=True)
-    tag_id = Column(Integer, ForeignKey('tag.tag_id'), primary_key=True, index=True)
+    forum_id = Column(Integer, ForeignKey('forum.forum_id', ondelete='CASCADE'), primary_key=True, index=True)
+    tag_id = Column(Integer, ForeignKey('tag.tag_id', ondelete='CASCADE'), primary_key=True, index=True)
+
+    __table_args__ = (
+        # Tag filters on the board page look forums up by tag, without touching the table
+        Index('ix_forum_tag_tag_forum', 'tag_id', 'forum_id'),
+    )
 
     forum = relationship("Forum")
     tag = relationship("Tag")
@@ -79,8 +93,8 @@ class ForumTag(Base):
 class ForumTopic(Base):
     __tablename__ = 'forum_topic'
     
-    forum_id = Column(Integer, ForeignKey('forum.forum_id'), primary_key=True, index=True)
-    topic_id = Column(Integer, ForeignKey('topic.topic_id'), primary_key=True, index=True)
+    forum_id = Column(Integer, ForeignKey('forum.forum_id', ondelete='CASCADE'), primary_key=True, index=True)
+    topic_id = Column(Integer, ForeignKey('topic.topic_id', ondelete='CASCADE'), primary_key=True, index=True)
 
     forum = relationship("Forum")
     topic = relationship("Topic")
@@ -95,7 +109,8 @@ class Post(Base):
     heart = Column(Integer, default=0)
     spost_creator = Column(String(10), ForeignKey('se_user.sid'), nullable=True)
     apost_creator = Column(String(10), ForeignKey('anonymous_user.aid'), nullable=True)
-    pic = Column(LargeBinary)
+    pic = deferred(Column(LargeBinary))  # Legacy inline image, moved to the blob store
+    pic_hash = Column(String(64))
 
     __table_args__ = (
         CheckConstraint(
@@ -106,13 +121,14 @@ class Post(Base):
 
     topics = relationship("Topic", secondary="topic_post", back_populates="posts")
     comments = relationship("Comment", secondary="post_comment", back_populates="posts")
+    files = relationship("File")
 
 # PostComment model
 class PostComment(Base):
     __tablename__ = 'post_comment'
     
-    post_id = Column(Integer, ForeignKey('post.post_id'), primary_key=True, index=True)
-    comment_id = Column(Integer, ForeignKey('comment.comment_id'), primary_key=True, index=True)
+    post_id = Column(Integer, ForeignKey('post.post_id', ondelete='CASCADE'), primary_key=True, index=True)
+    comment_id = Column(Integer, ForeignKey('comment.comment_id', ondelete='CASCADE'), primary_key=True, index=True)
 
     post = relationship("Post")
     comment = relationship("Comment")
@@ -121,7 +137,7 @@ class PostComment(Base):
 class SBookmark(Base):
     __tablename__ = 'sbookmark'
     
-    forum_id = Column(Integer, ForeignKey('forum.forum_id'), primary_key=True, index=True)
+    forum_id = Column(Integer, ForeignKey('forum.forum_id', ondelete='CASCADE'), primary_key=True, index=True)
     user_id = Column(String(255), ForeignKey('se_user.sid'), primary_key=True, index=True)
 
 # SEUser model
@@ -130,7 +146,8 @@ class SEUser(Base):
     
     sid = Column(String(10), primary_key=True, index=True)
     spw = Column(String(255), nullable=False)
-    sprofile = Column(LargeBinary)
+    sprofile = deferred(Column(LargeBinary))  # Legacy inline image, moved to the blob store
+    sprofile_hash = Column(String(64))
     sfile = Column(String(255))
     username = Column(String(255))
 
@@ -143,6 +160,11 @@ class Tag(Base):
     board = Column(String(255), nullable=False)
     use = Column(Integer, nullable=False, default=0)
 
+    __table_args__ = (
+        # A board's tags, most used first
+        Index('ix_tag_board_use', 'board', 'use', 'tag_id'),
+    )
+
     forums = relationship("Forum", secondary="forum_tag", back_populates="tags")
 
 # Topic model
@@ -162,8 +184,8 @@ class Topic(Base):
 class TopicPost(Base):
     __tablename__ = 'topic_post'
     
-    topic_id = Column(Integer, ForeignKey('topic.topic_id'), primary_key=True, index=True)
-    post_id = Column(Integer, ForeignKey('post.post_id'), primary_key=True, index=True)
+    topic_id = Column(Integer, ForeignKey('topic.topic_id', ondelete='CASCADE'), primary_key=True, index=True)
+    post_id = Column(Integer, ForeignKey('post.post_id', ondelete='CASCADE'), primary_key=True, index=True)
 
     topic = relationship("Topic")
     post = relationship("Post")
@@ -175,6 +197,7 @@ class File(Base):
     filename = Column(String, unique=True, index=True)
     path = Column(String)
     extension = Column(String)
-    s_owner = Column(String, ForeignKey('se_user.sid'))
-    a_owner = Column(String, ForeignKey('anonymous_user.aid'))
-    post_id = Column(Integer, ForeignKey('post.post_id'))
+    s_owner = Column(String, ForeignKey('se_user.sid'), index=True)
+    a_owner = Column(String, ForeignKey('anonymous_user.aid'), index=True)
+    post_id = Column(Integer, ForeignKey('post.post_id', ondelete='CASCADE'), index=True)
+    sha256 = Column(String(64))
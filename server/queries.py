@@ -0,0 +1,249 @@
+import base64
+import binascii
+from sqlalchemy import select, update, delete, union, func, desc, case
+from sqlalchemy.orm import selectinload
+from . import models
+
+# Opaque keyset cursors: the last id of a page, base64url encoded
+def encode_cursor(key: int) -> str:
+    return base64.urlsafe_b64encode(str(key).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+# Subquery of (forum_id, total_contributors) for the forums selected by board_forums.
+# Post and comment creators are unioned through forum_topic/topic_post/post_comment
+# and counted once per forum, leaving out the forum creator.
+def contributor_counts(board_forums):
+
+    post_creators = (
+        select(
+            models.ForumTopic.forum_id.label("forum_id"),
+            func.coalesce(models.Post.spost_creator, models.Post.apost_creator).label("contributor"),
+        )
+        .join(models.TopicPost, models.TopicPost.topic_id == models.ForumTopic.topic_id)
+        .join(models.Post, models.Post.post_id == models.TopicPost.post_id)
+        .where(models.ForumTopic.forum_id.in_(board_forums))
+    )
+
+    comment_creators = (
+        select(
+            models.ForumTopic.forum_id.label("forum_id"),
+            func.coalesce(models.Comment.scomment_creator, models.Comment.acomment_creator).label("contributor"),
+        )
+        .join(models.TopicPost, models.TopicPost.topic_id == models.ForumTopic.topic_id)
+        .join(models.PostComment, models.PostComment.post_id == models.TopicPost.post_id)
+        .join(models.Comment, models.Comment.comment_id == models.PostComment.comment_id)
+        .where(models.ForumTopic.forum_id.in_(board_forums))
+    )
+
+    contributors = union(post_creators, comment_creators).subquery()
+
+    return (
+        select(
+            contributors.c.forum_id,
+            func.count(func.distinct(contributors.c.contributor)).label("total_contributors"),
+        )
+        .join(models.Forum, models.Forum.forum_id == contributors.c.forum_id)
+        .where(contributors.c.contributor != models.Forum.creator_id)
+        .group_by(contributors.c.forum_id)
+        .subquery()
+    )
+
+# Ids of the forums carrying any (or, with match="all", every one) of the given tags.
+# Both forms are answered from the forum_tag (tag_id, forum_id) index alone.
+def tagged_forums(tag_ids, match: str = "any"):
+    tag_ids = sorted(set(tag_ids))
+    statement = select(models.ForumTag.forum_id).where(models.ForumTag.tag_id.in_(tag_ids))
+    if match == "all":
+        statement = statement.group_by(models.ForumTag.forum_id).having(func.count(models.ForumTag.tag_id) == len(tag_ids))
+    return statement
+
+# The board's most used tags
+def top_tags(board: str, limit: int = None):
+    return (
+        select(models.Tag)
+        .where(models.Tag.board == board)
+        .order_by(desc(models.Tag.use), desc(models.Tag.tag_id))
+        .limit(limit)
+    )
+
+# Forums of a board together with their contributor count, newest first, in one query.
+# With a limit only one page is read, keyed on forum_id, so deep pages cost the same as the first.
+def forums_with_contributors(board: str, before_id: int = None, limit: int = None, tag_ids=None, match: str = "any"):
+    page = select(models.Forum.forum_id).where(models.Forum.board == board)
+    if tag_ids:
+        page = page.where(models.Forum.forum_id.in_(tagged_forums(tag_ids, match)))
+    if before_id is not None:
+        page = page.where(models.Forum.forum_id < before_id)
+    page = page.order_by(desc(models.Forum.forum_id)).limit(limit)
+
+    counts = contributor_counts(page)
+    return (
+        select(models.Forum, func.coalesce(counts.c.total_contributors, 0))
+        .outerjoin(counts, counts.c.forum_id == models.Forum.forum_id)
+        .where(models.Forum.forum_id.in_(page))
+        .order_by(desc(models.Forum.forum_id))
+    )
+
+# Forum with its whole topic -> post -> comment/file tree.
+# Each level is fetched with one batched SELECT ... IN, so the number of
+# queries stays the same no matter how many topics or posts the forum has.
+def load_forum_tree(board: str, slug: str):
+    return (
+        select(models.Forum)
+        .options(
+            selectinload(models.Forum.topics)
+            .selectinload(models.Topic.posts)
+            .options(
+                selectinload(models.Post.comments),
+                selectinload(models.Post.files),
+            )
+        )
+        .where(models.Forum.board == board, models.Forum.slug == slug)
+    )
+
+# Forum with its topics only, for the paginated forum view
+def load_forum_topics(board: str, slug: str):
+    return (
+        select(models.Forum)
+        .options(selectinload(models.Forum.topics))
+        .where(models.Forum.board == board, models.Forum.slug == slug)
+    )
+
+# One page of a forum's posts with their topic id, comments and files, keyed on post_id
+def forum_posts_page(forum_id: int, after_id: int = None, limit: int = None):
+    statement = (
+        select(models.Post, models.TopicPost.topic_id)
+        .join(models.TopicPost, models.TopicPost.post_id == models.Post.post_id)
+        .join(models.ForumTopic, models.ForumTopic.topic_id == models.TopicPost.topic_id)
+        .where(models.ForumTopic.forum_id == forum_id)
+        .options(
+            selectinload(models.Post.comments),
+            selectinload(models.Post.files),
+        )
+    )
+    if after_id is not None:
+        statement = statement.where(models.Post.post_id > after_id)
+    return statement.order_by(models.Post.post_id).limit(limit)
+
+# All of a forum's posts with their topic id, comments and files, grouped by topic,
+# read from a server-side cursor batch posts at a time (comments and files per batch)
+def forum_posts_by_topic(forum_id: int, batch: int):
+    return (
+        select(models.Post, models.TopicPost.topic_id)
+        .join(models.TopicPost, models.TopicPost.post_id == models.Post.post_id)
+        .join(models.ForumTopic, models.ForumTopic.topic_id == models.TopicPost.topic_id)
+        .where(models.ForumTopic.forum_id == forum_id)
+        .options(
+            selectinload(models.Post.comments),
+            selectinload(models.Post.files),
+        )
+        .order_by(models.TopicPost.topic_id, models.Post.post_id)
+        .execution_options(yield_per=batch)
+    )
+
+# Id, board and slug of the forum a post belongs to
+def forum_of_post(post_id: int):
+    return (
+        select(models.Forum.forum_id, models.Forum.board, models.Forum.slug)
+        .join(models.ForumTopic, models.ForumTopic.forum_id == models.Forum.forum_id)
+        .join(models.TopicPost, models.TopicPost.topic_id == models.ForumTopic.topic_id)
+        .where(models.TopicPost.post_id == post_id)
+    )
+
+# Id, board and slug of the forum a comment is in, through its post and topic
+def forum_of_comment(comment_id: int):
+    return (
+        select(models.Forum.forum_id, models.Forum.board, models.Forum.slug)
+        .join(models.ForumTopic, models.ForumTopic.forum_id == models.Forum.forum_id)
+        .join(models.TopicPost, models.TopicPost.topic_id == models.ForumTopic.topic_id)
+        .join(models.PostComment, models.PostComment.post_id == models.TopicPost.post_id)
+        .where(models.PostComment.comment_id == comment_id)
+    )
+
+# Id and revision of a forum, enough to answer a conditional GET without loading it
+def forum_revision(board: str, slug: str):
+    return select(models.Forum.forum_id, models.Forum.revision).where(
+        models.Forum.board == board, models.Forum.slug == slug
+    )
+
+# Ids and revisions of the forums on one page of a board, in listing order
+def board_revisions(board: str, before_id: int = None, limit: int = None, tag_ids=None, match: str = "any"):
+    statement = select(models.Forum.forum_id, models.Forum.revision).where(models.Forum.board == board)
+    if tag_ids:
+        statement = statement.where(models.Forum.forum_id.in_(tagged_forums(tag_ids, match)))
+    if before_id is not None:
+        statement = statement.where(models.Forum.forum_id < before_id)
+    return statement.order_by(desc(models.Forum.forum_id)).limit(limit)
+
+# Bump the revision of the matching forums in the database, so concurrent writes never share one
+def bump_revision(*conditions):
+    return (
+        update(models.Forum)
+        .where(*conditions)
+        .values(revision=models.Forum.revision + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+# Move Tag.use by +1 for added tags and -1 for removed ones, in one atomic UPDATE.
+# The counter is changed in the database, so concurrent forum edits never lose a count.
+def shift_tag_use(added=(), removed=()):
+    added, removed = set(added) - set(removed), set(removed) - set(added)
+    return (
+        update(models.Tag)
+        .where(models.Tag.tag_id.in_(sorted(added | removed)))
+        .values(use=models.Tag.use + case((models.Tag.tag_id.in_(sorted(added)), 1), else_=-1))
+        .execution_options(synchronize_session=False)
+    )
+
+# Recompute Tag.use from forum_tag for every tag (or those of one board) whose count drifted.
+# Returns the board of each corrected tag.
+def reconcile_tag_use(board: str = None):
+    actual = (
+        select(func.count())
+        .where(models.ForumTag.tag_id == models.Tag.tag_id)
+        .scalar_subquery()
+    )
+    statement = update(models.Tag).where(models.Tag.use != actual)
+    if board is not None:
+        statement = statement.where(models.Tag.board == board)
+    return (
+        statement
+        .values(use=actual)
+        .returning(models.Tag.board)
+        .execution_options(synchronize_session=False)
+    )
+
+# Ids of a forum's topics, posts and comments, walked down the link tables
+def forum_tree(forum_id: int):
+    topics = select(models.ForumTopic.topic_id).where(models.ForumTopic.forum_id == forum_id)
+    posts = select(models.TopicPost.post_id).where(models.TopicPost.topic_id.in_(topics))
+    comments = select(models.PostComment.comment_id).where(models.PostComment.post_id.in_(posts))
+    return topics, posts, comments
+
+# Delete a forum's File rows, returning their paths on disk
+def delete_forum_files(forum_id: int):
+    _, posts, _ = forum_tree(forum_id)
+    return delete(models.File).where(models.File.post_id.in_(posts)).returning(models.File.path)
+
+DELETE_CHUNK = 10_000  # Ids per IN list, well under the bind parameter limits of SQLite and asyncpg
+
+def delete_by_ids(model, column, ids):
+    return [delete(model).where(column.in_(ids[i:i + DELETE_CHUNK])) for i in range(0, len(ids), DELETE_CHUNK)]
+
+# Deletes of a forum's whole topic -> post -> comment tree, given the ids collected with forum_tree
+# beforehand. Link rows go before the rows they point at, so the foreign keys hold with or
+# without ON DELETE CASCADE.
+def delete_forum_tree(forum_id: int, topic_ids, post_ids, comment_ids):
+    return [
+        *delete_by_ids(models.PostComment, models.PostComment.comment_id, comment_ids),
+        *delete_by_ids(models.Comment, models.Comment.comment_id, comment_ids),
+        *delete_by_ids(models.TopicPost, models.TopicPost.post_id, post_ids),
+        *delete_by_ids(models.Post, models.Post.post_id, post_ids),
+        delete(models.ForumTopic).where(models.ForumTopic.forum_id == forum_id),
+        *delete_by_ids(models.Topic, models.Topic.topic_id, topic_ids),
+    ]
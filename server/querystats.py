@@ -0,0 +1,73 @@
+import contextvars
+import logging
+import re
+import time
+from contextlib import contextmanager
+from sqlalchemy import event
+from server.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Number, total time and slowest of the SQL statements run while handling one request
+class QueryStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = None
+
+    def record(self, statement: str, duration: float):
+        self.count += 1
+        self.total += duration
+        if duration >= self.slowest:
+            self.slowest = duration
+            self.slowest_statement = statement
+
+    # Server-Timing header value, durations in milliseconds
+    def server_timing(self) -> str:
+        return f'db;dur={self.total * 1000:.1f};desc="{self.count} queries", db-slowest;dur={self.slowest * 1000:.1f}'
+
+current = contextvars.ContextVar("query_stats", default=None)
+
+# Count the statements run inside the block. Handlers on the async engine and
+# sessions in the thread pool both inherit the context, so they are counted too.
+@contextmanager
+def track():
+    stats = QueryStats()
+    token = current.set(stats)
+    try:
+        yield stats
+    finally:
+        current.reset(token)
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_start"] = time.perf_counter()
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info.pop("query_start")
+    stats = current.get()
+    if stats is not None:
+        stats.record(statement, duration)
+    # Only the SQL with its placeholders is logged, parameters carry password hashes and mail addresses
+    if settings.slow_query_ms and duration * 1000 >= settings.slow_query_ms:
+        logger.warning(f"Slow query ({duration * 1000:.1f} ms): {statement}")
+
+# Time every statement run on the engine (pass async_engine.sync_engine for the async one)
+def instrument(engine):
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", after_cursor_execute)
+
+SERVER_TIMING_QUERIES = re.compile(r'\bdb;dur=[\d.]+;desc="(\d+) queries"')
+
+# Statements run for a response, read from its Server-Timing header
+def queries_of(response) -> int:
+    match = SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+    if not match:
+        raise ValueError("Response has no db Server-Timing entry")
+    return int(match.group(1))
+
+# Fail when the request behind a TestClient or httpx response ran more statements than budget
+def assert_query_budget(response, budget: int):
+    count = queries_of(response)
+    if count > budget:
+        raise AssertionError(f"{response.request.method} {response.request.url.path} ran {count} queries, budget is {budget}")
@@ -0,0 +1,22 @@
+# Recomputes Tag.use from forum_tag in one aggregate UPDATE, fixing counts that drifted
+# (for instance from forums deleted before deletes adjusted them).
+#
+# Usage: python -m server.reconcile_tags [board]
+import sys
+from collections import Counter
+from server.database import engine
+from server import models, queries
+
+def main(board=None):
+    with engine.begin() as conn:
+        boards = Counter(conn.execute(queries.reconcile_tag_use(board)).scalars().all())
+        # Tag use counts show in every forum of the board, so their ETags have to change
+        if boards:
+            conn.execute(queries.bump_revision(models.Forum.board.in_(sorted(boards))))
+    for name, fixed in sorted(boards.items()):
+        print(f"{name}: fixed {fixed} tag counts")
+    if not boards:
+        print("tag counts: all consistent")
+
+if __name__ == "__main__":
+    main(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -1,6 +1,6 @@
 from datetime import date
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import AliasChoices, BaseModel, Field
+from typing import Optional, List, Union
 
 # Tag Pydantic models
 class TagBase(BaseModel):
@@ -44,8 +44,8 @@ class Access(AccessBase):
 # AnonymousUser Pydantic models
 class AnonymousUserBase(BaseModel):
     aid: str
-    apw: str
-    aprofile: Optional[str] = Field(None, description="Base64 encoded icon")
+    apw: str = Field(..., exclude=True)  # Accepted on signup, never sent back
+    aprofile: Optional[str] = Field(None, validation_alias=AliasChoices("aprofile_hash", "aprofile"), description="Blob hash of the image (GET /blob/{hash}), base64 when uploading")
     mail: str
 
 class AnonymousUserCreate(AnonymousUserBase):
@@ -96,7 +96,7 @@ class ForumBase(BaseModel):
     description: Optional[str] = None
     creator_id: str
     created_time: Optional[date] = Field(default_factory=date.today)
-    icon: Optional[str] = Field(None, description="Base64 encoded icon")
+    icon: Optional[str] = Field(None, validation_alias=AliasChoices("icon_hash", "icon"), description="Blob hash of the image (GET /blob/{hash}), base64 when uploading")
     wallpaper: Optional[str] = "#006b62"
     font: Optional[int] = 0
     sort_by: Optional[int] = 0
@@ -144,7 +144,7 @@ class PostBase(BaseModel):
     heart: Optional[int] = 0
     spost_creator: Optional[str]
     apost_creator: Optional[str]
-    pic: Optional[str] = Field(None, description="Base64 encoded icon")
+    pic: Optional[str] = Field(None, validation_alias=AliasChoices("pic_hash", "pic"), description="Blob hash of the image (GET /blob/{hash}), base64 when uploading")
     comments: List[Comment] = []
     files: List[File] = []
 
@@ -184,8 +184,8 @@ class SBookmark(SBookmarkBase):
 # SEUser Pydantic models
 class SEUserBase(BaseModel):
     sid: str
-    spw: str
-    sprofile: Optional[str] = Field(None, description="Base64 encoded icon")
+    spw: str = Field(..., exclude=True)  # Stored as a hash, never sent back
+    sprofile: Optional[str] = Field(None, validation_alias=AliasChoices("sprofile_hash", "sprofile"), description="Blob hash of the image (GET /blob/{hash}), base64 when uploading")
     sfile: Optional[str] = None
     username: Optional[str]
 
@@ -233,6 +233,7 @@ class ForumResponse(Forum):
     sbookmarks: Optional[List[SBookmark]]
     abookmarks: Optional[List[ABookmark]]
     access: Optional[List[Access]]
+    next_cursor: Optional[str] = None  # Cursor of the next page of posts, None on the last page
 
     class Config:
         from_attributes = True
@@ -245,10 +246,28 @@ class BoardResponse(BaseModel):
     tags: List[Tag]
     forumtag: Optional[List[ForumTag]]
     access: Optional[List[Access]]
+    next_cursor: Optional[str] = None  # Cursor of the next page of forums, None on the last page
 
     class Config:
         from_attributes = True
 
+# Search Pydantic models
+class SearchResult(BaseModel):
+    kind: str  # forum, post or comment
+    item_id: int
+    forum_id: int
+    forum_slug: str
+    forum_name: str
+    topic_id: Optional[int] = None
+    post_id: Optional[int] = None
+    title: Optional[str] = None
+    text: Optional[str] = None
+    rank: float
+
+class SearchResponse(BaseModel):
+    results: List[SearchResult]
+    next_cursor: Optional[str] = None  # Cursor of the next page of results, None on the last page
+
 class LikeUpdate(BaseModel):
     item_id: int
     item_type: str  # 'post' or 'comment'
@@ -258,13 +277,6 @@ class LikeResponse(BaseModel):
     item_type: str
     likes: int
 
-class UserResponse(BaseModel):
-    se: List[SEUser]
-    anonymous: List[AnonymousUser]
-
-    class Config:
-        from_attributes = True
-
 class BookmarkCreate(BaseModel):
     user_id: str
     status: str
@@ -278,12 +290,28 @@ class AnonymousUserResponse(AnonymousUserBase):
     bookmarked: Optional[List[Forum]]
     files: Optional[List[File]]
 
-class EmailRequest(BaseModel):
-    receiver_email: str
-    pw: str
-
 class UserUpdate(BaseModel):
     studentId: str
     username: str
+    password: Optional[str] = None  # Left out to keep the current password
+    profileImage: str
+
+class LoginRequest(BaseModel):
+    username: str  # Student id or anonymous user name
     password: str
-    profileImage: str
\ No newline at end of file
+
+class LoginResponse(BaseModel):
+    token: str
+    status: str  # "se" or "a", as the front end stores it
+    user: Union[SEUser, AnonymousUser]
+
+class UserExists(BaseModel):
+    exists: bool
+    status: Optional[str] = None  # "se" or "a" when the user exists
+
+class RecoverRequest(BaseModel):
+    username: str
+
+class ResetRequest(BaseModel):
+    token: str  # From the link mailed by /auth/recover
+    password: str = Field(..., min_length=1)
\ No newline at end of file
@@ -0,0 +1,155 @@
+import logging
+from sqlalchemy import select, literal_column, func, union_all, table, column, cast, null, desc, inspect, Integer, Float, String
+from . import models
+
+logger = logging.getLogger(__name__)
+
+# Indexed text per table: (table, key, columns). The first column weighs more in the ranking.
+SOURCES = [
+    ("forum", "forum_id", ("forum_name", "description")),
+    ("post", "post_id", ("post_head", "post_body")),
+    ("comment", "comment_id", ("comment_text",)),
+]
+
+# Postgres: a generated tsvector column with a GIN index on each table, kept up to date by the database
+def postgres_ddl(name, key, columns):
+    weights = "ABCD"
+    vector = " || ".join(
+        f"setweight(to_tsvector('simple', coalesce({c}, '')), '{weights[i]}')" for i, c in enumerate(columns)
+    )
+    return [
+        f"ALTER TABLE {name} ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ({vector}) STORED",
+        f"CREATE INDEX IF NOT EXISTS ix_{name}_search_vector ON {name} USING GIN (search_vector)",
+    ]
+
+# SQLite: an external-content FTS5 table per table, kept up to date by triggers
+def sqlite_ddl(name, key, columns):
+    names = ", ".join(columns)
+    new = ", ".join(f"new.{c}" for c in columns)
+    old = ", ".join(f"old.{c}" for c in columns)
+    return [
+        f"CREATE VIRTUAL TABLE {name}_fts USING fts5({names}, content='{name}', content_rowid='{key}')",
+        f"CREATE TRIGGER {name}_fts_insert AFTER INSERT ON {name} BEGIN "
+        f"INSERT INTO {name}_fts(rowid, {names}) VALUES (new.{key}, {new}); END",
+        f"CREATE TRIGGER {name}_fts_delete AFTER DELETE ON {name} BEGIN "
+        f"INSERT INTO {name}_fts({name}_fts, rowid, {names}) VALUES ('delete', old.{key}, {old}); END",
+        f"CREATE TRIGGER {name}_fts_update AFTER UPDATE OF {names} ON {name} BEGIN "
+        f"INSERT INTO {name}_fts({name}_fts, rowid, {names}) VALUES ('delete', old.{key}, {old}); "
+        f"INSERT INTO {name}_fts(rowid, {names}) VALUES (new.{key}, {new}); END",
+        # Index the rows that were there before the table existed
+        f"INSERT INTO {name}_fts({name}_fts) VALUES ('rebuild')",
+    ]
+
+def has_source_index(inspector, dialect: str, name: str) -> bool:
+    if dialect == "postgresql":
+        return "search_vector" in {c["name"] for c in inspector.get_columns(name)}
+    return inspector.has_table(f"{name}_fts")
+
+# Whether every source table is indexed, for an engine or connection
+def index_ready(bind) -> bool:
+    dialect = bind.dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        return False
+    inspector = inspect(bind)
+    return all(has_source_index(inspector, dialect, name) for name, _, _ in SOURCES)
+
+# Create the search index for any table that does not have it yet, returning the tables indexed.
+# Run by server.migrate_search, the DDL takes locks and rebuilds that do not belong in app startup.
+def ensure_index(engine):
+    dialect = engine.dialect.name
+    if dialect not in ("postgresql", "sqlite"):
+        logger.warning(f"Full-text search is not available on {dialect}")
+        return []
+
+    inspector = inspect(engine)
+    indexed = []
+    with engine.begin() as conn:
+        for name, key, columns in SOURCES:
+            if has_source_index(inspector, dialect, name):
+                continue
+            if dialect == "postgresql":
+                statements = postgres_ddl(name, key, columns)
+            else:
+                statements = sqlite_ddl(name, key, columns)
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+            indexed.append(name)
+    return indexed
+
+# Every word of the query as a quoted FTS5 string, so user input is never parsed as FTS syntax
+def fts5_query(q: str) -> str:
+    return " ".join('"' + word.replace('"', '""') + '"' for word in q.split())
+
+# Match condition, rank (higher is better) and extra FROM clause for one source table
+def matcher(dialect: str, name: str, key, q: str):
+    columns = next(columns for source, _, columns in SOURCES if source == name)
+    if dialect == "postgresql":
+        vector = literal_column(f"{name}.search_vector")
+        query = func.websearch_to_tsquery(literal_column("'simple'::regconfig"), q)
+        return vector.op("@@")(query), func.ts_rank_cd(vector, query), None
+    fts = table(f"{name}_fts", column("rowid"))
+    match = literal_column(f"{name}_fts").op("MATCH")(fts5_query(q))
+    # Same weighting as the Postgres A/B labels
+    weights = [2.0] + [1.0] * (len(columns) - 1)
+    return match, -func.bm25(literal_column(f"{name}_fts"), *weights), (fts, fts.c.rowid == key)
+
+def result_columns(kind, item_id, topic_id, post_id, title, text, rank):
+    return [
+        literal_column(f"'{kind}'").label("kind"),
+        item_id.label("item_id"),
+        models.Forum.forum_id.label("forum_id"),
+        models.Forum.slug.label("forum_slug"),
+        models.Forum.forum_name.label("forum_name"),
+        cast(topic_id, Integer).label("topic_id"),
+        cast(post_id, Integer).label("post_id"),
+        cast(title, String).label("title"),
+        cast(text, String).label("text"),
+        cast(rank, Float).label("rank"),
+    ]
+
+# Forums, posts and comments of a board matching q, best match first
+def search_statement(dialect: str, board: str, q: str, offset: int, limit: int):
+    match, rank, fts = matcher(dialect, "forum", models.Forum.forum_id, q)
+    forums = select(*result_columns(
+        "forum", models.Forum.forum_id, null(), null(), models.Forum.forum_name, models.Forum.description, rank
+    ))
+    if fts is not None:
+        forums = forums.join_from(models.Forum, *fts)
+    forums = forums.where(models.Forum.board == board, match)
+
+    match, rank, fts = matcher(dialect, "post", models.Post.post_id, q)
+    posts = select(*result_columns(
+        "post", models.Post.post_id, models.TopicPost.topic_id, models.Post.post_id, models.Post.post_head, models.Post.post_body, rank
+    )).select_from(models.Post)
+    if fts is not None:
+        posts = posts.join(*fts)
+    posts = (
+        posts
+        .join(models.TopicPost, models.TopicPost.post_id == models.Post.post_id)
+        .join(models.ForumTopic, models.ForumTopic.topic_id == models.TopicPost.topic_id)
+        .join(models.Forum, models.Forum.forum_id == models.ForumTopic.forum_id)
+        .where(models.Forum.board == board, match)
+    )
+
+    match, rank, fts = matcher(dialect, "comment", models.Comment.comment_id, q)
+    comments = select(*result_columns(
+        "comment", models.Comment.comment_id, models.TopicPost.topic_id, models.PostComment.post_id, null(), models.Comment.comment_text, rank
+    )).select_from(models.Comment)
+    if fts is not None:
+        comments = comments.join(*fts)
+    comments = (
+        comments
+        .join(models.PostComment, models.PostComment.comment_id == models.Comment.comment_id)
+        .join(models.TopicPost, models.TopicPost.post_id == models.PostComment.post_id)
+        .join(models.ForumTopic, models.ForumTopic.topic_id == models.TopicPost.topic_id)
+        .join(models.Forum, models.Forum.forum_id == models.ForumTopic.forum_id)
+        .where(models.Forum.board == board, match)
+    )
+
+    results = union_all(forums, posts, comments).subquery()
+    return (
+        select(results)
+        .order_by(desc(results.c.rank), results.c.kind, results.c.item_id)
+        .offset(offset)
+        .limit(limit)
+    )
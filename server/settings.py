@@ -6,6 +6,60 @@ load_dotenv()
 class Settings(BaseSettings):
     database_url: str
     debug: bool = False
+    blob_dir: str = "blobs/"
+    async_db: bool = True  # False runs the sync engine in a thread pool
+
+    # Connection pool, per engine and per worker process
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: float = 30
+    db_pool_recycle: int = -1  # Seconds before a connection is replaced, -1 keeps it forever
+    db_pool_pre_ping: bool = False
+
+    # Statements slower than this are logged, without their parameters, 0 turns the log off
+    slow_query_ms: float = 200
+
+    # Batch likes in memory and write them every like_flush_interval seconds
+    like_buffer: bool = False
+    like_flush_interval: float = 1.0
+
+    max_upload_size: int = 50 * 1024 * 1024  # Bytes
+
+    # Posts read per round trip from the server-side cursor behind a streamed forum dump
+    stream_batch_size: int = 500
+
+    # Cached board and forum views: "memory" (per process), "redis" or "none"
+    cache_backend: str = "memory"
+    cache_max_entries: int = 1024
+    cache_ttl: float = 300  # Seconds, bounds staleness between worker processes
+    redis_url: str = "redis://localhost:6379/0"
+
+    # Server-Sent Events pushed to clients viewing a forum. With several workers
+    # "postgres" (LISTEN/NOTIFY on DATABASE_URL) or "redis" (REDIS_URL) shares
+    # events and cache invalidations between them, "local" keeps them in-process
+    event_broker: str = "local"
+    event_queue_size: int = 100  # Events buffered per client before it is told to reload
+    event_heartbeat: float = 15  # Seconds between keep-alive comments on an idle stream
+
+    # Session tokens returned by /auth/login, signed with session_secret (set it when running several workers)
+    session_secret: str = ""
+    session_ttl: int = 7 * 24 * 3600  # Seconds
+
+    # Password reset links mailed by /auth/recover point at the front end and expire after reset_token_ttl
+    frontend_url: str = "https://www.knppkp.me"
+    reset_token_ttl: int = 3600  # Seconds
+
+    # Outgoing mail, sent by a pool of queue workers that keep their SMTP connection open
+    smtp_host: str = "smtp.gmail.com"
+    smtp_port: int = 587
+    smtp_starttls: bool = True
+    smtp_username: str = "kiddoquest.se@gmail.com"
+    smtp_password: str = ""
+    mail_sender: str = "kiddoquest.se@gmail.com"
+    mail_workers: int = 2
+    mail_max_retries: int = 3
+    mail_retry_backoff: float = 1.0  # Seconds, doubled after every failed attempt
+    mail_queue_size: int = 1000
 
     class Config:
         env_file = ".env"
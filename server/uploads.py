@@ -0,0 +1,86 @@
+import hashlib
+import os
+import tempfile
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+
+CHUNK_SIZE = 1024 * 1024
+UPLOAD_DIR = "uploads/"
+FORM_OVERHEAD = 64 * 1024  # Bytes of multipart boundaries and other form fields allowed on top of the file
+
+class UploadTooLarge(Exception):
+    pass
+
+def write_chunk(buffer, digest, chunk):
+    digest.update(chunk)
+    buffer.write(chunk)
+
+def discard(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+# Remove files whose rows were deleted; runs in the thread pool as a background task
+def discard_all(paths):
+    for path in paths:
+        if path:
+            discard(path)
+
+class UploadSizeLimit:
+    """ASGI middleware capping the request body of upload routes at max_size bytes.
+
+    A Content-Length over the limit is refused before anything is read. Bodies
+    without one (chunked) or lying about it are counted as they arrive, and
+    the first chunk past the limit fails the form parsing with a 413, so an
+    oversized upload is never spooled to disk in full.
+    """
+
+    def __init__(self, app, paths, max_size: int):
+        self.app = app
+        self.paths = set(paths)
+        self.max_size = max_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_size:
+            await send({"type": "http.response.start", "status": 413, "headers": [(b"content-type", b"application/json")]})
+            await send({"type": "http.response.body", "body": b'{"detail":"File too large"}'})
+            return
+
+        received = 0
+
+        # FastAPI lets an HTTPException raised while the body is read through, so it becomes the response
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    raise HTTPException(status_code=413, detail="File too large")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+# Copy an UploadFile into a uniquely named temp file in directory, chunk by chunk.
+# Hashing and disk writes run in the thread pool so large files never block the event loop.
+# Returns (temp_path, sha256, size); the temp file is removed if the copy fails.
+async def save_upload(upload, directory: str, max_size: int):
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".upload-")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := await upload.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLarge(f"Upload is larger than {max_size} bytes")
+                await run_in_threadpool(write_chunk, buffer, digest, chunk)
+    except BaseException:
+        discard(temp_path)
+        raise
+    return temp_path, digest.hexdigest(), size
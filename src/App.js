@@ -9,6 +9,7 @@ import Preview from '../src/components/Forum/Preview'
 import LoginSignup from './LoginSignup'
 import ForgetPassword from './ForgetPassword';
 import UserForgetPassword from './UserForgetPassword'
+import ResetPassword from './ResetPassword'
 import UserProfile from './UserProfile'
 import UserYourBoard from './UserYourBoard'
 import UserBookmark from './UserBookmark'
@@ -28,6 +29,7 @@ const App = () => {
         <Route path="/preview/:board/:forum_name" element={<Preview />}/>
         <Route path="/forget_password" element={<ForgetPassword />}/>
         <Route path="/user/forget_password" element={<UserForgetPassword />}/>
+        <Route path="/reset_password" element={<ResetPassword />}/>
         <Route path="/user/:id/profile" element={<UserProfile />} />
         <Route path="/user/:id/yourboard" element={<UserYourBoard />} />
         <Route path="/user/:id/yourbookmark" element={<UserBookmark />} />
@@ -0,0 +1,16 @@
+import React from 'react';
+import Header from './components/ForgetPassword/Header';
+import ResetPasswordForm from './components/ForgetPassword/ResetPassword';
+
+const ResetPassword = () => {
+  return (
+    <div className="h-screen w-full">
+      <Header/>
+      <div className="h-full">
+        <ResetPasswordForm />
+      </div>
+    </div>
+  );
+};
+
+export default ResetPassword;
@@ -2,9 +2,17 @@ import axios from 'axios';
 
 const API_BASE_URL = "https://www.api.knppkp.me";
 
-export const fetchForums = async (board) => {
+// Images come back from the API as blob store hashes, freshly picked files are still base64
+export const imageSrc = (image) =>
+  /^[0-9a-f]{64}$/.test(image) ? `${API_BASE_URL}/blob/${image}` : `data:image/jpeg;base64,${image}`;
+
+// params may hold tag (tag ids), match ("any" or "all"), tag_limit, limit and cursor
+export const fetchForums = async (board, params = {}) => {
   try {
-    const response = await axios.get(`${API_BASE_URL}/coboard/${board}/`);
+    const response = await axios.get(`${API_BASE_URL}/coboard/${board}/`, {
+      params,
+      paramsSerializer: { indexes: null }, // tag=1&tag=2, as the API expects
+    });
     return response.data;
   } catch (error) {
     console.error('Error fetching forums:', error);
@@ -30,6 +38,14 @@ export const fetchTopics = async (board, forum_name) => {
   }
 };
 
+// Live changes to a forum (new topics, posts, comments and likes) over Server-Sent Events.
+// Returns a function that closes the stream.
+export const subscribeForum = (board, forum_name, onEvent) => {
+  const source = new EventSource(`${API_BASE_URL}/coboard/${board}/${forum_name}/events`);
+  source.onmessage = (message) => onEvent(JSON.parse(message.data));
+  return () => source.close();
+};
+
 export const AddTopic = async (board, forum_name, topicData) => {
   try {
       const response = await axios.post(`${API_BASE_URL}/coboard/${board}/${forum_name}/topic`, topicData);
@@ -109,13 +125,61 @@ export const addComment = async (board, forum_name, postId, commentText, sid, ai
   }
 };
 
-export const fetchUsers = async () => {
+// Session token from login, sent with every request
+const setSessionToken = (token) => {
+  localStorage.setItem('token', token);
+  axios.defaults.headers.common['Authorization'] = `Bearer ${token}`;
+};
+
+if (localStorage.getItem('token')) {
+  axios.defaults.headers.common['Authorization'] = `Bearer ${localStorage.getItem('token')}`;
+}
+
+// Returns { token, status, user }, or null when the username or password is wrong
+export const login = async (username, password) => {
   try {
-    const response = await axios.get(`${API_BASE_URL}`);
+    const response = await axios.post(`${API_BASE_URL}/auth/login`, { username, password });
+    setSessionToken(response.data.token);
     return response.data;
   } catch (error) {
-    console.error('Error fetching user:', error);
-    throw new Error('Failed to fetch user.');
+    if (error.response && error.response.status === 401) {
+      return null;
+    }
+    console.error('Error logging in:', error);
+    throw new Error('Failed to log in.');
+  }
+};
+
+// Returns { exists, status } for a student id or anonymous user name
+export const userExists = async (username) => {
+  try {
+    const response = await axios.get(`${API_BASE_URL}/user/exists`, { params: { username } });
+    return response.data;
+  } catch (error) {
+    console.error('Error checking user:', error);
+    throw new Error('Failed to check user.');
+  }
+};
+
+// Mails a password reset link to the address linked with the user
+export const recoverPassword = async (username) => {
+  try {
+    const response = await axios.post(`${API_BASE_URL}/auth/recover`, { username });
+    return response.data;
+  } catch (error) {
+    console.error('Error recovering password:', error);
+    throw error;
+  }
+};
+
+// Sets a new password with the token from the mailed reset link, fails with 400 once it expired or was used
+export const resetPassword = async (token, password) => {
+  try {
+    const response = await axios.post(`${API_BASE_URL}/auth/reset`, { token, password });
+    return response.data;
+  } catch (error) {
+    console.error('Error resetting password:', error);
+    throw error;
   }
 };
 
@@ -253,16 +317,6 @@ export const downloadFile = async (fileId) => {
   }
 };
 
-export const sendMail = async (mailData) => {
-  try {
-    const response = await axios.post(`${API_BASE_URL}/sendmail`, mailData);
-    return response.data;
-  } catch (error) {
-    console.error('Error sendmail:', error);
-    throw error;
-  }
-}
-
 export const fetchUserData = async (id) => {
   try {
     const response = await axios.get(`${API_BASE_URL}/user/${id}`);
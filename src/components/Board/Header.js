@@ -1,6 +1,7 @@
 import React, { useState, useContext } from "react";
 import { Link, useNavigate } from "react-router-dom";
 import { UserContext } from "../../UserContext";
+import { imageSrc } from "../../api";
 
 const Header = ({ setSearchForumTerm }) => {
   const [isDropdownOpen, setIsDropdownOpen] = useState(false);
@@ -85,7 +86,7 @@ const Header = ({ setSearchForumTerm }) => {
         >
           {profile && (
             <img
-              src={`data:image/jpeg;base64,${profile}`}
+              src={imageSrc(profile)}
               alt={`user profile`}
               className="w-full h-full object-cover rounded-full"
             />
@@ -1,11 +1,12 @@
 import React, { useState, useEffect } from 'react';
+import { imageSrc } from '../../api';
 
 const HeadingSection = React.forwardRef(({ setTitle, setDescription, setIcon, title, description, icon }, ref) => {
   const [preview, setPreview] = useState(null);
 
   useEffect(() => {
     if (icon) {
-      setPreview(`data:image/jpeg;base64,${icon}`);
+      setPreview(imageSrc(icon));
     }
   }, [icon]);
 
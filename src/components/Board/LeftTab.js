@@ -25,7 +25,8 @@ const LeftTab = ({ board, setTagFiltered }) => {
     const loadTags = async () => {
       setLoading(true);
       try {
-        const data = await fetchForums(board);
+        // Only the tags are needed here, so a single forum is enough
+        const data = await fetchForums(board, { limit: 1 });
         if (!data || !data.tags || !Array.isArray(data.tags)) {
           throw new Error("Invalid data format");
         }
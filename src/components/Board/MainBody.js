@@ -2,7 +2,7 @@ import React, { useState, useEffect, useContext } from "react";
 import { useNavigate } from "react-router-dom";
 import Preview from "./Preview";
 import CreateForum from "./CreateForum";
-import { fetchForums } from "../../api";
+import { fetchForums, imageSrc } from "../../api";
 import { UserContext } from "../../UserContext";
 
 const MainBody = ({ board, searchForumTerm = "", tagfiltered = [] }) => {
@@ -42,7 +42,8 @@ const MainBody = ({ board, searchForumTerm = "", tagfiltered = [] }) => {
     const loadForums = async () => {
       setLoading(true);
       try {
-        const data = await fetchForums(board);
+        // Forums are filtered by tag on the server
+        const data = await fetchForums(board, { tag: tagfiltered });
         if (!data || !data.forums || !Array.isArray(data.forums)) {
           throw new Error("Invalid data format");
         }
@@ -59,7 +60,7 @@ const MainBody = ({ board, searchForumTerm = "", tagfiltered = [] }) => {
     };
 
     loadForums();
-  }, [board]);
+  }, [board, tagfiltered]);
 
   useEffect(() => {
     let sortedForums = [...forums];
@@ -70,15 +71,6 @@ const MainBody = ({ board, searchForumTerm = "", tagfiltered = [] }) => {
       );
     }
 
-    if (tagfiltered.length > 0) {
-      sortedForums = sortedForums.filter((forum) =>
-        forumtag.some(
-          (ft) =>
-            ft.forum_id === forum.forum_id && tagfiltered.includes(ft.tag_id)
-        )
-      );
-    }
-
     if (sortBy === "Latest") {
       sortedForums.sort((b, a) => a.forum_id - b.forum_id);
     } else if (sortBy === "Most Popular") {
@@ -86,7 +78,7 @@ const MainBody = ({ board, searchForumTerm = "", tagfiltered = [] }) => {
     }
 
     setFilteredForums(sortedForums);
-  }, [searchForumTerm, tagfiltered, forums, forumtag, sortBy]);
+  }, [searchForumTerm, forums, sortBy]);
 
   const toggleDropdown = () => {
     setDropdownVisible(!isDropdownVisible);
@@ -248,7 +240,7 @@ const MainBody = ({ board, searchForumTerm = "", tagfiltered = [] }) => {
                 >
                   {forum.icon && (
                     <img
-                      src={`data:image/jpeg;base64,${forum.icon}`}
+                      src={imageSrc(forum.icon)}
                       alt={`${forum.forum_name} icon`}
                       className="w-full h-full object-cover"
                     />
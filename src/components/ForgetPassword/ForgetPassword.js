@@ -1,37 +1,13 @@
 import React, { useState, useEffect } from "react";
 import { useNavigate } from 'react-router-dom';
-import { fetchUsers, sendMail } from "../../api";
+import { recoverPassword } from "../../api";
 
 const ForgetPassword = () => {
   const [username, setUsername] = useState("");
   const [successMessage, setSuccessMessage] = useState("");
-  const [se, setSE] = useState([]);
-  const [anonymous, setAnonymous] = useState([]);
-  const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const navigate = useNavigate(); // React Router hook for navigation
 
-  useEffect(() => {
-    const loadUsers = async () => {
-      setLoading(true);
-      setError('');
-      try {
-        const response = await fetchUsers();
-        if (!response || typeof response !== 'object') {
-          throw new Error("Invalid response from server");
-        }
-        setSE(response.se);
-        setAnonymous(response.anonymous);
-      } catch (error) {
-        console.error("Failed to load users", error);
-        setError("Failed to load users. " + (error.message || ''));
-      } finally {
-        setLoading(false);
-      }
-    };
-    loadUsers();
-  }, []);
-
   useEffect(() => {
     document.body.style.overflow = "hidden";
     document.documentElement.style.overflow = "hidden";
@@ -54,39 +30,17 @@ const ForgetPassword = () => {
       return;
     }
 
-    const se_user = se.find((user) => user.sid === username);
-    const a_user = anonymous.find((user) => user.aid === username);
-
-    if (se_user) {
-      try {
-        const mailData = {
-          receiver_email: `${se_user.sid}@kmitl.ac.th`,
-          pw: se_user.spw,
-        };
-  
-        // Wait for the email to be sent before setting the success message
-        await sendMail(mailData);
-        setSuccessMessage(`Password sent to the email linked with ${username}.`);
-      } catch (error) {
-        console.error("Failed to send recovery password", error);
-        setError("Failed to send recovery email.");
-      }
-    } else if (a_user) {
-      try {
-        const mailData = {
-          receiver_email: a_user.mail,
-          pw: a_user.apw,
-        };
-  
-        // Wait for the email to be sent before setting the success message
-        await sendMail(mailData);
-        setSuccessMessage(`Password sent to the email linked with ${username}.`);
-      } catch (error) {
+    // The server mails a password reset link to the address linked with the user
+    try {
+      await recoverPassword(username);
+      setSuccessMessage(`A password reset link was sent to the email linked with ${username}.`);
+    } catch (error) {
+      if (error.response && error.response.status === 404) {
+        setError("Username not found.");
+      } else {
         console.error("Failed to send recovery password", error);
         setError("Failed to send recovery email.");
       }
-    } else {
-      setError("Username not found.");
     }
   };
 
@@ -125,7 +79,7 @@ const ForgetPassword = () => {
           </div>
           <div className="font-['Istok Web'] text-[15px] mb-[20px] font-normal text-black text-center">
             Enter your username, and we'll send<br />
-            the password to your registered email.
+            a password reset link to your registered email.
           </div>
           <input
             type="text"
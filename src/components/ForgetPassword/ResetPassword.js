@@ -0,0 +1,100 @@
+import React, { useState, useEffect } from "react";
+import { useNavigate, useSearchParams } from 'react-router-dom';
+import { resetPassword } from "../../api";
+
+// Opened from the link mailed by the forget password form, the token comes in the query string
+const ResetPassword = () => {
+  const [searchParams] = useSearchParams();
+  const [password, setPassword] = useState("");
+  const [confirmPassword, setConfirmPassword] = useState("");
+  const [successMessage, setSuccessMessage] = useState("");
+  const [error, setError] = useState('');
+  const navigate = useNavigate();
+  const token = searchParams.get("token");
+
+  useEffect(() => {
+    document.body.style.overflow = "hidden";
+    document.documentElement.style.overflow = "hidden";
+
+    return () => {
+      document.body.style.overflow = "auto";
+      document.documentElement.style.overflow = "auto";
+    };
+  }, []);
+
+  const handleReset = async () => {
+    if (!token) {
+      setError("This reset link is incomplete.");
+      return;
+    }
+    if (!password) {
+      setError("Please enter a new password.");
+      return;
+    }
+    if (password !== confirmPassword) {
+      setError("Passwords do not match.");
+      return;
+    }
+
+    try {
+      await resetPassword(token, password);
+      setSuccessMessage("Your password was changed, you can log in with it now.");
+    } catch (error) {
+      if (error.response && error.response.status === 400) {
+        setError("This reset link has expired or was already used.");
+      } else {
+        console.error("Failed to reset password", error);
+        setError("Failed to reset password.");
+      }
+    }
+  };
+
+  return (
+    <div className="overflow-hidden m-0 bg-[#006b62] h-screen relative">
+      <div className="flex flex-col items-center mt-[130px]">
+        <div className="w-[440px] h-[400px] bg-white rounded-[20px] shadow-lg flex flex-col justify-center items-center mb-[150px] relative">
+          <div className="font-['Istok Web'] text-[30px] mt-[0px] mb-[5px] font-bold text-black">
+            Reset Password
+          </div>
+          <div className="font-['Istok Web'] text-[15px] mb-[20px] font-normal text-black text-center">
+            Choose a new password for your account.
+          </div>
+          <input
+            type="password"
+            placeholder="New password"
+            value={password}
+            onChange={(e) => { setPassword(e.target.value); setError(""); }}
+            className="w-[320px] h-[45px] p-[10px] mb-2 border-2 border-[#a2a4a7] font-bold text-[18px] placeholder-[#acaeb1]"
+          />
+          <input
+            type="password"
+            placeholder="Confirm password"
+            value={confirmPassword}
+            onChange={(e) => { setConfirmPassword(e.target.value); setError(""); }}
+            className="w-[320px] h-[45px] p-[10px] mb-2 border-2 border-[#a2a4a7] font-bold text-[18px] placeholder-[#acaeb1]"
+          />
+          {error && <p className="text-red-500 text-sm mt-2">{error}</p>}
+          {successMessage && <p className="text-green-500 text-sm mt-2">{successMessage}</p>}
+
+          <button
+            className="w-[320px] h-[48px] mt-[20px] p-[10px] rounded-[15px] flex items-center justify-center bg-[#003F6B] text-white font-bold text-[25px] tracking-[1px] hover:bg-[#005D9E]"
+            onClick={handleReset}
+          >
+            Submit
+          </button>
+          <button
+            className="mt-[20px] flex items-center justify-center text-gray-700 text-[15px] tracking-[1px] hover:text-gray-900 transition-all group"
+            onClick={() => navigate('/')}
+          >
+            <span className="mr-2 transform transition-transform duration-300 ease-in-out group-hover:-translate-x-2">
+              {"<"}
+            </span>
+            Back to Login
+          </button>
+        </div>
+      </div>
+    </div>
+  );
+};
+
+export default ResetPassword;
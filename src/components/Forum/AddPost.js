@@ -46,12 +46,10 @@ const AddPost = ({
 
       if (selectedFiles.length > 0) {
         for (const file of selectedFiles) {
-          const sid = status === "se" ? user.sid : null;
-          const aid = status === "a" ? user.aid : null;
+          // Only the owner field of the user's kind is sent, the server takes a missing one as null
           const fileData = new FormData();
           fileData.append("file", file);
-          fileData.append("s_owner", sid);
-          fileData.append("a_owner", aid);
+          fileData.append(status === "se" ? "s_owner" : "a_owner", status === "se" ? user.sid : user.aid);
           fileData.append("post_id", createdPost.post_id);
           await uploadFile(fileData);
         }
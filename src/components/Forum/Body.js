@@ -2,9 +2,69 @@ import React, { useState, useEffect, useContext } from "react";
 import { useNavigate } from "react-router-dom";
 import CreateTopic from "./CreateTopic";
 import AddPost from "./AddPost";
-import { fetchTopics, updateLike, addComment, downloadFile } from "../../api";
+import { fetchTopics, subscribeForum, updateLike, addComment, downloadFile, imageSrc } from "../../api";
 import { UserContext } from "../../UserContext";
 
+// Apply one change to the loaded forum. Our own writes come back as events too,
+// so anything already present is left alone.
+const applyForumEvent = (forumData, event) => {
+  if (!forumData) {
+    return forumData;
+  }
+  const topics = forumData.topics || [];
+
+  if (event.type === "topic") {
+    if (topics.some((topic) => topic.topic_id === event.topic.topic_id)) {
+      return forumData;
+    }
+    return { ...forumData, topics: [...topics, event.topic] };
+  }
+
+  const updatedTopics = topics.map((topic) => ({
+    ...topic,
+    posts: (topic.posts || []).map((post) => {
+      if (event.type === "like" && event.item_type === "post" && post.post_id === event.item_id) {
+        return { ...post, heart: event.likes };
+      }
+      if (event.type === "like" && event.item_type === "comment") {
+        return {
+          ...post,
+          comments: post.comments.map((comment) =>
+            comment.comment_id === event.item_id
+              ? { ...comment, comment_heart: event.likes }
+              : comment
+          ),
+        };
+      }
+      if (
+        event.type === "comment" &&
+        post.post_id === event.post_id &&
+        !post.comments.some((comment) => comment.comment_id === event.comment.comment_id)
+      ) {
+        return { ...post, comments: [...post.comments, event.comment] };
+      }
+      return post;
+    }),
+  }));
+
+  if (event.type === "post") {
+    const exists = updatedTopics.some((topic) =>
+      topic.posts.some((post) => post.post_id === event.post.post_id)
+    );
+    if (!exists) {
+      return {
+        ...forumData,
+        topics: updatedTopics.map((topic) =>
+          topic.topic_id === event.topic_id
+            ? { ...topic, posts: [...topic.posts, event.post] }
+            : topic
+        ),
+      };
+    }
+  }
+  return { ...forumData, topics: updatedTopics };
+};
+
 const Body = ({ board, forum_name, searchTopicTerm = "" }) => {
   const [isDropdownVisible, setDropdownVisible] = useState(false);
   const [isCreateTopicVisible, setCreateTopicVisible] = useState(false);
@@ -23,6 +83,7 @@ const Body = ({ board, forum_name, searchTopicTerm = "" }) => {
   const [default_sort, setDefaultSort] = useState(0);
   const { user, status } = useContext(UserContext);
   const [hovered, setHovered] = useState(false);
+  const [reloadKey, setReloadKey] = useState(0);
 
 
   const id = status === "se" ? user.sid : user.aid;
@@ -65,7 +126,19 @@ const Body = ({ board, forum_name, searchTopicTerm = "" }) => {
     };
 
     loadTopics();
-  }, [board, forum_name, default_sort]);
+  }, [board, forum_name, default_sort, reloadKey]);
+
+  // Push new topics, posts, comments and likes into the loaded forum instead of refetching it
+  useEffect(() => {
+    return subscribeForum(board, forum_name, (event) => {
+      if (event.type === "resync") {
+        // We missed events, load the forum again
+        setReloadKey((key) => key + 1);
+      } else {
+        setForumData((prevData) => applyForumEvent(prevData, event));
+      }
+    });
+  }, [board, forum_name]);
 
   useEffect(() => {
     if (forumData && forumData.topics) {
@@ -105,10 +178,9 @@ const Body = ({ board, forum_name, searchTopicTerm = "" }) => {
   };
 
   const handleCreateTopic = (newTopic) => {
-    setForumData((prevData) => ({
-      ...prevData,
-      topics: [...(prevData.topics || []), newTopic],
-    }));
+    setForumData((prevData) =>
+      applyForumEvent(prevData, { type: "topic", topic: newTopic })
+    );
   };
 
   const openAddPost = (topic_id) => {
@@ -121,18 +193,9 @@ const Body = ({ board, forum_name, searchTopicTerm = "" }) => {
   };
 
   const handleCreatePost = (newPost) => {
-    setForumData((prevData) => {
-      const updatedTopics = prevData.topics.map((topic) => {
-        if (topic.topic_id === topic_id) {
-          return {
-            ...topic,
-            posts: [...(topic.posts || []), newPost],
-          };
-        }
-        return topic;
-      });
-      return { ...prevData, topics: updatedTopics };
-    });
+    setForumData((prevData) =>
+      applyForumEvent(prevData, { type: "post", topic_id, post: newPost })
+    );
   };
 
   const toggleComments = (postId) => {
@@ -162,17 +225,9 @@ const Body = ({ board, forum_name, searchTopicTerm = "" }) => {
           s,
           a
         );
-        setForumData((prevData) => {
-          const updatedTopics = prevData.topics.map((topic) => ({
-            ...topic,
-            posts: topic.posts.map((post) =>
-              post.post_id === postId
-                ? { ...post, comments: [...post.comments, newComment] }
-                : post
-            ),
-          }));
-          return { ...prevData, topics: updatedTopics };
-        });
+        setForumData((prevData) =>
+          applyForumEvent(prevData, { type: "comment", post_id: postId, comment: newComment })
+        );
         setNewComments((prev) => ({ ...prev, [postId]: "" }));
       } catch (error) {
         console.error("Failed to add comment", error);
@@ -183,25 +238,14 @@ const Body = ({ board, forum_name, searchTopicTerm = "" }) => {
   const updateLiked = async (itemId, itemType) => {
     try {
       const updatedItem = await updateLike(board, forum_name, itemId, itemType);
-      setForumData((prevData) => {
-        const updatedTopics = prevData.topics.map((topic) => ({
-          ...topic,
-          posts: topic.posts.map((post) => {
-            if (itemType === "post" && post.post_id === itemId) {
-              return { ...post, heart: updatedItem.likes };
-            }
-            return {
-              ...post,
-              comments: post.comments.map((comment) =>
-                itemType === "comment" && comment.comment_id === itemId
-                  ? { ...comment, comment_heart: updatedItem.likes }
-                  : comment
-              ),
-            };
-          }),
-        }));
-        return { ...prevData, topics: updatedTopics };
-      });
+      setForumData((prevData) =>
+        applyForumEvent(prevData, {
+          type: "like",
+          item_type: itemType,
+          item_id: itemId,
+          likes: updatedItem.likes,
+        })
+      );
     } catch (error) {
       console.error("Failed to update like", error);
     }
@@ -354,7 +398,7 @@ const Body = ({ board, forum_name, searchTopicTerm = "" }) => {
                               </p>
                               {post.pic && (
                                 <img
-                                  src={`data:image/jpeg;base64,${post.pic}`}
+                                  src={imageSrc(post.pic)}
                                   alt="Post image"
                                   className="w-full h-auto mt-2 rounded-md object-cover"
                                 />
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from "react";
-import { fetchTopics } from "../../api";
+import { fetchTopics, imageSrc } from "../../api";
 import { formatDistanceToNow } from "date-fns";
 
 const Header = ({ board, forum_name, setSearchTopicTerm }) => {
@@ -95,7 +95,7 @@ const Header = ({ board, forum_name, setSearchTopicTerm }) => {
           <div className="flex flex-col h-20 w-20 rounded-full bg-white">
             {icon && (
               <img
-                src={`data:image/jpeg;base64,${icon}`}
+                src={imageSrc(icon)}
                 alt={`${title} icon`}
                 className="w-full h-full object-cover rounded-full"
               />
@@ -1,5 +1,5 @@
 import React, { useEffect, useState } from 'react';
-import { fetchTopics } from '../../api';
+import { fetchTopics, imageSrc } from '../../api';
 
 const InfoPanel = ({ isVisible, closeInfoPanel, board, forum_name }) => {
   const [title, setTitle] = useState('');
@@ -83,7 +83,7 @@ const InfoPanel = ({ isVisible, closeInfoPanel, board, forum_name }) => {
         <div className="w-450 md:w-500 h-80 bg-white mt-12 rounded-2xl flex justify-center items-center">
           {icon && (
             <img 
-              src={`data:image/jpeg;base64,${icon}`}
+              src={imageSrc(icon)}
               alt={`${title} icon`} 
               className="w-450 h-80 md:w-full md:h-full object-cover rounded-2xl"
             />
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { useParams } from 'react-router-dom';
-import { fetchTopics } from '../../api'; 
+import { fetchTopics, imageSrc } from '../../api'; 
 import { formatDistanceToNow } from 'date-fns';
 
 const Preview = () => {
@@ -114,7 +114,7 @@ const Preview = () => {
                                     <div className="flex flex-col h-14 w-14 rounded-full bg-white">
                                         {icon && (
                                             <img 
-                                                src={`data:image/jpeg;base64,${icon}`}
+                                                src={imageSrc(icon)}
                                                 alt={`${title} icon`} 
                                                 className="w-full h-full object-cover rounded-full"
                                             />
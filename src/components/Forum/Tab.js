@@ -3,7 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import InfoPanel from './InfoPanel';
 import SharePanel from './SharePanel';
 import SettingPanel from './SettingPanel';
-import { fetchTopics, addBookmark, deleteBookmark } from '../../api';
+import { fetchTopics, addBookmark, deleteBookmark, imageSrc } from '../../api';
 import { UserContext } from '../../UserContext';
 
 const Tab = ({ board, forum_name }) => {
@@ -93,7 +93,7 @@ const Tab = ({ board, forum_name }) => {
       className="w-10 h-10 mt-12 rounded-full group"
     >
       <img
-        src={`data:image/jpeg;base64,${profile}` || "/asset/user_button.svg"}
+        src={imageSrc(profile) || "/asset/user_button.svg"}
         alt="User Button"
         className="w-full h-full object-cover rounded-full"
       />
@@ -2,7 +2,7 @@ import React, { useState, useEffect, useContext } from "react";
 import { useNavigate } from 'react-router-dom';
 import LoginPage from "./Login";
 import SignupPage from "./Signup";
-import { fetchUsers, createAnonymousUser } from "../../api";
+import { login, userExists, createAnonymousUser } from "../../api";
 import { UserContext } from '../../UserContext';
 
 const MainBody = () => {
@@ -11,61 +11,29 @@ const MainBody = () => {
   const [username, setUsername] = useState("");
   const [password, setPassword] = useState("");
   const [showPassword, setShowPassword] = useState(false);
-  const [se, setSE] = useState([]);
-  const [anonymous, setAnonymous] = useState([]);
-  const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const navigate = useNavigate();
   const { setUser, setStatus } = useContext(UserContext);
 
-  useEffect(() => {
-    const loadUsers = async () => {
-      setLoading(true);
-      setError('');
-      try {
-        const response = await fetchUsers();
-        if (!response || typeof response !== 'object') {
-          throw new Error("Invalid response from server");
-        }
-        setSE(response.se);
-        setAnonymous(response.anonymous);
-      } catch (error) {
-        console.error("Failed to load users", error);
-        setError("Failed to load users. " + (error.message || ''));
-      } finally {
-        setLoading(false);
-      }
-    };
-    loadUsers();
-  }, []);
-
-  const validateUser = (username, password, users, type) => {
-    if (!users || !Array.isArray(users)) {
-      return null; // Return null if users array is not available or not an array
-    }
-
-    const user = users.find((user) =>
-      (type === "se" && user.sid === username) ||
-      (type === "anonymous" && user.aid === username)
-    );
-
-    if (user && ((type === "se" && user.spw === password) || (type === "anonymous" && user.apw === password))) {
-      setUser(user);
-      setStatus(type === "se" ? "se" : "a");
-      return type === "se" ? user.sid : user.aid;
+  // Credentials are checked by the server
+  const validateUser = async (username, password) => {
+    const session = await login(username, password);
+    if (!session) {
+      return null;
     }
-
-    return null;
+    setUser(session.user);
+    setStatus(session.status);
+    return username;
   };
 
-  const validateSignUp = (username, password, email, users) => {
+  const validateSignUp = async (username, password, email) => {
     if (!username || !password) {
       setError('Username and password cannot be empty.');
       return false;
     }
 
-    const userExists = users.some(user => user.aid === username);
-    if (userExists) {
+    const { exists } = await userExists(username);
+    if (exists) {
       setError('Username already exists.');
       return false;
     }
@@ -76,21 +44,34 @@ const MainBody = () => {
       mail: email
     }
 
-    createAnonymousUser(userData);
+    await createAnonymousUser(userData);
+    await login(username, password);
 
     return true;
   };
 
-  const submitForm = () => {
+  const submitForm = async () => {
     let loginStatus = null;
 
     if (isLogin) {
       // Check if username is in se or anonymous and verify password
-      loginStatus = validateUser(username, password, se, "se") || validateUser(username, password, anonymous, "anonymous");
+      try {
+        loginStatus = await validateUser(username, password);
+      } catch (error) {
+        setError("Failed to log in. " + (error.message || ''));
+        return;
+      }
     } else {
       // For signup, validate input and prevent duplicate usernames
-      if (validateSignUp(username, password, email, anonymous) && validateEmail(email)) {
-        setUser({ aid: username, apw: password, mail: email }); // This sets the new user in context
+      let signedUp = false;
+      try {
+        signedUp = validateEmail(email) && await validateSignUp(username, password, email);
+      } catch (error) {
+        setError("Failed to sign up. " + (error.message || ''));
+        return;
+      }
+      if (signedUp) {
+        setUser({ aid: username, mail: email }); // This sets the new user in context
         setStatus("a");
         clearInputs(); // Reset input fields after successful signup
         alert("Signup successful!");
@@ -1,6 +1,7 @@
 import React, { useState, useContext } from "react";
 import { Link, useNavigate } from "react-router-dom";
 import { UserContext } from "../../UserContext";
+import { imageSrc } from "../../api";
 
 const Header = () => {
   const [isDropdownOpen, setIsDropdownOpen] = useState(false);
@@ -71,7 +72,7 @@ const Header = () => {
         >
           {profile && (
             <img
-              src={`data:image/jpeg;base64,${profile}`}
+              src={imageSrc(profile)}
               alt={`user profile`}
               className="w-full h-full object-cover rounded-full"
             />
@@ -1,5 +1,5 @@
 import React, { useContext } from "react";
-import { deleteBookmark } from "../../../api";
+import { deleteBookmark, imageSrc } from "../../../api";
 import { UserContext } from "../../../UserContext";
 import BookmarkView from "./BookmarkView";
 
@@ -96,7 +96,7 @@ const BookmarkEdit = ({
               >
                 {forum.icon && (
                   <img
-                    src={`data:image/jpeg;base64,${forum.icon}`}
+                    src={imageSrc(forum.icon)}
                     alt={`${forum.forum_name || "Forum"} icon`}
                     className="w-full h-full object-cover"
                   />
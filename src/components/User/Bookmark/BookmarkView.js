@@ -1,4 +1,5 @@
 import React, { useState } from "react";
+import { imageSrc } from "../../../api";
 
 const BookmarkView = ({
   userData,
@@ -123,7 +124,7 @@ const BookmarkView = ({
                 >
                   {forum.icon && (
                     <img
-                      src={`data:image/jpeg;base64,${forum.icon}`}
+                      src={imageSrc(forum.icon)}
                       alt={`${forum.forum_name || "Forum"} icon`}
                       className="w-full h-full object-cover"
                     />
@@ -1,10 +1,10 @@
-import React, { useState, useEffect, useContext } from "react";
+import React, { useState, useContext } from "react";
 import axios from "axios";
 import ProfileView from "./ProfileView";
 import ProfileEdit from "./ProfileEdit";
 import ChangePassword from "./ChangePassword";
 import { UserContext } from '../../../UserContext';
-import { fetchUsers, updateUser } from "../../../api";
+import { userExists, updateUser } from "../../../api";
 
 const MainBody = () => {
   const { user, status, setUser, setStatus } = useContext(UserContext);
@@ -12,14 +12,13 @@ const MainBody = () => {
   const [userData, setUserData] = useState({
     studentId: status === "se" ? user.sid : "",
     username: status === "se" ? user.username : user.aid,
-    password: status === "se" ? user.spw : user.apw,
+    password: "", // Never sent by the server, only set when changing it
     profileImage: status === "se" ? user.sprofile : user.aprofile,
   });
 
 
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
-  const [anonymous, setAnonymous] = useState([]);
   const [isPasswordVisible, setIsPasswordVisible] = useState(false);
   const [isEditing, setIsEditing] = useState(false);
   const [isChangingPassword, setIsChangingPassword] = useState(false);
@@ -29,26 +28,6 @@ const MainBody = () => {
   const [newPassword, setNewPassword] = useState("");
   const [confirmPassword, setConfirmPassword] = useState("");
 
-  useEffect(() => {
-    const loadUsers = async () => {
-      setLoading(true);
-      setError('');
-      try {
-        const response = await fetchUsers();
-        if (!response || typeof response !== 'object') {
-          throw new Error("Invalid response from server");
-        }
-        setAnonymous(response.anonymous);
-      } catch (error) {
-        console.error("Failed to load users", error);
-        setError("Failed to load users. " + (error.message || ''));
-      } finally {
-        setLoading(false);
-      }
-    };
-    loadUsers();
-  }, []);
-
   
   const handleChangePassword = () => {
     setIsChangingPassword(true);
@@ -122,7 +101,7 @@ const MainBody = () => {
       alert("Username cannot exceed 10 characters.");
       return;
     }
-     if (anonymous.find((user) => user.aid === editedUsername) && status === "a") {
+    if (status === "a" && editedUsername !== user.aid && (await userExists(editedUsername)).exists) {
       alert("Username exist");
       return;
     }
@@ -1,4 +1,5 @@
 import React from "react";
+import { imageSrc } from "../../../api";
 
 const ProfileEdit = ({
   editedUsername,
@@ -38,13 +39,13 @@ const ProfileEdit = ({
         <div className="bg-gray-300 rounded-full h-[150px] w-[150px] md:h-[234px] md:w-[234px] overflow-hidden relative">
           {image ? (
             <img
-              src={`data:image/png;base64,${image}`}
+              src={imageSrc(image)}
               alt="Profile"
               className="h-full w-full object-cover"
             />
           ) : userData.sprofile ? (
             <img
-              src={`data:image/png;base64,${userData.sprofile}`}
+              src={imageSrc(userData.sprofile)}
               alt="Profile"
               className="h-full w-full object-cover"
             />
@@ -1,4 +1,5 @@
 import React from "react";
+import { imageSrc } from "../../../api";
 
 const ProfileView = ({
   userData,
@@ -19,7 +20,7 @@ const ProfileView = ({
         <div className="bg-gray-300 rounded-full h-[150px] w-[150px] md:h-[234px] md:w-[234px] overflow-hidden relative">
           {image ? (
             <img
-            src={`data:image/jpeg;base64,${image}`}
+            src={imageSrc(image)}
             alt="Profile"
               className="h-full w-full object-cover rounded-full"
             />
@@ -1,5 +1,6 @@
 import React, { useContext } from 'react';
 import { UserContext } from '../../../UserContext';
+import { imageSrc } from '../../../api';
 
 const Header = ({ setSearchForumTerm }) => {
   const { user, status } = useContext(UserContext);
@@ -43,7 +44,7 @@ const Header = ({ setSearchForumTerm }) => {
         <div className="hidden md:block bg-white rounded-full h-12 w-12 md:h-16 md:w-16 mr-4 md:mr-10"> 
           {profile && (
               <img 
-                src={`data:image/jpeg;base64,${profile}`}
+                src={imageSrc(profile)}
                 alt={`user profile`} 
                 className="w-full h-full object-cover rounded-full"
               />
@@ -1,6 +1,6 @@
 import React, { useContext } from "react";
 import { UserContext } from "../../../UserContext";
-import { deleteForum } from "../../../api";
+import { deleteForum, imageSrc } from "../../../api";
 
 const YourBoardEdit = ({
   isDropdownVisible,
@@ -93,7 +93,7 @@ const YourBoardEdit = ({
                 >
                   {forum.icon && (
                     <img
-                      src={`data:image/jpeg;base64,${forum.icon}`}
+                      src={imageSrc(forum.icon)}
                       alt={`${forum.forum_name || "Forum"} icon`}
                       className="w-full h-full object-cover"
                     />
@@ -1,4 +1,5 @@
 import React from "react";
+import { imageSrc } from "../../../api";
 
 const YourBoardView = ({
   isDropdownVisible,
@@ -111,7 +112,7 @@ const YourBoardView = ({
                 >
                   {forum.icon && (
                     <img
-                      src={`data:image/jpeg;base64,${forum.icon}`}
+                      src={imageSrc(forum.icon)}
                       alt={`${forum.forum_name || "Forum"} icon`}
                       className="w-full h-full object-cover"
                     />